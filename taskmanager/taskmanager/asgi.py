@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'taskmanager.settings')
+# Sob ASGI as telas principais usam as views assíncronas (tasks.views_async)
+os.environ.setdefault('TAREFAS_VIEWS_ASYNC', 'True')
 
 application = get_asgi_application()
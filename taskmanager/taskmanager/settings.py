@@ -12,26 +12,64 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 # settings.py - ADICIONE estas importações
 import os
-import dj_database_url
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Load environment variables
-from dotenv import load_dotenv
-load_dotenv()
+# Perfil enxuto para o deploy serverless: cada cold start importa as settings,
+# registra os apps e monta o handler antes de responder, então ficam de fora o
+# .env, o dj_database_url sem DATABASE_URL e os apps admin e humanize. Os
+# middlewares são os mesmos do deploy completo (ver MIDDLEWARE): o perfil só
+# enxuga os apps. Desligado por padrão; para usar, defina TAREFAS_ENXUTO=1 nas
+# variáveis de ambiente do deploy (no Vercel, nas do projeto), com as
+# configurações que viriam do .env já definidas lá.
+# Compare com: python manage.py medir_inicializacao
+TAREFAS_ENXUTO = os.environ.get('TAREFAS_ENXUTO', '').lower() in ('true', '1')
+
+# Load environment variables (no perfil enxuto elas vêm da plataforma)
+if not TAREFAS_ENXUTO:
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# Conexões com o PostgreSQL (TAREFAS_BANCO_CONEXOES):
+# - persistente: cada thread mantém a sua conexão por até 10 minutos;
+# - pool: pool do psycopg 3 no processo, dividido entre as threads, com
+#   tamanho e espera configuráveis (TAREFAS_BANCO_POOL_*);
+# - transacao: uma conexão por requisição, para quando há um pooler em modo
+#   transação na frente do banco (PgBouncer, Supavisor, o pooler do Neon).
+#   Sem cursores do lado do servidor nem prepared statements, que não
+#   sobrevivem à troca de conexão entre transações.
+TAREFAS_BANCO_CONEXOES = os.environ.get('TAREFAS_BANCO_CONEXOES', 'persistente')
 
 # Database configuration
 if 'DATABASE_URL' in os.environ:
+    import dj_database_url
     DATABASES = {
         'default': dj_database_url.config(
             default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600,
+            conn_max_age=600 if TAREFAS_BANCO_CONEXOES == 'persistente' else 0,
             conn_health_checks=True,
-            ssl_require=True
+            # Desligue para testar com um PostgreSQL local sem TLS
+            ssl_require=os.environ.get('TAREFAS_BANCO_SSL', 'True').lower() == 'true',
         )
     }
+    if TAREFAS_BANCO_CONEXOES == 'pool':
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.environ.get('TAREFAS_BANCO_POOL_MIN', 1)),
+            'max_size': int(os.environ.get('TAREFAS_BANCO_POOL_MAX', 10)),
+            # Segundos esperando uma conexão livre antes de falhar
+            'timeout': float(os.environ.get('TAREFAS_BANCO_POOL_TIMEOUT', 10)),
+            # Segundos até fechar uma conexão ociosa acima de min_size
+            'max_idle': float(os.environ.get('TAREFAS_BANCO_POOL_OCIOSA', 300)),
+        }
+    elif TAREFAS_BANCO_CONEXOES == 'transacao':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+        DATABASES['default'].setdefault('OPTIONS', {})['prepare_threshold'] = None
+    elif TAREFAS_BANCO_CONEXOES != 'persistente':
+        from django.core.exceptions import ImproperlyConfigured
+        raise ImproperlyConfigured('TAREFAS_BANCO_CONEXOES deve ser persistente, pool ou transacao.')
 else:
     DATABASES = {
         'default': {
@@ -65,9 +103,16 @@ INSTALLED_APPS = [
     'django.contrib.humanize',
     # 'pwa', 
 ]
+if TAREFAS_ENXUTO:
+    # Nenhum template carrega o humanize, e o admin fica para o deploy completo
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ('django.contrib.admin', 'django.contrib.humanize')]
 
+# Também no perfil enxuto: todos atuam em toda requisição (o Vercel manda
+# inclusive /static/ para o WSGI, servido pelo WhiteNoise) e, juntos, levam
+# poucos milissegundos para importar (python manage.py medir_inicializacao)
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,9 +121,6 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-# Configuração WhiteNoise
-# STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-
 ROOT_URLCONF = 'taskmanager.urls'
 
 TEMPLATES = [
@@ -97,6 +139,18 @@ TEMPLATES = [
     },
 ]
 
+# Em produção cada template é lido e compilado uma vez por processo (cached
+# loader). O Django já faz isso quando 'loaders' não é informado; fica
+# explícito para não se perder se alguém configurar loaders próprios.
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'taskmanager.wsgi.application'
 
 # Password validation
@@ -133,17 +187,131 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 STATIC_URL = '/static/'
-# STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
-# if not os.path.exists(STATIC_ROOT):
-#     os.makedirs(STATIC_ROOT)
+# Rode collectstatic no deploy: ele grava os arquivos com hash no nome, as
+# versões .gz/.br e a lista de precache do service worker (tasks/estaticos.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'tasks.estaticos.ArmazenamentoEstatico'},
+}
+# Estáticos que o service worker não baixa antecipadamente
+TAREFAS_PRECACHE_IGNORAR = ['admin/*']
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cache (lista de tarefas por usuário, ver tasks/cache.py). Por padrão locmem;
+# com vários processos use um backend compartilhado, por exemplo
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# CACHE_LOCATION=/tmp/tarefando-cache
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'tarefando'),
+    }
+}
+TAREFAS_CACHE_TIMEOUT = int(os.environ.get('TAREFAS_CACHE_TIMEOUT', 300))
+
+# Categorias de cada usuário (ver tasks/categorias.py): LRU em cada processo,
+# com até TAREFAS_CATEGORIAS_CACHE_MAXIMO usuários válidos por
+# TAREFAS_CATEGORIAS_CACHE_TTL segundos. Com vários processos, aponte
+# TAREFAS_CATEGORIAS_CACHE_ALIAS para um cache compartilhado (por exemplo
+# 'default' com o backend acima)
+TAREFAS_CATEGORIAS_CACHE_MAXIMO = int(os.environ.get('TAREFAS_CATEGORIAS_CACHE_MAXIMO', 10000))
+TAREFAS_CATEGORIAS_CACHE_TTL = float(os.environ.get('TAREFAS_CATEGORIAS_CACHE_TTL', 60))
+TAREFAS_CATEGORIAS_CACHE_ALIAS = os.environ.get('TAREFAS_CATEGORIAS_CACHE_ALIAS') or None
+
+# Sessões (TAREFAS_SESSOES):
+# - banco: tabela django_session, uma consulta por requisição autenticada;
+# - cache: cached_db, lida do cache acima e gravada também no banco, que só é
+#   consultado quando a sessão não está no cache;
+# - cookie: assinada com SECRET_KEY no próprio cookie, sem consulta. O logout
+#   não invalida cópias antigas do cookie, que valem até expirar.
+# Trocar de modo desloga todo mundo.
+TAREFAS_SESSOES = os.environ.get('TAREFAS_SESSOES', 'banco')
+SESSION_ENGINE = {
+    'banco': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cached_db',
+    'cookie': 'django.contrib.sessions.backends.signed_cookies',
+}[TAREFAS_SESSOES]
+# Mensagens só no cookie: o padrão (FallbackStorage) grava na sessão as que
+# não cabem nele
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Lista de tarefas: tamanho da página (paginação por cursor) e tamanho do
+# bloco lido do banco no modo ?stream=1
+TAREFAS_POR_PAGINA = int(os.environ.get('TAREFAS_POR_PAGINA', 50))
+TAREFAS_STREAM_CHUNK = int(os.environ.get('TAREFAS_STREAM_CHUNK', 500))
+
+# Lista, conclusão, edição e categorias em views assíncronas (tasks.views_async).
+# Ligado por padrão quando o projeto sobe por taskmanager.asgi.
+TAREFAS_VIEWS_ASYNC = os.environ.get('TAREFAS_VIEWS_ASYNC', 'False').lower() == 'true'
+
+# E-mail (avisos de tarefas atrasadas, ver tasks/notificacoes.py). Por
+# padrão só escreve no console; em produção, por exemplo
+# EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend e EMAIL_HOST
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False').lower() == 'true'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Tarefando <nao-responda@tarefando.app>')
+
+# Réplicas de leitura (tasks/replicas.py): URLs separadas por vírgula em
+# DATABASE_REPLICA_URLS viram os bancos replica1, replica2... As listas de
+# tarefas e de categorias leem delas; quem gravou lê do primário pelos
+# TAREFAS_REPLICA_FIXAR segundos seguintes. Para testar localmente, com dois
+# arquivos SQLite: DATABASE_REPLICA_URLS=sqlite:////caminho/replica.sqlite3
+TAREFAS_REPLICAS = []
+TAREFAS_REPLICA_FIXAR = int(os.environ.get('TAREFAS_REPLICA_FIXAR', 10))
+for numero, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    import dj_database_url
+    replica = dj_database_url.parse(url.strip())
+    if replica['ENGINE'] == DATABASES['default']['ENGINE']:
+        # Mesmo modo de conexão do primário (TAREFAS_BANCO_CONEXOES)
+        for chave in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'DISABLE_SERVER_SIDE_CURSORS', 'OPTIONS'):
+            if chave in DATABASES['default']:
+                replica[chave] = DATABASES['default'][chave]
+    # Nos testes a réplica é o próprio banco de teste
+    replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica{numero}'] = replica
+    TAREFAS_REPLICAS.append(f'replica{numero}')
+if TAREFAS_REPLICAS:
+    DATABASE_ROUTERS = ['tasks.replicas.RoteadorReplicas']
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware'),
+                      'tasks.replicas.ReplicaMiddleware')
+
+# Perfil de requisições (tasks/perfil.py): cabeçalho Server-Timing, métricas
+# Prometheus em /metrics e cProfile das requisições lentas. Desligado por padrão.
+TAREFAS_PERFIL = os.environ.get('TAREFAS_PERFIL', 'False').lower() == 'true'
+TAREFAS_PERFIL_LENTO_MS = float(os.environ.get('TAREFAS_PERFIL_LENTO_MS', 500))
+# Fração das requisições que roda sob cProfile (só as lentas são gravadas)
+TAREFAS_PERFIL_AMOSTRA = float(os.environ.get('TAREFAS_PERFIL_AMOSTRA', 0.01))
+TAREFAS_PERFIL_DIR = os.environ.get('TAREFAS_PERFIL_DIR', os.path.join(tempfile.gettempdir(), 'tarefando-perfis'))
+# Se definido, /metrics exige "Authorization: Bearer <token>"
+TAREFAS_METRICAS_TOKEN = os.environ.get('TAREFAS_METRICAS_TOKEN', '')
+if TAREFAS_PERFIL:
+    MIDDLEWARE.insert(0, 'tasks.perfil.PerfilMiddleware')
+    TEMPLATES[0]['BACKEND'] = 'tasks.perfil.DjangoTemplates'
+    # Os mesmos backends de banco, medindo a aquisição de conexões
+    for banco in DATABASES.values():
+        banco['ENGINE'] = {
+            'django.db.backends.postgresql': 'tasks.bancos.postgresql',
+            'django.db.backends.sqlite3': 'tasks.bancos.sqlite3',
+        }.get(banco['ENGINE'], banco['ENGINE'])
+
+# Sincronização do PWA: registros por página (padrão e máximo)
+SYNC_LIMITE = 500
+SYNC_LIMITE_MAXIMO = 1000
+# Arquivo (tasks/arquivo.py): tarefas concluídas há mais que isto (dias)
+# saem da tabela de tarefas pelo comando arquivar_tarefas
+TAREFAS_ARQUIVAR_APOS_DIAS = int(os.environ.get('TAREFAS_ARQUIVAR_APOS_DIAS', 90))
 # Redirecionar usuários autenticados que tentam acessar login
 from django.urls import reverse_lazy
 LOGIN_REDIRECT_URL = 'tasks:lista_tarefas'
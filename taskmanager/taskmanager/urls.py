@@ -1,10 +1,18 @@
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
 
+from tasks.views import metricas, service_worker
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('', include('tasks.urls')),  # Inclui as URLs do app tasks
+    path('metrics', metricas, name='metricas'),  # Prometheus, com TAREFAS_PERFIL
+    path('sw.js', service_worker, name='service_worker'),  # na raiz para valer para o site todo
     path('login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
     path('logout/', auth_views.LoginView.as_view(template_name='registration/logout.html'), name='logout'),
-]
\ No newline at end of file
+]
+
+# Fora do perfil enxuto (TAREFAS_ENXUTO nas settings), que não instala o admin
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
@@ -1,8 +1,160 @@
-from django.contrib import admin
-from .models import Tarefa
+"""
+Admin de tarefas e categorias para tabelas grandes.
+
+- O total da listagem vem de ``PaginatorEstimado`` (estimativa do planner
+  quando o resultado é grande) e o total sem filtros não é contado.
+- Na ordem padrão a listagem é paginada por cursor (``ChangeListPorCursor``),
+  com custo igual em qualquer página; ordenada por uma coluna, volta à
+  paginação por número de página.
+- Usuário e categoria são escolhidos por autocomplete, e as linhas já vêm
+  com eles (list_select_related).
+- As ações são as de ``tasks.lote``: um UPDATE ou DELETE para o conjunto
+  todo, com os contadores, o sync e o cache acertados.
+"""
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.options import ShowFacets
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.contrib.auth.models import User
+from django.template.response import TemplateResponse
+from django.utils.decorators import method_decorator
+from .busca import buscar_tarefas
+from .lote import alterar_em_lote, excluir_em_lote, transferir_em_lote
+from .models import Categoria, Tarefa
+from .paginacao import KeysetPaginator, PaginatorEstimado, contagem_estimada
+from .replicas import ler_da_replica
+
+CURSOR_VAR = 'cursor'
+
+
+class ChangeListPorCursor(ChangeList):
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.por_cursor = False
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        # O cursor não é filtro
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_results(self, request):
+        # Os links de filtro e ordenação voltam à primeira página
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+        if ORDER_VAR in self.params or self.show_all:
+            return super().get_results(request)
+
+        self.pagina = KeysetPaginator(
+            self.queryset, self.list_per_page, ordering=self.model_admin.get_ordering(request),
+        ).pagina(self.cursor)
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = self.pagina.objetos
+        self.can_show_all = False
+        self.multi_page = self.pagina.tem_proxima or not self.pagina.eh_primeira
+        self.por_cursor = True
+
+    def url_proxima(self):
+        return self.get_query_string({CURSOR_VAR: self.pagina.proximo_cursor})
+
+
+class AdminEscalavel(admin.ModelAdmin):
+    paginator = PaginatorEstimado
+    # Sem o COUNT(*) da tabela inteira a cada página
+    show_full_result_count = False
+    # As contagens por opção de filtro seriam um COUNT por opção
+    show_facets = ShowFacets.NEVER
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListPorCursor
+
+    # A listagem lê de uma réplica, se houver (ver tasks/replicas.py)
+    @method_decorator(ler_da_replica)
+    def changelist_view(self, request, extra_context=None):
+        return super().changelist_view(request, extra_context)
+
+
+class AcaoTarefaForm(helpers.ActionForm):
+    usuario = forms.CharField(
+        required=False, label='Para o usuário', help_text='Nome do usuário, para "Transferir"',
+    )
+
 
 @admin.register(Tarefa)
-class TarefaAdmin(admin.ModelAdmin):
-    list_display = ['descricao', 'prioridade', 'data_vencimento', 'concluida', 'usuario']
+class TarefaAdmin(AdminEscalavel):
+    list_display = ['descricao', 'prioridade', 'data_vencimento', 'concluida', 'usuario', 'categoria']
+    list_select_related = ['usuario', 'categoria']
     list_filter = ['prioridade', 'concluida', 'data_vencimento']
-    search_fields = ['descricao']
\ No newline at end of file
+    autocomplete_fields = ['usuario', 'categoria']
+    # A busca usa o índice textual (ver tasks/busca.py); search_fields só
+    # habilita a caixa de busca
+    search_fields = ['descricao']
+    # Mesma ordem do índice tarefa_ordem_idx; com o id o admin não acrescenta
+    # "-pk" e a listagem não precisa de ordenação em memória
+    ordering = ['-prioridade', 'data_vencimento', 'id']
+    action_form = AcaoTarefaForm
+    actions = ['concluir', 'reabrir', 'transferir', 'excluir']
+
+    def get_actions(self, request):
+        # A exclusão padrão carrega e lista cada objeto antes de excluir
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # A ordem da listagem continua a do admin
+        return buscar_tarefas(queryset, search_term, ordenar=False), False
+
+    @admin.action(description='Marcar como concluídas', permissions=['change'])
+    def concluir(self, request, queryset):
+        alteradas = alterar_em_lote(queryset, concluida=True)
+        self.message_user(request, f'{alteradas} tarefa(s) marcada(s) como concluída(s).')
+
+    @admin.action(description='Marcar como pendentes', permissions=['change'])
+    def reabrir(self, request, queryset):
+        alteradas = alterar_em_lote(queryset, concluida=False)
+        self.message_user(request, f'{alteradas} tarefa(s) marcada(s) como pendente(s).')
+
+    @admin.action(description='Transferir para o usuário informado', permissions=['change'])
+    def transferir(self, request, queryset):
+        nome = request.POST.get('usuario', '').strip()
+        usuario_id = User.objects.filter(username=nome).values_list('id', flat=True).first() if nome else None
+        if usuario_id is None:
+            self.message_user(request, 'Informe o nome de um usuário existente.', messages.ERROR)
+            return
+        transferidas = transferir_em_lote(queryset, usuario_id)
+        self.message_user(request, f'{transferidas} tarefa(s) transferida(s) para {nome}.')
+
+    @admin.action(description='Excluir as tarefas selecionadas', permissions=['delete'])
+    def excluir(self, request, queryset):
+        if request.POST.get('post') != 'sim':
+            quantidade, estimado = contagem_estimada(queryset)
+            return TemplateResponse(request, 'admin/tasks/tarefa/excluir_selecionadas.html', {
+                **self.admin_site.each_context(request),
+                'title': 'Excluir tarefas',
+                'opts': self.model._meta,
+                'quantidade': quantidade,
+                'estimado': estimado,
+                'selecionadas': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+                'select_across': request.POST.get('select_across', '0'),
+                'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            })
+        excluidas = excluir_em_lote(queryset)
+        self.message_user(request, f'{excluidas} tarefa(s) excluída(s).')
+
+
+@admin.register(Categoria)
+class CategoriaAdmin(AdminEscalavel):
+    list_display = ['nome', 'cor', 'usuario']
+    list_select_related = ['usuario']
+    autocomplete_fields = ['usuario']
+    search_fields = ['nome']
+    ordering = ['-id']
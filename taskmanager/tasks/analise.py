@@ -0,0 +1,117 @@
+"""
+Métricas de produtividade (taxa de conclusão, atrasos, prazo e estimativa
+contra o realizado) por usuário e por categoria, calculadas com pandas.
+
+As colunas das tarefas vêm de ``values_list`` direto para arrays e todas as
+métricas saem de uma única passada vetorizada, somada por grupo. O comando
+``gerar_resumos_diarios`` grava o resultado em ResumoDiario uma vez por dia;
+os relatórios leem só essa tabela.
+
+O estado de cada tarefa é o do fim do dia calculado: conta se já tinha sido
+criada (``data_criacao``) e se já tinha sido concluída (``data_conclusao``),
+então uma tarefa concluída depois ainda aparece como pendente (e atrasada)
+naquele dia. Tarefas concluídas sem ``data_conclusao`` (anteriores ao campo)
+contam como concluídas pelo estado atual, e ficam fora das métricas de prazo
+e de tempo.
+
+O "realizado" é o tempo decorrido entre a criação e a conclusão da tarefa, o
+único dado de duração que o sistema registra.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ResumoDiario, Tarefa
+
+COLUNAS = [
+    'usuario_id', 'categoria_id', 'concluida', 'data_vencimento', 'data_criacao', 'data_conclusao',
+    'tempo_estimado',
+]
+METRICAS = ResumoDiario.METRICAS
+
+
+def carregar(tarefas, chunk_size=5000):
+    """DataFrame com as COLUNAS do queryset, lido em blocos"""
+    linhas = tarefas.order_by().values_list(*COLUNAS).iterator(chunk_size=chunk_size)
+    return pd.DataFrame.from_records(linhas, columns=COLUNAS)
+
+
+def calcular(df, dia):
+    """
+    Métricas do dia ``dia`` (no fuso atual) para as tarefas de ``df``.
+    Retorna (por_usuario, por_categoria): DataFrames com as METRICAS,
+    indexados por usuario_id e por (categoria_id, usuario_id).
+    """
+    fuso = timezone.get_current_timezone()
+    inicio = pd.Timestamp(datetime.datetime.combine(dia, datetime.time.min), tz=fuso)
+    fim = inicio + pd.Timedelta(days=1)
+
+    criacao = pd.to_datetime(df['data_criacao'], utc=True)
+    # Tarefas criadas depois do dia ainda não existiam nele
+    df = df[(criacao < fim).to_numpy()]
+    criacao = criacao.loc[df.index]
+
+    conclusao = pd.to_datetime(df['data_conclusao'], utc=True)
+    tem_conclusao = conclusao.notna().to_numpy()
+    # Concluída até o fim do dia, não agora; sem data_conclusao vale o estado atual
+    concluida = np.where(tem_conclusao, (conclusao < fim).to_numpy(), df['concluida'].to_numpy(dtype=bool))
+    medida = tem_conclusao & concluida
+    vencimento = pd.to_datetime(df['data_vencimento'])
+    estimado = df['tempo_estimado'].to_numpy(dtype=np.int64)
+
+    # O prazo vai até o fim do dia de vencimento
+    fim_prazo = vencimento.dt.tz_localize(fuso) + pd.Timedelta(days=1)
+    decorrido = np.nan_to_num(((conclusao - criacao).dt.total_seconds() / 60).to_numpy(dtype=float))
+    com_estimativa = medida & (estimado > 0)
+
+    metricas = pd.DataFrame({
+        'usuario_id': df['usuario_id'].to_numpy(),
+        'categoria_id': df['categoria_id'].to_numpy(),
+        'total': 1,
+        'concluidas': concluida,
+        'pendentes': ~concluida,
+        'atrasadas': ~concluida & (vencimento < pd.Timestamp(dia)).to_numpy(),
+        'criadas_no_dia': (criacao >= inicio).to_numpy(),
+        'concluidas_no_dia': medida & ((conclusao >= inicio) & (conclusao < fim)).to_numpy(),
+        'concluidas_medidas': medida,
+        'concluidas_no_prazo': medida & (conclusao < fim_prazo).to_numpy(),
+        'tempo_estimado_medido': np.where(com_estimativa, estimado, 0),
+        'tempo_decorrido_medido': np.where(com_estimativa, np.rint(decorrido), 0).astype(np.int64),
+    })
+
+    por_usuario = metricas.groupby('usuario_id')[METRICAS].sum()
+    por_categoria = (
+        metricas.dropna(subset=['categoria_id'])
+        .astype({'categoria_id': np.int64})
+        .groupby(['categoria_id', 'usuario_id'])[METRICAS].sum()
+    )
+    return por_usuario, por_categoria
+
+
+def gerar_resumos(dia, usuario_ids):
+    """
+    (Re)grava os ResumoDiario do dia para os usuários informados: uma linha
+    por usuário, mesmo sem tarefas, e uma por categoria com tarefas.
+    """
+    usuario_ids = list(usuario_ids)
+    por_usuario, por_categoria = calcular(carregar(Tarefa.objects.filter(usuario_id__in=usuario_ids)), dia)
+    por_usuario = por_usuario.reindex(usuario_ids, fill_value=0)
+
+    resumos = [
+        ResumoDiario(data=dia, usuario_id=usuario_id, **{campo: int(linha[campo]) for campo in METRICAS})
+        for usuario_id, linha in por_usuario.iterrows()
+    ]
+    resumos += [
+        ResumoDiario(
+            data=dia, usuario_id=usuario_id, categoria_id=categoria_id,
+            **{campo: int(linha[campo]) for campo in METRICAS},
+        )
+        for (categoria_id, usuario_id), linha in por_categoria.iterrows()
+    ]
+    with transaction.atomic():
+        ResumoDiario.objects.filter(data=dia, usuario_id__in=usuario_ids).delete()
+        ResumoDiario.objects.bulk_create(resumos, batch_size=1000)
+    return len(resumos)
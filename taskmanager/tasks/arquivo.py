@@ -0,0 +1,93 @@
+"""
+Arquivo das tarefas concluídas há muito tempo.
+
+A tabela de tarefas, lida pela lista, agenda, sync e admin, fica só com o
+trabalho em andamento e o concluído recentemente. ``arquivar`` move as
+concluídas há mais de ``TAREFAS_ARQUIVAR_APOS_DIAS`` dias para
+TarefaArquivada, com o mesmo id, em lotes; ``restaurar`` faz o caminho
+inverso. Cada lote é uma transação: uma execução interrompida deixa só lotes
+inteiros movidos e a seguinte continua do que sobrou.
+
+Para o resto do app arquivar é excluir e restaurar é criar: os contadores,
+as exclusões do sync e o cache são acertados como nas operações de
+``tasks.lote``. Tarefas concluídas sem data de conclusão (anteriores ao
+campo) contam pelo vencimento. Modelos e ocorrências gravadas de séries ativas não são
+arquivados: sem a linha, a ocorrência voltaria a ser gerada (ver
+tasks/recorrencia.py).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .cache import invalidar_usuario
+from .estatisticas import estado_tarefa, registrar_alteracoes
+from .lote import excluir_em_lote
+from .models import Exclusao, Tarefa, TarefaArquivada
+from .sync import proxima_sequencia
+
+# Campos copiados de uma tabela para a outra
+CAMPOS = [
+    'id', 'usuario_id', 'descricao', 'prioridade', 'data_vencimento', 'data_criacao', 'data_conclusao',
+    'categoria_id', 'notas', 'tempo_estimado',
+]
+
+
+def arquivaveis(limite):
+    """Tarefas concluídas antes de ``limite`` (datetime) que podem ir para o arquivo"""
+    return Tarefa.objects.filter(
+        Q(data_conclusao__lt=limite) | Q(data_conclusao__isnull=True, data_vencimento__lt=limite.date()),
+        concluida=True, serie__isnull=True,
+    )
+
+
+def arquivar(dias=None, lote=1000, lotes=None, agora=None):
+    """
+    Arquiva as tarefas concluídas há mais de ``dias`` dias, ``lote`` por
+    transação, até acabarem ou até ``lotes`` lotes. Retorna quantas foram
+    arquivadas.
+    """
+    dias = settings.TAREFAS_ARQUIVAR_APOS_DIAS if dias is None else dias
+    limite = (agora or timezone.now()) - timedelta(days=dias)
+    arquivadas = feitos = 0
+    while lotes is None or feitos < lotes:
+        with transaction.atomic():
+            # Travadas até o commit: uma tarefa reaberta agora espera o lote
+            # ou fica para o próximo
+            ids = list(
+                arquivaveis(limite).select_for_update(skip_locked=True).order_by().values_list('id', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            tarefas = Tarefa.objects.filter(pk__in=ids)
+            TarefaArquivada.objects.bulk_create([TarefaArquivada(**linha) for linha in tarefas.values(*CAMPOS)])
+            arquivadas += excluir_em_lote(tarefas)
+        feitos += 1
+    return arquivadas
+
+
+def restaurar(usuario_id, ids):
+    """
+    Devolve à tabela de tarefas as arquivadas ``ids`` do usuário, como
+    concluídas e com uma versão nova do sync. Retorna quantas voltaram.
+    """
+    with transaction.atomic():
+        arquivadas = TarefaArquivada.objects.select_for_update().filter(usuario_id=usuario_id, pk__in=ids)
+        linhas = list(arquivadas.values(*CAMPOS))
+        if not linhas:
+            return 0
+        versao = proxima_sequencia(usuario_id)
+        tarefas = Tarefa.objects.bulk_create([Tarefa(**linha, concluida=True, versao_sync=versao) for linha in linhas])
+        restauradas = [tarefa.pk for tarefa in tarefas]
+        # bulk_create preenche data_criacao com a hora atual (auto_now_add)
+        Tarefa.objects.filter(pk__in=restauradas).update(data_criacao=Subquery(
+            TarefaArquivada.objects.filter(pk=OuterRef('pk')).values('data_criacao')[:1]
+        ))
+        registrar_alteracoes([(None, estado_tarefa(tarefa)) for tarefa in tarefas], usuario_id=usuario_id)
+        # O aparelho que ainda não viu a exclusão não precisa vê-la
+        Exclusao.objects.filter(usuario_id=usuario_id, tipo='tarefa', objeto_id__in=restauradas).delete()
+        TarefaArquivada.objects.filter(pk__in=restauradas).delete()
+        invalidar_usuario(usuario_id)
+    return len(restauradas)
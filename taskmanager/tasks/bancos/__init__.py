@@ -0,0 +1,19 @@
+"""
+Backends de banco que medem a aquisição de conexões (ver tasks.perfil).
+
+São os backends do Django com ``connect()`` cronometrado: o tempo vai para a
+fase ``conexao`` da requisição e para as métricas de /metrics, separado pela
+origem da conexão (``nova``, usada pela primeira vez; ``pool``, já usada
+antes e devolvida pelo pool do psycopg). Com ``TAREFAS_PERFIL`` ligado, settings troca o ENGINE do banco por
+``tasks.bancos.postgresql`` ou ``tasks.bancos.sqlite3``.
+"""
+import time
+
+from .. import perfil
+
+
+class ConexaoMedida:
+    def connect(self):
+        inicio = time.perf_counter()
+        super().connect()
+        perfil.conexao_adquirida(self.connection, time.perf_counter() - inicio)
@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from .. import ConexaoMedida
+
+
+class DatabaseWrapper(ConexaoMedida, base.DatabaseWrapper):
+    pass
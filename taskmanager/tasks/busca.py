@@ -0,0 +1,122 @@
+"""
+Busca textual indexada nas tarefas (descrição, notas e nome da categoria).
+
+O índice depende do banco:
+
+- SQLite: tabela virtual FTS5 ``tasks_tarefa_busca`` (rowid = id da tarefa),
+  com uma coluna ``dono`` ("u<id do usuário>") para que a busca de um usuário
+  percorra só as entradas dele.
+- PostgreSQL: coluna ``busca`` (tsvector, fora do modelo) em tasks_tarefa,
+  com índice GIN.
+
+Nos dois casos o índice é mantido por triggers no banco, então acompanha toda
+escrita: save(), update()/delete() em queryset, operações de ``tasks.lote``,
+sync e renomeação de categoria. Os triggers são criados pela migração 0007;
+no SQLite, migrações que recriam a tabela tasks_tarefa precisam removê-los
+antes e recriá-los depois (como a 0009). Em outros bancos a busca cai para
+``icontains``, sem índice.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .paginacao import Pagina
+
+TABELA_FTS = 'tasks_tarefa_busca'
+CONFIG_POSTGRES = 'portuguese'
+MAXIMO_TERMOS = 8
+
+# Pesos do bm25 na ordem das colunas da tabela FTS: dono, descricao, notas, categoria
+PESOS_FTS = '0.0, 10.0, 2.0, 5.0'
+
+
+def termos(texto):
+    """Palavras da busca, sem a sintaxe própria de FTS5/tsquery"""
+    return re.findall(r'\w+', texto.lower())[:MAXIMO_TERMOS]
+
+
+def _expressao_fts(palavras, usuario_id=None):
+    # Cada palavra vira um prefixo entre aspas, e todas precisam aparecer
+    expressao = '{descricao notas categoria} : (%s)' % ' AND '.join(f'"{p}"*' for p in palavras)
+    if usuario_id is not None:
+        expressao = f'dono : "u{usuario_id}" AND {expressao}'
+    return expressao
+
+
+def buscar_tarefas(tarefas, texto, usuario_id=None, ordenar=True):
+    """
+    Filtra o queryset ``tarefas`` pelas palavras de ``texto``. Com ``ordenar``
+    o resultado vem anotado com ``relevancia`` (maior é melhor) e ordenado por
+    ela, com a ordem normal da lista como desempate. ``usuario_id`` restringe a
+    busca no índice às entradas do usuário (o queryset já deve estar filtrado).
+    """
+    palavras = termos(texto)
+    if not palavras:
+        return tarefas.none()
+
+    vendor = connections[tarefas.db].vendor
+    tabela = tarefas.model._meta.db_table
+    if vendor == 'sqlite':
+        expressao = _expressao_fts(palavras, usuario_id)
+        tarefas = tarefas.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s', [expressao],
+        ))
+        relevancia = RawSQL(
+            f'SELECT -bm25({TABELA_FTS}, {PESOS_FTS}) FROM {TABELA_FTS} '
+            f'WHERE {TABELA_FTS} MATCH %s AND rowid = "{tabela}"."id"',
+            [expressao], output_field=FloatField(),
+        )
+    elif vendor == 'postgresql':
+        consulta = ' & '.join(f'{p}:*' for p in palavras)
+        tarefas = tarefas.filter(RawSQL(
+            f'"{tabela}"."busca" @@ to_tsquery(%s, %s)', [CONFIG_POSTGRES, consulta],
+            output_field=BooleanField(),
+        ))
+        relevancia = RawSQL(
+            f'ts_rank_cd("{tabela}"."busca", to_tsquery(%s, %s))', [CONFIG_POSTGRES, consulta],
+            output_field=FloatField(),
+        )
+    else:
+        for palavra in palavras:
+            tarefas = tarefas.filter(
+                Q(descricao__icontains=palavra) | Q(notas__icontains=palavra)
+                | Q(categoria__nome__icontains=palavra)
+            )
+        relevancia = Value(0.0, output_field=FloatField())
+
+    if not ordenar:
+        return tarefas
+    ordem = [*tarefas.model._meta.ordering, 'id']
+    return tarefas.annotate(relevancia=relevancia).order_by('-relevancia', *ordem)
+
+
+def pagina_busca(tarefas, numero, por_pagina=50):
+    """
+    Página ``numero`` (a partir de 1) de um resultado de ``buscar_tarefas``.
+    A ordem por relevância não permite cursor por valores, então a paginação
+    é por OFFSET; o número da página faz o papel do cursor em ``Pagina``.
+    """
+    numero = _numero_pagina(numero)
+    inicio = (numero - 1) * por_pagina
+    return _montar_pagina(list(tarefas[inicio:inicio + por_pagina + 1]), numero, por_pagina)
+
+
+async def apagina_busca(tarefas, numero, por_pagina=50):
+    """Versão assíncrona de ``pagina_busca``"""
+    numero = _numero_pagina(numero)
+    inicio = (numero - 1) * por_pagina
+    return _montar_pagina([t async for t in tarefas[inicio:inicio + por_pagina + 1]], numero, por_pagina)
+
+
+def _numero_pagina(numero):
+    try:
+        return max(1, int(numero))
+    except (TypeError, ValueError):
+        return 1
+
+
+def _montar_pagina(objetos, numero, por_pagina):
+    proximo = str(numero + 1) if len(objetos) > por_pagina else None
+    return Pagina(objetos[:por_pagina], proximo, str(numero) if numero > 1 else None)
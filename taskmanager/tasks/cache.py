@@ -0,0 +1,197 @@
+"""
+Cache por usuário da lista de tarefas.
+
+Cada usuário tem um número de versão guardado no cache. Ele é um timestamp em
+milissegundos, atualizado (pelos signals em ``tasks.signals``) no commit de
+toda transação que salva ou exclui uma Tarefa ou Categoria do usuário. As
+entradas da lista usam a versão na chave, então uma alteração invalida tudo de
+uma vez sem precisar apagar chave por chave, e o mesmo valor serve de
+Last-Modified/ETag.
+
+O HTML de cada linha da lista também fica em cache, com a chave formada
+pelo id e pela ``versao_sync`` da tarefa (que muda a cada escrita, ver
+tasks/sync.py), pela versão da categoria e pelo dia, por causa das
+atrasadas. Assim, quando a versão do usuário muda e a página é montada de
+novo, só as linhas novas ou alteradas são renderizadas. A categoria de cada
+linha vem do cache de categorias (ver tasks/categorias.py), sem JOIN.
+
+As funções com prefixo ``a`` são as versões assíncronas, usadas por
+``tasks.views_async``.
+
+Funciona com qualquer backend do Django (locmem, arquivo, Redis...). Com
+locmem cada processo tem seu próprio cache, então em produção com vários
+workers use um backend compartilhado.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import partial
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .categorias import aanexar_categorias, anexar_categorias
+
+
+def _cache():
+    return caches[getattr(settings, 'TAREFAS_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'TAREFAS_CACHE_TIMEOUT', 300)
+
+
+def _timeout_linha():
+    return getattr(settings, 'TAREFAS_CACHE_LINHA_TIMEOUT', 24 * 60 * 60)
+
+
+def _chave_versao(usuario_id):
+    return f'tasks:versao:{usuario_id}'
+
+
+def versao_usuario(usuario_id):
+    chave = _chave_versao(usuario_id)
+    versao = _cache().get(chave)
+    if versao is None:
+        # Sem versão conhecida (cache novo ou despejado): assume alteração agora
+        versao = int(time.time() * 1000)
+        _cache().add(chave, versao, timeout=None)
+        versao = _cache().get(chave, versao)
+    return versao
+
+
+async def aversao_usuario(usuario_id):
+    """Versão assíncrona de ``versao_usuario``"""
+    chave = _chave_versao(usuario_id)
+    versao = await _cache().aget(chave)
+    if versao is None:
+        versao = int(time.time() * 1000)
+        await _cache().aadd(chave, versao, timeout=None)
+        versao = await _cache().aget(chave, versao)
+    return versao
+
+
+def _nova_versao(usuario_id):
+    chave = _chave_versao(usuario_id)
+    anterior = _cache().get(chave) or 0
+    _cache().set(chave, max(int(time.time() * 1000), anterior + 1), timeout=None)
+
+
+def invalidar_usuario(usuario_id):
+    """
+    Marca os dados do usuário como alterados, no commit da transação atual
+    (ou já, fora de uma): antes dele uma requisição concorrente ainda lê as
+    linhas antigas e as guardaria na chave da versão nova
+    """
+    transaction.on_commit(partial(_nova_versao, usuario_id))
+
+
+def _chave_lista(usuario_id, versao, partes):
+    resumo = hashlib.md5(repr(partes).encode(), usedforsecurity=False).hexdigest()
+    return f'tasks:lista:{usuario_id}:{versao}:{resumo}'
+
+
+def chave_lista(usuario_id, *partes):
+    return _chave_lista(usuario_id, versao_usuario(usuario_id), partes)
+
+
+async def achave_lista(usuario_id, *partes):
+    return _chave_lista(usuario_id, await aversao_usuario(usuario_id), partes)
+
+
+def obter_lista(chave):
+    return _cache().get(chave)
+
+
+async def aobter_lista(chave):
+    return await _cache().aget(chave)
+
+
+def guardar_lista(chave, valor):
+    _cache().set(chave, valor, timeout=_timeout())
+
+
+async def aguardar_lista(chave, valor):
+    await _cache().aset(chave, valor, timeout=_timeout())
+
+
+def _chave_linha(tarefa, dia):
+    versao_categoria = tarefa.categoria.versao_sync if tarefa.categoria else 0
+    if tarefa.pk is None:
+        # Ocorrência não gravada de uma série: a versão é a do modelo (ver tasks/recorrencia.py)
+        return f'tasks:ocorrencia:{tarefa.serie_id}:{tarefa.data_ocorrencia}:{tarefa.versao_sync}:{versao_categoria}:{dia}'
+    return f'tasks:linha:{tarefa.pk}:{tarefa.versao_sync}:{versao_categoria}:{dia}'
+
+
+def _montar_linhas(tarefas, chaves, prontas):
+    """Junta o HTML das linhas, renderizando as que faltam; retorna (html, novas)"""
+    linha = get_template('tasks/_tarefa_linha.html')
+    novas = {}
+    partes = []
+    for tarefa, chave in zip(tarefas, chaves):
+        html = prontas.get(chave)
+        if html is None:
+            html = novas[chave] = linha.render({'tarefa': tarefa})
+        partes.append(html)
+    return ''.join(partes), novas
+
+
+def renderizar_linhas(tarefas, dia):
+    """
+    HTML das linhas de ``tarefas``, lendo do cache as que não mudaram. ``dia``
+    é a data usada para as atrasadas.
+    """
+    tarefas = list(tarefas)
+    anexar_categorias(tarefas)
+    chaves = [_chave_linha(tarefa, dia) for tarefa in tarefas]
+    html, novas = _montar_linhas(tarefas, chaves, _cache().get_many(chaves))
+    if novas:
+        _cache().set_many(novas, timeout=_timeout_linha())
+    return html
+
+
+async def arenderizar_linhas(tarefas, dia):
+    tarefas = list(tarefas)
+    await aanexar_categorias(tarefas)
+    chaves = [_chave_linha(tarefa, dia) for tarefa in tarefas]
+    html, novas = _montar_linhas(tarefas, chaves, await _cache().aget_many(chaves))
+    if novas:
+        await _cache().aset_many(novas, timeout=_timeout_linha())
+    return html
+
+
+def _tem_mensagens(request):
+    # len() não marca as mensagens como lidas
+    return len(messages.get_messages(request)) > 0
+
+
+def etag_lista_tarefas(request, *args, **kwargs):
+    """
+    ETag da lista de tarefas. A página também mostra mensagens e o token CSRF,
+    então não há ETag quando existem mensagens pendentes, e o segredo CSRF
+    entra no hash para que um token rotacionado nunca seja reaproveitado.
+    """
+    if not request.user.is_authenticated or _tem_mensagens(request):
+        return None
+    get_token(request)
+    partes = (
+        request.user.pk,
+        request.user.get_username(),
+        versao_usuario(request.user.pk),
+        sorted(request.GET.lists()),
+        timezone.localdate().isoformat(),
+        request.META.get('CSRF_COOKIE', ''),
+    )
+    return hashlib.sha256(repr(partes).encode()).hexdigest()
+
+
+def last_modified_lista_tarefas(request, *args, **kwargs):
+    if not request.user.is_authenticated or _tem_mensagens(request):
+        return None
+    versao = versao_usuario(request.user.pk)
+    return datetime.fromtimestamp(versao / 1000, tz=dt_timezone.utc)
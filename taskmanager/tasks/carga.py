@@ -0,0 +1,133 @@
+"""
+Teste de carga HTTP para comparar o projeto servido por WSGI e por ASGI.
+
+O cliente é feito com asyncio e sockets, sem dependências: ``concorrencia``
+conexões keep-alive disparam ``requisicoes`` GETs no total, revezando entre
+os caminhos informados, e cada resposta tem a latência anotada. Um cliente
+com threads saturaria antes do servidor; aqui o custo por requisição do lado
+do cliente é pequeno o bastante para centenas de conexões simultâneas.
+
+O comando ``teste_carga`` cria a sessão autenticada e imprime a comparação.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+@dataclass
+class ResultadoCarga:
+    nome: str
+    segundos: float = 0.0
+    # Latência de cada resposta 2xx, em milissegundos; o resto conta como erro
+    latencias: list = field(default_factory=list)
+    erros: int = 0
+    status: dict = field(default_factory=dict)
+
+    @property
+    def requisicoes(self):
+        return len(self.latencias) + self.erros
+
+    @property
+    def por_segundo(self):
+        return len(self.latencias) / self.segundos if self.segundos else 0.0
+
+    def percentil(self, p):
+        return float(np.percentile(self.latencias, p)) if self.latencias else 0.0
+
+    def como_dict(self):
+        return {
+            'nome': self.nome, 'requisicoes': self.requisicoes, 'erros': self.erros,
+            'por_segundo': round(self.por_segundo, 1),
+            **{f'p{p}_ms': round(self.percentil(p), 1) for p in (50, 95, 99)},
+            'max_ms': round(max(self.latencias, default=0.0), 1),
+            'status': self.status,
+        }
+
+
+class _Conexao:
+    """Uma conexão HTTP/1.1 keep-alive, refeita quando o servidor a fecha"""
+
+    def __init__(self, host, porta, cabecalhos):
+        self.host, self.porta = host, porta
+        self.cabecalhos = ''.join(f'{nome}: {valor}\r\n' for nome, valor in cabecalhos.items())
+        self.leitor = self.escritor = None
+
+    async def get(self, caminho):
+        """Faz o GET e devolve o status, lendo (e descartando) o corpo"""
+        if self.escritor is None:
+            self.leitor, self.escritor = await asyncio.open_connection(self.host, self.porta)
+        self.escritor.write(
+            f'GET {caminho} HTTP/1.1\r\nHost: {self.host}:{self.porta}\r\n{self.cabecalhos}\r\n'.encode()
+        )
+        await self.escritor.drain()
+
+        status = int((await self.leitor.readline()).split()[1])
+        tamanho, chunked, fechar = 0, False, False
+        while (linha := await self.leitor.readline()) not in (b'\r\n', b''):
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            nome, valor = nome.strip().lower(), valor.strip().lower()
+            if nome == 'content-length':
+                tamanho = int(valor)
+            elif nome == 'transfer-encoding':
+                chunked = 'chunked' in valor
+            elif nome == 'connection':
+                fechar = valor == 'close'
+
+        if chunked:
+            while tamanho_bloco := int((await self.leitor.readline()).split(b';')[0], 16):
+                await self.leitor.readexactly(tamanho_bloco + 2)
+            await self.leitor.readline()
+        elif tamanho:
+            await self.leitor.readexactly(tamanho)
+        if fechar:
+            self.fechar()
+        return status
+
+    def fechar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+        self.leitor = self.escritor = None
+
+
+async def _medir(nome, url, caminhos, cabecalhos, concorrencia, requisicoes):
+    partes = urlsplit(url)
+    prefixo = partes.path.rstrip('/')
+    resultado = ResultadoCarga(nome)
+    restantes = iter(range(requisicoes))
+
+    async def trabalhador():
+        conexao = _Conexao(partes.hostname, partes.port or 80, cabecalhos)
+        for i in restantes:
+            inicio = time.perf_counter()
+            try:
+                status = await conexao.get(prefixo + caminhos[i % len(caminhos)])
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                conexao.fechar()
+                resultado.erros += 1
+                continue
+            resultado.status[status] = resultado.status.get(status, 0) + 1
+            if 200 <= status < 300:
+                resultado.latencias.append((time.perf_counter() - inicio) * 1000)
+            else:
+                resultado.erros += 1
+        conexao.fechar()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def medir(nome, url, caminhos, cabecalhos=None, concorrencia=100, requisicoes=2000, aquecimento=0):
+    """
+    Dispara a carga contra ``url`` e devolve um ResultadoCarga. As
+    ``aquecimento`` primeiras requisições (caches, conexões do banco) são
+    feitas antes e ficam fora da medição.
+    """
+    cabecalhos = cabecalhos or {}
+    if aquecimento:
+        asyncio.run(_medir(nome, url, caminhos, cabecalhos, min(concorrencia, aquecimento), aquecimento))
+    return asyncio.run(_medir(nome, url, caminhos, cabecalhos, concorrencia, requisicoes))
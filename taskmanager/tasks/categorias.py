@@ -0,0 +1,245 @@
+"""
+Cache das categorias de cada usuário.
+
+As categorias de um usuário são poucas e aparecem em quase toda tela: no
+select do formulário de tarefa e das ações em lote, em cada linha da lista
+(nome e cor) e na tela de categorias. ``categorias_do_usuario`` devolve o
+mapa id -> ``ResumoCategoria`` (nome, cor e versão do sync, que entra na
+chave do cache das linhas, ver tasks/cache.py), lido nesta ordem de:
+
+1. um LRU no próprio processo, com até ``TAREFAS_CATEGORIAS_CACHE_MAXIMO``
+   usuários, cada um válido por ``TAREFAS_CATEGORIAS_CACHE_TTL`` segundos;
+2. o cache ``TAREFAS_CATEGORIAS_CACHE_ALIAS`` do Django, se configurado,
+   compartilhado entre os processos;
+3. o banco, com uma consulta.
+
+Os signals de Categoria (e quem cria categorias com bulk_create) chamam
+``invalidar_categorias``, que apaga as duas camadas no processo atual. Nos
+outros processos o LRU só expira pelo TTL: uma categoria renomeada pode
+aparecer com o nome antigo por esse tempo. Uma categoria nova nunca falta,
+porque ``anexar_categorias`` relê o mapa quando não encontra um id. Um mapa
+lido de uma réplica não é guardado, como a página da lista (ver
+tasks/replicas.py).
+
+A validação dos formulários continua pelo queryset, no banco.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Categoria, EstatisticasCategoria
+from .replicas import leu_da_replica
+
+# Validade no cache compartilhado, que é sempre invalidado explicitamente
+TIMEOUT_COMPARTILHADO = 24 * 60 * 60
+
+
+class ResumoCategoria(NamedTuple):
+    nome: str
+    cor: str
+    versao_sync: int
+
+
+class LRU:
+    """Dicionário com no máximo ``maximo`` chaves válidas por ``ttl`` segundos, seguro entre threads"""
+
+    def __init__(self, maximo, ttl):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def get(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira, valor = item
+            if expira <= time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor):
+        with self._trava:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def delete(self, chave):
+        with self._trava:
+            self._itens.pop(chave, None)
+
+    def clear(self):
+        with self._trava:
+            self._itens.clear()
+
+
+_local = None
+
+
+def _lru():
+    global _local
+    if _local is None:
+        _local = LRU(
+            getattr(settings, 'TAREFAS_CATEGORIAS_CACHE_MAXIMO', 10000),
+            getattr(settings, 'TAREFAS_CATEGORIAS_CACHE_TTL', 60),
+        )
+    return _local
+
+
+def _compartilhado():
+    alias = getattr(settings, 'TAREFAS_CATEGORIAS_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _chave(usuario_id):
+    return f'tasks:categorias:{usuario_id}'
+
+
+def _consulta(usuario_id):
+    return Categoria.objects.filter(usuario_id=usuario_id).order_by('id').values_list('id', 'nome', 'cor', 'versao_sync')
+
+
+def _mapa(linhas):
+    return {pk: ResumoCategoria(nome, cor, versao) for pk, nome, cor, versao in linhas}
+
+
+def categorias_do_usuario(usuario_id, recarregar=False):
+    """Mapa id -> ResumoCategoria das categorias do usuário, na ordem de criação"""
+    compartilhado = _compartilhado()
+    if not recarregar:
+        mapa = _lru().get(usuario_id)
+        if mapa is not None:
+            return mapa
+        mapa = compartilhado.get(_chave(usuario_id)) if compartilhado else None
+        if mapa is not None:
+            _lru().set(usuario_id, mapa)
+            return mapa
+    mapa = _mapa(_consulta(usuario_id))
+    if not leu_da_replica():
+        _lru().set(usuario_id, mapa)
+        if compartilhado:
+            compartilhado.set(_chave(usuario_id), mapa, timeout=TIMEOUT_COMPARTILHADO)
+    return mapa
+
+
+async def acategorias_do_usuario(usuario_id, recarregar=False):
+    """Versão assíncrona de ``categorias_do_usuario``"""
+    compartilhado = _compartilhado()
+    if not recarregar:
+        mapa = _lru().get(usuario_id)
+        if mapa is not None:
+            return mapa
+        mapa = await compartilhado.aget(_chave(usuario_id)) if compartilhado else None
+        if mapa is not None:
+            _lru().set(usuario_id, mapa)
+            return mapa
+    mapa = _mapa([linha async for linha in _consulta(usuario_id)])
+    if not leu_da_replica():
+        _lru().set(usuario_id, mapa)
+        if compartilhado:
+            await compartilhado.aset(_chave(usuario_id), mapa, timeout=TIMEOUT_COMPARTILHADO)
+    return mapa
+
+
+def _apagar(usuario_id):
+    _lru().delete(usuario_id)
+    compartilhado = _compartilhado()
+    if compartilhado:
+        compartilhado.delete(_chave(usuario_id))
+
+
+def invalidar_categorias(usuario_id):
+    """Descarta o mapa do usuário; chamar a cada categoria criada, alterada ou excluída"""
+    _apagar(usuario_id)
+    # De novo no commit: uma leitura concorrente feita antes dele pode ter
+    # guardado o mapa antigo
+    transaction.on_commit(partial(_apagar, usuario_id))
+
+
+def limpar():
+    """Esvazia o LRU deste processo (o cache compartilhado sai com ``cache.clear()``)"""
+    _lru().clear()
+
+
+def instancia(usuario_id, pk, resumo):
+    """Categoria montada a partir do resumo, como se lida do banco"""
+    # Valores na ordem dos campos do modelo, como from_db espera
+    return Categoria.from_db(
+        None, ['id', 'nome', 'usuario_id', 'cor', 'versao_sync'], [pk, resumo.nome, usuario_id, resumo.cor, resumo.versao_sync],
+    )
+
+
+def _com_total(usuario_id, mapa, totais):
+    categorias = []
+    for pk, resumo in mapa.items():
+        categoria = instancia(usuario_id, pk, resumo)
+        categoria.tarefas_count = totais.get(pk, 0)
+        categorias.append(categoria)
+    return categorias
+
+
+def _totais(usuario_id):
+    return EstatisticasCategoria.objects.filter(usuario_id=usuario_id).values_list('categoria_id', 'total')
+
+
+def categorias_com_total(usuario_id):
+    """Categorias do usuário com ``tarefas_count``, lido dos contadores (ver tasks/estatisticas.py)"""
+    return _com_total(usuario_id, categorias_do_usuario(usuario_id), dict(_totais(usuario_id)))
+
+
+async def acategorias_com_total(usuario_id):
+    mapa = await acategorias_do_usuario(usuario_id)
+    return _com_total(usuario_id, mapa, {pk: total async for pk, total in _totais(usuario_id)})
+
+
+def _sem_categoria(objetos):
+    """Objetos com categoria_id cuja categoria ainda não foi carregada"""
+    return [objeto for objeto in objetos if objeto.categoria_id and not type(objeto).categoria.is_cached(objeto)]
+
+
+def _anexar(objetos, mapas):
+    for objeto in objetos:
+        resumo = mapas[objeto.usuario_id].get(objeto.categoria_id)
+        # Fora do mapa relido, a categoria foi excluída: fica vazia, sem a
+        # consulta que a FK faria depois (e que as views assíncronas não podem fazer)
+        categoria = instancia(objeto.usuario_id, objeto.categoria_id, resumo) if resumo is not None else None
+        type(objeto).categoria.field.set_cached_value(objeto, categoria)
+
+
+def anexar_categorias(objetos):
+    """
+    Preenche ``categoria`` (sem consulta, a partir do cache) nos objetos com
+    FK para Categoria que ainda não a tenham carregada, como faria um
+    select_related; None se a categoria não existe mais
+    """
+    objetos = _sem_categoria(objetos)
+    mapas = {}
+    for usuario_id in {objeto.usuario_id for objeto in objetos}:
+        ids = {objeto.categoria_id for objeto in objetos if objeto.usuario_id == usuario_id}
+        mapas[usuario_id] = categorias_do_usuario(usuario_id)
+        if not ids <= mapas[usuario_id].keys():
+            # Criada em outro processo depois que o mapa foi lido
+            mapas[usuario_id] = categorias_do_usuario(usuario_id, recarregar=True)
+    _anexar(objetos, mapas)
+
+
+async def aanexar_categorias(objetos):
+    """Versão assíncrona de ``anexar_categorias``"""
+    objetos = _sem_categoria(objetos)
+    mapas = {}
+    for usuario_id in {objeto.usuario_id for objeto in objetos}:
+        ids = {objeto.categoria_id for objeto in objetos if objeto.usuario_id == usuario_id}
+        mapas[usuario_id] = await acategorias_do_usuario(usuario_id)
+        if not ids <= mapas[usuario_id].keys():
+            mapas[usuario_id] = await acategorias_do_usuario(usuario_id, recarregar=True)
+    _anexar(objetos, mapas)
@@ -0,0 +1,309 @@
+"""
+Benchmark de ponta a ponta das URLs de ``tasks.urls``.
+
+Para cada tamanho (tarefas por usuário) é criado um usuário com dados
+sintéticos (``tasks.sintetico``) e cada URL é chamada pelo test client do
+Django, com o cenário descrito em CENARIOS. De cada URL são registrados:
+
+- latência (p50/p95/p99, em ms) de ``repeticoes`` chamadas, com o cache
+  limpo antes de cada uma, para medir o caminho que vai ao banco;
+- número de consultas SQL e pico de memória alocada (tracemalloc) de uma
+  chamada extra, feita antes das medidas de tempo e fora delas.
+
+``comparar`` confronta o resultado com um arquivo base: mais consultas SQL
+é sempre regressão; latência e memória só quando passam da tolerância
+relativa e de uma folga absoluta, para não acusar ruído.
+
+Uma URL nova sem cenário faz o benchmark falhar: o teste
+``DesempenhoTests`` garante que toda rota tem um.
+
+``medir_recorrencias`` mede à parte a agenda de um usuário com muitas séries
+recorrentes e confere que listar não grava ocorrências.
+"""
+import json
+import platform
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import django
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import urls as tasks_urls
+from .arquivo import CAMPOS
+from .estatisticas import recalcular_usuarios
+from .lote import excluir_em_lote
+from .models import Categoria, Recorrencia, Tarefa, TarefaArquivada
+from .recorrencia import criar_serie, datas
+from .sintetico import criar_usuarios, popular_usuario
+
+TAMANHOS = [10, 1000, 100000]
+SERIES = 1000
+# Início da série diária dos cenários de ocorrência
+SERIE_INICIO = date(2030, 1, 1)
+# Descrição das tarefas criadas pelos cenários, apagadas depois de cada URL
+MARCA = '[benchmark]'
+
+
+class ErroBenchmark(Exception):
+    pass
+
+
+@dataclass
+class Contexto:
+    usuario_id: int
+    # Tarefa usada nas telas de uma tarefa só
+    tarefa_id: int
+    # Tarefas das ações em lote
+    ids: list
+    # Série diária das telas de ocorrência
+    serie_id: int
+
+
+def _nova_tarefa(contexto):
+    return Tarefa.objects.create(
+        usuario_id=contexto.usuario_id, descricao=f'{MARCA} excluir', data_vencimento='2030-01-01',
+    ).pk
+
+
+def _nova_arquivada(contexto):
+    # Criada concluída e movida como em tasks.arquivo.arquivar; volta à
+    # tabela de tarefas com a MARCA e é apagada no fim
+    tarefas = Tarefa.objects.filter(pk=_nova_tarefa(contexto))
+    tarefas.update(concluida=True)
+    arquivada = TarefaArquivada.objects.create(**tarefas.values(*CAMPOS).get())
+    excluir_em_lote(tarefas)
+    return arquivada.pk
+
+
+def _nova_categoria(contexto):
+    return Categoria.objects.create(usuario_id=contexto.usuario_id, nome=f'{MARCA} vazia').pk
+
+
+def _dia_ocorrencia(i):
+    # Um dia por chamada: a ocorrência concluída fica gravada
+    return (SERIE_INICIO + timedelta(days=i + 1)).isoformat()
+
+
+def _csv_importacao(i, linhas=100):
+    conteudo = 'descricao,prioridade,data_vencimento\n' + ''.join(
+        f'{MARCA} {i}-{n},alta,2030-01-01\n' for n in range(linhas)
+    )
+    return SimpleUploadedFile('benchmark.csv', conteudo.encode())
+
+
+def _alteracao_sync(contexto, i):
+    return json.dumps({'alteracoes': [{
+        'tipo': 'tarefa', 'id': contexto.tarefa_id, 'versao_base': 2 ** 62, 'campos': {'notas': f'{MARCA} {i}'},
+    }]})
+
+
+# Nome da URL -> função (contexto, i) que prepara a i-ésima chamada e devolve
+# (método, args da URL, kwargs do client)
+CENARIOS = {
+    'lista_tarefas': lambda c, i: ('get', [], {}),
+    'marcar_concluida': lambda c, i: ('get', [c.tarefa_id], {}),
+    'excluir_tarefa': lambda c, i: ('get', [_nova_tarefa(c)], {}),
+    'editar_tarefa': lambda c, i: ('get', [c.tarefa_id], {}),
+    'agenda': lambda c, i: ('get', [], {}),
+    'concluir_ocorrencia': lambda c, i: ('get', [c.serie_id, _dia_ocorrencia(i)], {}),
+    'editar_ocorrencia': lambda c, i: ('get', [c.serie_id, '2031-06-15'], {}),
+    'arquivo': lambda c, i: ('get', [], {}),
+    'restaurar_tarefa': lambda c, i: ('post', [_nova_arquivada(c)], {}),
+    'acoes_em_lote': lambda c, i: ('post', [], {'data': {'acao': ['concluir', 'reabrir'][i % 2], 'ids': c.ids}}),
+    'exportar_tarefas': lambda c, i: ('get', [], {'data': {'formato': 'csv'}}),
+    'importar_tarefas': lambda c, i: ('post', [], {'data': {'arquivo': _csv_importacao(i)}}),
+    'relatorio': lambda c, i: ('get', [], {}),
+    'sync': lambda c, i: ('get', [], {}),
+    'sync_enviar': lambda c, i: (
+        'post', [], {'data': _alteracao_sync(c, i), 'content_type': 'application/json'}
+    ),
+    'lista_categorias': lambda c, i: ('get', [], {}),
+    'excluir_categoria': lambda c, i: ('get', [_nova_categoria(c)], {}),
+    'registrar': lambda c, i: ('get', [], {}),
+    'login': lambda c, i: ('get', [], {}),
+    'logout': lambda c, i: ('get', [], {}),
+}
+
+
+def _requisitar(client, nome, metodo, args, kwargs):
+    resposta = getattr(client, metodo)(reverse(f'tasks:{nome}', args=args), secure=True, **kwargs)
+    if resposta.status_code >= 400:
+        raise ErroBenchmark(f'{nome} respondeu {resposta.status_code}')
+    # O tempo de uma resposta em streaming inclui gerar o corpo inteiro; o
+    # close() dispara request_finished, como faria o servidor
+    if resposta.streaming:
+        b''.join(resposta)
+        resposta.close()
+    return resposta
+
+
+def medir_url(client, nome, contexto, repeticoes):
+    cenario = CENARIOS.get(nome)
+    if cenario is None:
+        raise ErroBenchmark(f'A URL {nome!r} não tem cenário em tasks.desempenho.CENARIOS')
+
+    metodo, args, kwargs = cenario(contexto, 0)
+    cache.clear()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as consultas:
+            _requisitar(client, nome, metodo, args, kwargs)
+        # Lido agora: as próximas requisições limpam connection.queries
+        total_consultas = len(consultas)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencias = []
+    for i in range(1, repeticoes + 1):
+        metodo, args, kwargs = cenario(contexto, i)
+        cache.clear()
+        inicio = time.perf_counter()
+        _requisitar(client, nome, metodo, args, kwargs)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+    excluir_em_lote(Tarefa.objects.filter(usuario_id=contexto.usuario_id, descricao__startswith=MARCA))
+    return {
+        **{f'p{p}_ms': round(float(np.percentile(latencias, p)), 2) for p in (50, 95, 99)},
+        'consultas': total_consultas,
+        'memoria_kb': round(pico / 1024, 1),
+    }
+
+
+def medir_tamanho(tamanho, repeticoes=20, categorias=8, rng=None, progresso=None):
+    """Cria um usuário com ``tamanho`` tarefas e mede todas as URLs com ele"""
+    usuario_id = criar_usuarios(1, prefixo=f'benchmark{tamanho}_')[0]
+    popular_usuario(usuario_id, categorias, tamanho, rng)
+    tarefa = Tarefa.objects.create(usuario_id=usuario_id, descricao='Tarefa do benchmark', data_vencimento='2030-01-01')
+    ids = list(Tarefa.objects.filter(usuario_id=usuario_id).order_by('id').values_list('id', flat=True)[:50])
+    modelo = Tarefa.objects.create(usuario_id=usuario_id, descricao='Série do benchmark', data_vencimento=SERIE_INICIO)
+    contexto = Contexto(usuario_id, tarefa.pk, ids, criar_serie(modelo, 'FREQ=DAILY').pk)
+
+    client = Client()
+    client.force_login(User.objects.get(pk=usuario_id))
+    resultados = {}
+    for padrao in tasks_urls.urlpatterns:
+        if progresso:
+            progresso(f'{tamanho} tarefas: {padrao.name}')
+        resultados[padrao.name] = medir_url(client, padrao.name, contexto, repeticoes)
+    return resultados
+
+
+def criar_series(usuario_id, quantidade, hoje):
+    """
+    ``quantidade`` séries (diárias, semanais e mensais, alternadas) iniciadas
+    até um ano antes de ``hoje``, gravadas em lote
+    """
+    regras = ['FREQ=DAILY', 'FREQ=WEEKLY', 'FREQ=MONTHLY']
+    modelos = Tarefa.objects.bulk_create([
+        Tarefa(
+            usuario_id=usuario_id, descricao=f'Série {i}', data_vencimento=hoje - timedelta(days=i % 365),
+            versao_sync=1,
+        )
+        for i in range(quantidade)
+    ])
+    series = Recorrencia.objects.bulk_create([
+        Recorrencia(tarefa=modelo, usuario_id=usuario_id, regra=regras[i % len(regras)], inicio=modelo.data_vencimento)
+        for i, modelo in enumerate(modelos)
+    ])
+    for modelo, recorrencia in zip(modelos, series):
+        modelo.serie = recorrencia
+        modelo.data_ocorrencia = recorrencia.inicio
+    Tarefa.objects.bulk_update(modelos, ['serie', 'data_ocorrencia'], batch_size=500)
+    recalcular_usuarios([usuario_id])
+
+
+def medir_recorrencias(series=SERIES, repeticoes=20):
+    """
+    Agenda do mês atual de um usuário com ``series`` séries recorrentes:
+    latência, consultas SQL, ocorrências geradas, tempo só da geração (sem
+    banco) e linhas de tarefa antes e depois, que devem ser iguais.
+    """
+    hoje = timezone.localdate()
+    usuario_id = criar_usuarios(1, prefixo=f'benchmark_series{series}_')[0]
+    criar_series(usuario_id, series, hoje)
+    tarefas_antes = Tarefa.objects.filter(usuario_id=usuario_id).count()
+
+    client = Client()
+    client.force_login(User.objects.get(pk=usuario_id))
+    cache.clear()
+    with CaptureQueriesContext(connection) as consultas:
+        _requisitar(client, 'agenda', 'get', [], {})
+    total_consultas = len(consultas)
+
+    latencias = []
+    for _ in range(repeticoes):
+        cache.clear()
+        inicio = time.perf_counter()
+        _requisitar(client, 'agenda', 'get', [], {})
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+    mes = hoje.replace(day=1)
+    fim = (mes + timedelta(days=32)).replace(day=1)
+    carregadas = list(Recorrencia.objects.filter(usuario_id=usuario_id))
+    inicio = time.perf_counter()
+    ocorrencias = sum(len(datas(recorrencia, mes, fim)) for recorrencia in carregadas)
+    expansao_ms = (time.perf_counter() - inicio) * 1000
+
+    return {
+        'series': series,
+        **{f'p{p}_ms': round(float(np.percentile(latencias, p)), 2) for p in (50, 95)},
+        'consultas': total_consultas,
+        'ocorrencias': ocorrencias,
+        'expansao_ms': round(expansao_ms, 2),
+        'tarefas_antes': tarefas_antes,
+        'tarefas_depois': Tarefa.objects.filter(usuario_id=usuario_id).count(),
+    }
+
+
+def executar(tamanhos=TAMANHOS, repeticoes=20, semente=0, progresso=None, series=SERIES):
+    """
+    Roda o benchmark no banco atual e devolve o resultado (dict serializável).
+    ``series=0`` pula o benchmark de recorrências.
+    """
+    rng = np.random.default_rng(semente)
+    resultado = {
+        'ambiente': {
+            'python': platform.python_version(), 'django': django.get_version(), 'banco': connection.vendor,
+        },
+        'repeticoes': repeticoes,
+        'resultados': {
+            str(tamanho): medir_tamanho(tamanho, repeticoes, rng=rng, progresso=progresso) for tamanho in tamanhos
+        },
+    }
+    if series:
+        if progresso:
+            progresso(f'agenda com {series} séries')
+        resultado['recorrencias'] = medir_recorrencias(series, repeticoes)
+    return resultado
+
+
+def comparar(atual, base, tolerancia=0.25, folga_ms=5.0, folga_kb=256.0):
+    """Lista de regressões (texto) do resultado ``atual`` em relação a ``base``"""
+    regressoes = []
+    for tamanho, urls in atual['resultados'].items():
+        for nome, medida in urls.items():
+            anterior = base.get('resultados', {}).get(tamanho, {}).get(nome)
+            if anterior is None:
+                continue
+            if medida['consultas'] > anterior['consultas']:
+                regressoes.append(
+                    f'{nome} ({tamanho} tarefas): {medida["consultas"]} consultas SQL (base: {anterior["consultas"]})'
+                )
+            for campo, folga in (('p95_ms', folga_ms), ('memoria_kb', folga_kb)):
+                limite = max(anterior[campo] * (1 + tolerancia), anterior[campo] + folga)
+                if medida[campo] > limite:
+                    regressoes.append(
+                        f'{nome} ({tamanho} tarefas): {campo} {medida[campo]} (base: {anterior[campo]})'
+                    )
+    return regressoes
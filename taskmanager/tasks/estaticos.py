@@ -0,0 +1,56 @@
+"""
+Arquivos estáticos: nomes com hash, versões comprimidas e precache do PWA.
+
+``ArmazenamentoEstatico`` é o storage do WhiteNoise: no ``collectstatic``
+cada arquivo ganha o hash do conteúdo no nome (``Tarefando.3f2a9c1b7e44.png``)
+e versões .gz e .br (a .br quando o pacote Brotli está instalado). O
+WhiteNoiseMiddleware serve os arquivos com hash com ``Cache-Control:
+immutable`` e escolhe a versão comprimida pelo Accept-Encoding.
+
+Ao final do ``collectstatic`` é gravado ``precache.json`` em STATIC_ROOT, com
+as URLs com hash (menos as de ``TAREFAS_PRECACHE_IGNORAR``) e uma versão
+calculada a partir delas. A view ``service_worker`` (``/sw.js``) embute essa
+lista no script: ele só muda quando algum arquivo muda e, ao ser instalado,
+baixa apenas as URLs que ainda não estão no cache do navegador.
+"""
+import hashlib
+import json
+from fnmatch import fnmatch
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+PRECACHE = 'precache.json'
+
+
+class ArmazenamentoEstatico(CompressedManifestStaticFilesStorage):
+    # Antes do primeiro collectstatic (desenvolvimento), {% static %} usa o
+    # nome original em vez de falhar
+    manifest_strict = False
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if not kwargs.get('dry_run'):
+            self.gravar_precache()
+
+    def gravar_precache(self):
+        ignorar = getattr(settings, 'TAREFAS_PRECACHE_IGNORAR', [])
+        urls = sorted(
+            self.url(nome) for nome in self.hashed_files
+            if not any(fnmatch(nome, padrao) for padrao in ignorar)
+        )
+        versao = hashlib.sha256('\n'.join(urls).encode()).hexdigest()[:12]
+        if self.exists(PRECACHE):
+            self.delete(PRECACHE)
+        self._save(PRECACHE, ContentFile(json.dumps({'versao': versao, 'arquivos': urls}, indent=2).encode()))
+
+
+def ler_precache():
+    """Conteúdo de precache.json, ou uma lista vazia antes do primeiro collectstatic"""
+    try:
+        with staticfiles_storage.open(PRECACHE) as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return {'versao': 'dev', 'arquivos': []}
@@ -0,0 +1,271 @@
+"""
+Manutenção incremental de EstatisticasUsuario e EstatisticasCategoria.
+
+Cada escrita em Tarefa informa o estado antes e depois da alteração; a
+diferença vira um UPDATE com F() nos contadores, dentro da mesma transação da
+escrita. Se a linha de estatísticas ainda não existe, ou se o estado anterior
+não é conhecido (campos adiados com ``.only()``/``.defer()``), os contadores do
+usuário são recalculados a partir da tabela de tarefas.
+"""
+from collections import Counter, defaultdict, namedtuple
+
+from django.contrib.auth.models import User
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .replicas import fixar_primario
+
+EstadoTarefa = namedtuple('EstadoTarefa', 'usuario_id concluida prioridade categoria_id tempo_estimado')
+
+# Estado de uma instância carregada com campos adiados
+DESCONHECIDO = object()
+
+CAMPOS_USUARIO = [
+    'total', 'pendentes', 'concluidas',
+    'prioridade_alta', 'prioridade_media', 'prioridade_baixa',
+    'tempo_estimado_total', 'tempo_estimado_pendente',
+]
+CAMPOS_CATEGORIA = ['total', 'pendentes', 'tempo_estimado_total']
+
+
+def estado_tarefa(tarefa):
+    valores = tarefa.__dict__
+    if any(campo not in valores for campo in EstadoTarefa._fields):
+        return DESCONHECIDO
+    return EstadoTarefa(*(valores[campo] for campo in EstadoTarefa._fields))
+
+
+def _acumular(por_usuario, por_categoria, estado, sinal, quantidade=1):
+    """
+    Soma (sinal=1) ou subtrai (sinal=-1) a contribuição de ``quantidade``
+    tarefas no mesmo estado; ``estado.tempo_estimado`` é o total do grupo.
+    """
+    from .models import Tarefa
+
+    pendente = not estado.concluida
+    usuario = por_usuario[estado.usuario_id]
+    usuario['total'] += sinal * quantidade
+    usuario['pendentes' if pendente else 'concluidas'] += sinal * quantidade
+    usuario[f'prioridade_{Tarefa.Prioridade(estado.prioridade).slug}'] += sinal * quantidade
+    usuario['tempo_estimado_total'] += sinal * estado.tempo_estimado
+    if pendente:
+        usuario['tempo_estimado_pendente'] += sinal * estado.tempo_estimado
+
+    if estado.categoria_id:
+        categoria = por_categoria[estado.categoria_id]
+        categoria['total'] += sinal * quantidade
+        categoria['tempo_estimado_total'] += sinal * estado.tempo_estimado
+        if pendente:
+            categoria['pendentes'] += sinal * quantidade
+
+
+def registrar_alteracao(usuario_id, antes, depois):
+    """Atualiza os contadores para uma tarefa que passou de ``antes`` para ``depois``"""
+    registrar_alteracoes([(antes, depois)], usuario_id=usuario_id)
+
+
+def registrar_alteracoes(pares, usuario_id=None):
+    """
+    Versão em lote de ``registrar_alteracao``. ``pares`` é uma lista de
+    (antes, depois); None representa tarefa inexistente (criação/exclusão).
+    """
+    por_usuario = defaultdict(Counter)
+    por_categoria = defaultdict(Counter)
+    recalcular = set()
+
+    for antes, depois in pares:
+        if antes is DESCONHECIDO or depois is DESCONHECIDO:
+            recalcular.add(usuario_id)
+            continue
+        if antes is not None:
+            _acumular(por_usuario, por_categoria, antes, -1)
+        if depois is not None:
+            _acumular(por_usuario, por_categoria, depois, 1)
+
+    aplicar_deltas(por_usuario, por_categoria)
+    recalcular.discard(None)
+    if recalcular:
+        recalcular_usuarios(recalcular)
+
+
+def agrupar_estados(tarefas):
+    """
+    Resume um queryset de tarefas em grupos (EstadoTarefa, quantidade), com o
+    tempo estimado somado por grupo. Usado pelas operações em lote.
+    """
+    campos = [campo for campo in EstadoTarefa._fields if campo != 'tempo_estimado']
+    linhas = tarefas.order_by().values(*campos).annotate(
+        quantidade=Count('id'), tempo=Coalesce(Sum('tempo_estimado'), 0),
+    )
+    return [
+        (EstadoTarefa(tempo_estimado=linha.pop('tempo'), **{c: linha[c] for c in campos}), linha['quantidade'])
+        for linha in linhas
+    ]
+
+
+def registrar_lote(grupos, alteracao, alteradas):
+    """
+    Atualiza os contadores depois de um UPDATE/DELETE em lote. ``grupos`` vem
+    de ``agrupar_estados`` (lido antes da escrita, com o mesmo filtro),
+    ``alteracao`` é o dict passado ao ``update()`` ou None para exclusão e
+    ``alteradas`` o número de linhas afetadas. Se uma escrita concorrente fez o
+    número divergir, os usuários envolvidos são recalculados.
+    """
+    if alteradas != sum(quantidade for _, quantidade in grupos):
+        recalcular_usuarios({estado.usuario_id for estado, _ in grupos})
+        return
+
+    if alteracao is not None:
+        # Campos que não entram nos contadores (vencimento, série...) não mudam o estado
+        alteracao = {campo: valor for campo, valor in alteracao.items() if campo in EstadoTarefa._fields}
+    por_usuario = defaultdict(Counter)
+    por_categoria = defaultdict(Counter)
+    for estado, quantidade in grupos:
+        _acumular(por_usuario, por_categoria, estado, -1, quantidade)
+        if alteracao is not None:
+            _acumular(por_usuario, por_categoria, estado._replace(**alteracao), 1, quantidade)
+    aplicar_deltas(por_usuario, por_categoria)
+
+
+def aplicar_deltas(por_usuario, por_categoria):
+    from .models import EstatisticasCategoria, EstatisticasUsuario
+
+    faltando = set()
+    for usuario_id, delta in por_usuario.items():
+        alteracoes = {campo: F(campo) + valor for campo, valor in delta.items() if valor}
+        if alteracoes and not EstatisticasUsuario.objects.filter(usuario_id=usuario_id).update(**alteracoes):
+            faltando.add(usuario_id)
+    if faltando:
+        recalcular_usuarios(faltando)
+
+    # Um UPDATE só para todas as categorias, com um CASE por contador: uma
+    # ação em lote pode mexer em tarefas de muitas categorias
+    por_categoria = {categoria_id: delta for categoria_id, delta in por_categoria.items() if any(delta.values())}
+    if not por_categoria:
+        return
+    alteracoes = {
+        campo: F(campo) + Case(
+            *(When(categoria_id=categoria_id, then=Value(delta[campo]))
+              for categoria_id, delta in por_categoria.items() if delta[campo]),
+            default=Value(0),
+        )
+        for campo in CAMPOS_CATEGORIA
+        if any(delta[campo] for delta in por_categoria.values())
+    }
+    atualizadas = EstatisticasCategoria.objects.filter(categoria_id__in=por_categoria).update(**alteracoes)
+    if atualizadas < len(por_categoria):
+        recalcular_categorias(categoria_ids=list(por_categoria))
+
+
+def calcular_usuarios(usuario_ids):
+    """Calcula os contadores direto da tabela de tarefas: {usuario_id: {campo: valor}}"""
+    from .models import Tarefa
+
+    pendente = Q(concluida=False)
+    linhas = (
+        Tarefa.objects.filter(usuario_id__in=usuario_ids)
+        .order_by()
+        .values('usuario_id')
+        .annotate(
+            total=Count('id'),
+            pendentes=Count('id', filter=pendente),
+            concluidas=Count('id', filter=~pendente),
+            **{
+                f'prioridade_{prioridade.slug}': Count('id', filter=Q(prioridade=prioridade))
+                for prioridade in Tarefa.Prioridade
+            },
+            tempo_estimado_total=Coalesce(Sum('tempo_estimado'), 0),
+            tempo_estimado_pendente=Coalesce(Sum('tempo_estimado', filter=pendente), 0),
+        )
+    )
+    resultado = {usuario_id: dict.fromkeys(CAMPOS_USUARIO, 0) for usuario_id in usuario_ids}
+    for linha in linhas:
+        resultado[linha.pop('usuario_id')] = linha
+    return resultado
+
+
+def calcular_categorias(usuario_ids=None, categoria_ids=None):
+    """Contadores por categoria: {categoria_id: (usuario_id, {campo: valor})}"""
+    from .models import Categoria
+
+    categorias = Categoria.objects.order_by()
+    if usuario_ids is not None:
+        categorias = categorias.filter(usuario_id__in=usuario_ids)
+    if categoria_ids is not None:
+        categorias = categorias.filter(id__in=categoria_ids)
+    linhas = categorias.values('id', 'usuario_id').annotate(
+        total=Count('tarefa'),
+        pendentes=Count('tarefa', filter=Q(tarefa__concluida=False)),
+        tempo_estimado_total=Coalesce(Sum('tarefa__tempo_estimado'), 0),
+    )
+    return {linha.pop('id'): (linha.pop('usuario_id'), linha) for linha in linhas}
+
+
+def recalcular_usuarios(usuario_ids):
+    """Regrava os contadores dos usuários informados (e de suas categorias)"""
+    from .models import EstatisticasUsuario
+
+    # A contagem não pode vir de uma réplica atrasada
+    fixar_primario()
+    usuario_ids = list(usuario_ids)
+    EstatisticasUsuario.objects.bulk_create(
+        [EstatisticasUsuario(usuario_id=usuario_id, **campos)
+         for usuario_id, campos in calcular_usuarios(usuario_ids).items()],
+        update_conflicts=True,
+        unique_fields=['usuario'],
+        update_fields=CAMPOS_USUARIO,
+    )
+    recalcular_categorias(usuario_ids=usuario_ids)
+    return len(usuario_ids)
+
+
+def recalcular_categorias(usuario_ids=None, categoria_ids=None):
+    from .models import EstatisticasCategoria
+
+    fixar_primario()
+    calculado = calcular_categorias(usuario_ids=usuario_ids, categoria_ids=categoria_ids)
+    EstatisticasCategoria.objects.bulk_create(
+        [EstatisticasCategoria(categoria_id=categoria_id, usuario_id=usuario_id, **campos)
+         for categoria_id, (usuario_id, campos) in calculado.items()],
+        update_conflicts=True,
+        unique_fields=['categoria'],
+        update_fields=CAMPOS_CATEGORIA,
+    )
+    return len(calculado)
+
+
+def divergencias(usuario_ids):
+    """Lista (usuario_id, campo, gravado, correto) para contadores errados"""
+    from .models import EstatisticasUsuario
+
+    gravado = {
+        linha['usuario_id']: linha
+        for linha in EstatisticasUsuario.objects.filter(usuario_id__in=usuario_ids).values('usuario_id', *CAMPOS_USUARIO)
+    }
+    erros = []
+    for usuario_id, correto in calcular_usuarios(usuario_ids).items():
+        atual = gravado.get(usuario_id)
+        for campo in CAMPOS_USUARIO:
+            valor = atual[campo] if atual else None
+            if valor != correto[campo]:
+                erros.append((usuario_id, campo, valor, correto[campo]))
+    return erros
+
+
+def estatisticas_usuario(usuario_id):
+    """Retorna as estatísticas do usuário, criando-as se ainda não existirem"""
+    from .models import EstatisticasUsuario
+
+    estatisticas = EstatisticasUsuario.objects.filter(usuario_id=usuario_id).first()
+    if estatisticas is None:
+        recalcular_usuarios([usuario_id])
+        estatisticas = EstatisticasUsuario.objects.get(usuario_id=usuario_id)
+    return estatisticas
+
+
+def ids_usuarios(lote=1000):
+    """Percorre os ids de todos os usuários em lotes"""
+    ids = list(User.objects.order_by('pk').values_list('pk', flat=True)[:lote])
+    while ids:
+        yield ids
+        ids = list(User.objects.filter(pk__gt=ids[-1]).order_by('pk').values_list('pk', flat=True)[:lote])
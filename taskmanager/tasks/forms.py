@@ -2,7 +2,18 @@ from django import forms
 from django.core.validators import MinValueValidator
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Tarefa, Categoria
+from .models import Tarefa, Categoria, Recorrencia
+from .categorias import categorias_do_usuario
+from .recorrencia import criar_serie, encerrar_serie, normalizar_regra
+
+def opcoes_do_cache(campo, user):
+    """
+    Opções do select de categoria lidas do cache (ver tasks/categorias.py),
+    só quando o select é renderizado; a validação continua pelo queryset
+    """
+    campo.queryset = Categoria.objects.filter(usuario=user)
+    vazio = [('', campo.empty_label)] if campo.empty_label is not None else []
+    campo.choices = lambda: vazio + [(pk, resumo.nome) for pk, resumo in categorias_do_usuario(user.pk).items()]
 
 class TarefaForm(forms.ModelForm):
     data_vencimento = forms.DateField(
@@ -21,6 +32,28 @@ class TarefaForm(forms.ModelForm):
         initial=0  # Valor padrão
     )
     
+    REPETIR_CHOICES = [
+        ('', 'Não repete'),
+        ('diaria', 'Todo dia'),
+        ('semanal', 'Toda semana'),
+        ('mensal', 'Todo mês'),
+        ('personalizada', 'Personalizada (RRULE)'),
+    ]
+    
+    repetir = forms.ChoiceField(
+        choices=REPETIR_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label="Repetir"
+    )
+    regra = forms.CharField(
+        max_length=200,
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'FREQ=WEEKLY;BYDAY=MO,WE'}),
+        label="Regra de repetição",
+        help_text="Só para a repetição personalizada"
+    )
+    
     class Meta:
         model = Tarefa
         fields = ['descricao', 'prioridade', 'data_vencimento', 'categoria', 'notas', 'tempo_estimado', 'concluida']
@@ -36,8 +69,58 @@ class TarefaForm(forms.ModelForm):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         if user:
-            self.fields['categoria'].queryset = Categoria.objects.filter(usuario=user)
             self.fields['categoria'].empty_label = "Selecione uma categoria"
+            opcoes_do_cache(self.fields['categoria'], user)
+        
+        # A repetição é definida no modelo da série; as outras ocorrências
+        # não têm esses campos
+        recorrencia = self.recorrencia()
+        if self.instance.serie_id and recorrencia is None:
+            del self.fields['repetir'], self.fields['regra']
+        elif recorrencia is not None:
+            frequencias = {regra: nome for nome, regra in Recorrencia.FREQUENCIAS.items()}
+            self.initial.setdefault('repetir', frequencias.get(recorrencia.regra, 'personalizada'))
+            self.initial.setdefault('regra', recorrencia.regra)
+    
+    def recorrencia(self):
+        """Série da qual a tarefa é o modelo (a view deve carregá-la com select_related)"""
+        try:
+            return self.instance.recorrencia
+        except Recorrencia.DoesNotExist:
+            return None
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        repetir = cleaned_data.get('repetir')
+        if repetir == 'personalizada':
+            try:
+                cleaned_data['regra'] = normalizar_regra(cleaned_data.get('regra', ''))
+            except ValueError as e:
+                self.add_error('regra', str(e))
+        elif 'repetir' in cleaned_data:
+            cleaned_data['regra'] = Recorrencia.FREQUENCIAS.get(repetir, '')
+        return cleaned_data
+    
+    def save(self, commit=True):
+        tarefa = super().save(commit=commit)
+        if commit:
+            self.salvar_recorrencia(tarefa)
+        return tarefa
+    
+    def salvar_recorrencia(self, tarefa):
+        """Cria, altera ou encerra a série da tarefa (já gravada) conforme o formulário"""
+        if 'repetir' not in self.fields:
+            return
+        regra = self.cleaned_data.get('regra')
+        atual = self.recorrencia()
+        if atual is None:
+            if regra:
+                criar_serie(tarefa, regra)
+        elif not regra:
+            encerrar_serie(atual)
+        elif regra != atual.regra:
+            atual.regra = regra
+            atual.save(update_fields=['regra'])
     
     def clean_tempo_estimado(self):
         """Validação personalizada para tempo_estimado"""
@@ -75,6 +158,107 @@ class CategoriaForm(forms.ModelForm):
             'nome': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nome da categoria...'}),
         }
 
+class AcaoEmLoteForm(forms.Form):
+    ACAO_CHOICES = [
+        ('concluir', 'Concluir'),
+        ('reabrir', 'Reabrir'),
+        ('excluir', 'Excluir'),
+        ('prioridade', 'Alterar prioridade'),
+        ('categoria', 'Alterar categoria'),
+    ]
+    MAXIMO_IDS = 1000
+    
+    acao = forms.ChoiceField(
+        choices=ACAO_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
+    )
+    prioridade = forms.TypedChoiceField(
+        choices=Tarefa.PRIORIDADE_CHOICES,
+        coerce=int,
+        empty_value=None,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
+    )
+    categoria = forms.ModelChoiceField(
+        queryset=Categoria.objects.none(),
+        required=False,
+        empty_label="Sem categoria",
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
+    )
+    
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        if user:
+            opcoes_do_cache(self.fields['categoria'], user)
+    
+    def clean(self):
+        """Lê a lista de ids marcados (checkboxes "ids")"""
+        cleaned_data = super().clean()
+        try:
+            ids = {int(valor) for valor in self.data.getlist('ids')}
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Seleção de tarefas inválida.")
+        if not ids:
+            raise forms.ValidationError("Selecione ao menos uma tarefa.")
+        if len(ids) > self.MAXIMO_IDS:
+            raise forms.ValidationError(f"Selecione no máximo {self.MAXIMO_IDS} tarefas por vez.")
+        if cleaned_data.get('acao') == 'prioridade' and not cleaned_data.get('prioridade'):
+            self.add_error('prioridade', "Escolha a nova prioridade.")
+        cleaned_data['ids'] = sorted(ids)
+        return cleaned_data
+
+class LinhaImportacaoForm(forms.Form):
+    """Campos de uma linha de arquivo importado; a categoria vem pelo nome"""
+    descricao = forms.CharField(max_length=200)
+    # Nome ('alta') ou número (3), convertido em validar()
+    prioridade = forms.CharField(required=False)
+    data_vencimento = forms.DateField()
+    concluida = forms.BooleanField(required=False)
+    data_conclusao = forms.DateTimeField(required=False)
+    categoria = forms.CharField(max_length=50, required=False)
+    notas = forms.CharField(required=False, strip=False)
+    tempo_estimado = forms.IntegerField(min_value=0, required=False)
+    
+    @classmethod
+    def validar(cls, dados):
+        """
+        Valida um dict de dados sem instanciar o formulário: a cópia dos campos
+        feita a cada instância dominava o tempo de importação. Retorna
+        (cleaned_data, erros).
+        """
+        limpos, erros = {}, {}
+        for nome, campo in cls.base_fields.items():
+            try:
+                limpos[nome] = campo.clean(dados.get(nome))
+            except forms.ValidationError as e:
+                erros[nome] = e.messages
+            except (TypeError, AttributeError, ValueError):
+                # Tipo que o campo não espera, como um número no lugar de uma
+                # data numa linha JSON
+                erros[nome] = [campo.error_messages.get('invalid', 'Valor inválido.')]
+        if limpos.get('prioridade'):
+            limpos['prioridade'] = Tarefa.Prioridade.de_texto(limpos['prioridade'])
+            if limpos['prioridade'] is None:
+                erros['prioridade'] = ['Prioridade inválida.']
+        if not erros:
+            limpos['prioridade'] = limpos['prioridade'] or Tarefa.Prioridade.MEDIA
+            limpos['tempo_estimado'] = limpos['tempo_estimado'] or 0
+        return limpos, erros
+
+class ImportacaoForm(forms.Form):
+    arquivo = forms.FileField(
+        label="Arquivo CSV ou JSON Lines",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control form-control-sm', 'accept': '.csv,.jsonl,.ndjson'})
+    )
+    
+    def clean_arquivo(self):
+        from .transferencia import formato_do_arquivo
+        arquivo = self.cleaned_data['arquivo']
+        if formato_do_arquivo(arquivo.name) is None:
+            raise forms.ValidationError("Envie um arquivo .csv ou .jsonl.")
+        return arquivo
+
 class CustomUserCreationForm(UserCreationForm):
     email = forms.EmailField(
         required=True,
@@ -0,0 +1,142 @@
+"""
+Medição do cold start: quanto custa subir o projeto num processo novo.
+
+Cada medição roda um processo Python limpo que importa ``taskmanager.wsgi``
+e atende um GET anônimo em ``caminho``, como no primeiro acesso a uma
+função serverless. São registrados o tempo para importar a aplicação
+(settings, apps, modelos e middlewares), o da primeira resposta (URLconf,
+views e templates carregados sob demanda) e o do processo inteiro, com o
+interpretador incluído.
+
+Uma execução extra com ``python -X importtime`` dá o custo de importação de
+cada módulo. Ela fica fora das medidas de tempo, porque o próprio
+importtime deixa tudo mais lento.
+
+``TAREFAS_ENXUTO`` liga o modo enxuto (ver settings): sem admin, humanize,
+dotenv e dj_database_url quando não são necessários. Os middlewares não
+mudam. ``medir`` recebe o modo e o repassa ao processo filho pela variável
+de ambiente.
+"""
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+# Módulos que não deveriam ser carregados para atender uma requisição
+PESADOS = ['pandas', 'numpy', 'pygame', 'dotenv', 'dj_database_url', 'django.contrib.admin']
+
+# Roda no processo filho; imprime o resultado como JSON na última linha
+_PROCESSO = '''
+import json, sys, time
+from io import BytesIO
+inicio = time.perf_counter()
+from taskmanager.wsgi import application
+importado = time.perf_counter()
+status = []
+ambiente = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '443', 'HTTP_HOST': 'localhost', 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.version': (1, 0),
+    'wsgi.url_scheme': 'https', 'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.multithread': False,
+    'wsgi.multiprocess': True, 'wsgi.run_once': False,
+}
+resposta = application(ambiente, lambda s, cabecalhos, exc_info=None: status.append(s))
+b''.join(resposta)
+resposta.close()
+fim = time.perf_counter()
+print(json.dumps({
+    'importar_ms': (importado - inicio) * 1000, 'resposta_ms': (fim - importado) * 1000, 'status': status[0],
+}))
+'''
+
+_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+class ErroInicializacao(Exception):
+    pass
+
+
+@dataclass
+class ResultadoInicializacao:
+    modo: str
+    status: str = ''
+    processo_ms: list = field(default_factory=list)
+    importar_ms: list = field(default_factory=list)
+    resposta_ms: list = field(default_factory=list)
+    # Módulo -> (próprio, acumulado) em ms, da execução com -X importtime
+    modulos: dict = field(default_factory=dict)
+
+    def mediana(self, campo):
+        return statistics.median(getattr(self, campo))
+
+    def por_pacote(self):
+        """Tempo próprio de importação somado por pacote (``django.db``, ``tasks``...)"""
+        pacotes = {}
+        for nome, (proprio, _) in self.modulos.items():
+            partes = nome.split('.')
+            pacote = '.'.join(partes[:2]) if partes[0] == 'django' and len(partes) > 1 else partes[0]
+            pacotes[pacote] = pacotes.get(pacote, 0.0) + proprio
+        return dict(sorted(pacotes.items(), key=lambda item: -item[1]))
+
+    def mais_lentos(self, quantidade=15):
+        """Módulos com maior tempo próprio de importação"""
+        return sorted(self.modulos.items(), key=lambda item: -item[1][0])[:quantidade]
+
+    def pesados(self):
+        # Pelo pacote ou por um submódulo: o importtime nem sempre lista o pacote
+        return [
+            nome for nome in PESADOS
+            if any(modulo == nome or modulo.startswith(nome + '.') for modulo in self.modulos)
+        ]
+
+    def como_dict(self, quantidade=15):
+        return {
+            'modo': self.modo, 'status': self.status, 'repeticoes': len(self.processo_ms),
+            **{f'{campo}_p50': round(self.mediana(campo), 1) for campo in ('processo_ms', 'importar_ms', 'resposta_ms')},
+            'por_pacote_ms': {nome: round(ms, 1) for nome, ms in self.por_pacote().items()},
+            'mais_lentos_ms': {nome: round(proprio, 1) for nome, (proprio, _) in self.mais_lentos(quantidade)},
+            'pesados': self.pesados(),
+        }
+
+
+def ler_importtime(texto):
+    """Interpreta a saída de ``-X importtime``: módulo -> (próprio, acumulado) em ms"""
+    modulos = {}
+    for linha in texto.splitlines():
+        encontrado = _IMPORTTIME.match(linha)
+        if encontrado:
+            proprio, acumulado, _, nome = encontrado.groups()
+            modulos[nome] = (int(proprio) / 1000, int(acumulado) / 1000)
+    return modulos
+
+
+def _executar(enxuto, caminho, importtime=False):
+    ambiente = {**os.environ, 'TAREFAS_ENXUTO': str(enxuto)}
+    comando = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', _PROCESSO, caminho]
+    inicio = time.perf_counter()
+    saida = subprocess.run(
+        comando, cwd=settings.BASE_DIR, env=ambiente, capture_output=True, text=True, check=False,
+    )
+    processo_ms = (time.perf_counter() - inicio) * 1000
+    if saida.returncode:
+        raise ErroInicializacao(f'O processo de medição falhou:\n{saida.stderr[-2000:]}')
+    return processo_ms, json.loads(saida.stdout.strip().splitlines()[-1]), saida.stderr
+
+
+def medir(enxuto, caminho='/login/', repeticoes=5):
+    """Mede ``repeticoes`` cold starts com ou sem o modo enxuto"""
+    resultado = ResultadoInicializacao('enxuto' if enxuto else 'padrao')
+    for _ in range(repeticoes):
+        processo_ms, dados, _ = _executar(enxuto, caminho)
+        resultado.processo_ms.append(processo_ms)
+        resultado.importar_ms.append(dados['importar_ms'])
+        resultado.resposta_ms.append(dados['resposta_ms'])
+        resultado.status = dados['status']
+    _, _, importtime = _executar(enxuto, caminho, importtime=True)
+    resultado.modulos = ler_importtime(importtime)
+    return resultado
@@ -0,0 +1,154 @@
+"""
+Escritas em lote sobre tarefas.
+
+Cada operação é um único UPDATE ou DELETE sobre o queryset recebido (que já
+deve vir filtrado pelo dono), mais o que ele muda nas séries, dentro de uma transação junto com a atualização
+dos contadores e a invalidação do cache. Os signals por objeto ficam
+desligados enquanto a operação roda: os contadores são ajustados uma vez,
+pelo resumo agrupado das linhas afetadas.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .cache import invalidar_usuario
+from .estatisticas import EstadoTarefa, agrupar_estados, registrar_alteracao, registrar_lote
+from .models import Recorrencia, Tarefa
+from .recorrencia import registrar_excecoes
+from .sync import proxima_sequencia, registrar_exclusoes
+
+_em_lote = ContextVar('tasks_em_lote', default=False)
+
+
+def em_lote():
+    """True enquanto uma operação em lote está em andamento"""
+    return _em_lote.get()
+
+
+@contextmanager
+def operacao_em_lote():
+    token = _em_lote.set(True)
+    try:
+        yield
+    finally:
+        _em_lote.reset(token)
+
+
+def _invalidar(grupos):
+    for usuario_id in {estado.usuario_id for estado, _ in grupos}:
+        invalidar_usuario(usuario_id)
+
+
+def _data_conclusao(valores):
+    """Campos extras do UPDATE quando ``concluida`` muda"""
+    if 'concluida' not in valores:
+        return {}
+    return {'data_conclusao': timezone.now() if valores['concluida'] else None}
+
+
+def alterar_em_lote(tarefas, **valores):
+    """
+    Aplica ``valores`` (por exemplo ``concluida=True`` ou ``categoria_id=3``)
+    com um único UPDATE por dono das tarefas. Linhas que já têm esses valores
+    ficam de fora do UPDATE. Retorna o número de tarefas alteradas.
+    """
+    alvo = tarefas.exclude(**valores)
+    with transaction.atomic():
+        grupos = agrupar_estados(alvo)
+        if not grupos:
+            return 0
+        alteradas = 0
+        for usuario_id in sorted({estado.usuario_id for estado, _ in grupos}):
+            alteradas += alvo.filter(usuario_id=usuario_id).update(
+                **valores, **_data_conclusao(valores), versao_sync=proxima_sequencia(usuario_id),
+            )
+        registrar_lote(grupos, valores, alteradas)
+        _invalidar(grupos)
+    return alteradas
+
+
+def transferir_em_lote(tarefas, usuario_id):
+    """
+    Passa as tarefas para o usuário ``usuario_id`` com um único UPDATE. Elas
+    saem da categoria (que é do dono anterior) e, para o sync do dono
+    anterior, contam como excluídas. Séries cujo modelo é transferido vão
+    junto. Retorna o número de tarefas transferidas.
+    """
+    alvo = tarefas.exclude(usuario_id=usuario_id)
+    with transaction.atomic():
+        grupos = agrupar_estados(alvo)
+        if not grupos:
+            return 0
+        linhas = list(alvo.order_by().values_list('usuario_id', 'id'))
+        Recorrencia.objects.filter(tarefa_id__in=[pk for _, pk in linhas]).update(usuario_id=usuario_id)
+        alteracao = {'usuario_id': usuario_id, 'categoria_id': None}
+        transferidas = alvo.update(**alteracao, versao_sync=proxima_sequencia(usuario_id))
+        registrar_lote(grupos, alteracao, transferidas)
+        for dono in {dono for dono, _ in linhas}:
+            registrar_exclusoes(dono, 'tarefa', [pk for anterior, pk in linhas if anterior == dono])
+        _invalidar(grupos)
+        invalidar_usuario(usuario_id)
+    return transferidas
+
+
+def excluir_em_lote(tarefas):
+    """
+    Exclui as tarefas com um único DELETE, sem carregar os objetos (o
+    Collector do Django carregaria, por causa dos signals de Tarefa). O que
+    ele faria em cascata é feito antes, por conjunto: as séries das tarefas
+    modelo são excluídas e as ocorrências delas ficam sem série. Retorna
+    quantas foram excluídas.
+    """
+    with transaction.atomic(), operacao_em_lote():
+        grupos = agrupar_estados(tarefas)
+        if not grupos:
+            return 0
+        linhas = list(tarefas.order_by().values_list('usuario_id', 'id', 'serie_id', 'data_ocorrencia'))
+        ids = [pk for _, pk, _, _ in linhas]
+        series = Recorrencia.objects.filter(tarefa_id__in=ids)
+        Tarefa.objects.filter(serie__in=series).update(serie=None)
+        series._raw_delete(series.db)
+        alvo = Tarefa.objects.filter(pk__in=ids)
+        excluidas = alvo._raw_delete(alvo.db)
+        registrar_lote(grupos, None, excluidas)
+        for usuario_id in {linha[0] for linha in linhas}:
+            registrar_exclusoes(usuario_id, 'tarefa', [pk for dono, pk, _, _ in linhas if dono == usuario_id])
+        registrar_excecoes([(serie_id, data) for _, _, serie_id, data in linhas])
+        _invalidar(grupos)
+    return excluidas
+
+
+def marcar_conclusao(usuario, tarefa_id, concluida=None):
+    """
+    Marca a tarefa do usuário como concluída/pendente, ou alterna o estado se
+    ``concluida`` for None, com um único UPDATE condicional e sem leitura
+    prévia. Cliques repetidos com o mesmo alvo não fazem nada. Retorna o
+    estado final de ``concluida``, ou None se a tarefa não existe.
+    """
+    tarefas = Tarefa.objects.filter(id=tarefa_id, usuario=usuario)
+    with transaction.atomic():
+        versao = proxima_sequencia(usuario.pk)
+        if concluida is None:
+            # No SET os dois lados veem o valor antigo de concluida
+            alteradas = tarefas.update(
+                concluida=~F('concluida'),
+                data_conclusao=Case(When(concluida=False, then=Value(timezone.now())), default=None),
+                versao_sync=versao,
+            )
+        else:
+            alteradas = tarefas.filter(concluida=not concluida).update(
+                concluida=concluida, **_data_conclusao({'concluida': concluida}), versao_sync=versao,
+            )
+
+        # A linha já está travada pelo UPDATE desta transação
+        linha = tarefas.values_list(*EstadoTarefa._fields).first()
+        if linha is None:
+            return None
+        depois = EstadoTarefa(*linha)
+        if alteradas:
+            registrar_alteracao(depois.usuario_id, depois._replace(concluida=not depois.concluida), depois)
+            invalidar_usuario(depois.usuario_id)
+    return depois.concluida
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.arquivo import arquivar
+
+
+class Command(BaseCommand):
+    help = ('Move as tarefas concluídas há muito tempo para o arquivo. Cada lote é uma transação: '
+            'se interrompido, basta rodar de novo')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None,
+                            help='Arquiva as concluídas há mais de N dias. Padrão: TAREFAS_ARQUIVAR_APOS_DIAS')
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Quantidade de tarefas movidas por transação')
+        parser.add_argument('--lotes', type=int, default=None,
+                            help='Para depois de N lotes (para rodar em janelas curtas). Padrão: até acabar')
+
+    def handle(self, *args, dias=None, lote=1000, lotes=None, **options):
+        dias = settings.TAREFAS_ARQUIVAR_APOS_DIAS if dias is None else dias
+        inicio = time.monotonic()
+        arquivadas = arquivar(dias=dias, lote=lote, lotes=lotes)
+        segundos = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{arquivadas} tarefa(s) concluída(s) há mais de {dias} dias arquivada(s) em {segundos:.1f}s'
+        ))
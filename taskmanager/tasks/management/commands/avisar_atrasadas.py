@@ -0,0 +1,48 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.notificacoes import enviar_notificacoes, varrer_atrasadas
+
+
+class Command(BaseCommand):
+    help = (
+        'Marca as tarefas que atrasaram desde a última execução e envia um resumo por e-mail a cada usuário '
+        '(agendar uma vez por dia, depois da meia-noite, ou rodar continuamente com --intervalo)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Varre vencimentos a partir deste dia (AAAA-MM-DD). '
+                                            'Padrão: o dia seguinte à última varredura')
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Quantidade de tarefas marcadas por transação')
+        parser.add_argument('--lote-envio', type=int, default=100, dest='lote_envio',
+                            help='Quantidade de usuários por lote de e-mails')
+        parser.add_argument('--sem-envio', action='store_true', dest='sem_envio',
+                            help='Só varre e enfileira, sem enviar')
+        parser.add_argument('--intervalo', type=int, default=0,
+                            help='Repete a cada N segundos (0: roda uma vez)')
+
+    def handle(self, *args, desde=None, lote=1000, lote_envio=100, sem_envio=False, intervalo=0, **options):
+        if desde:
+            try:
+                desde = datetime.date.fromisoformat(desde)
+            except ValueError:
+                raise CommandError('Use --desde no formato AAAA-MM-DD.')
+        if lote < 1 or lote_envio < 1:
+            raise CommandError('--lote e --lote-envio precisam ser pelo menos 1.')
+
+        while True:
+            inicio = time.monotonic()
+            tarefas, notificacoes = varrer_atrasadas(desde=desde, lote=lote)
+            mensagem = f'{tarefas} tarefa(s) atrasada(s), {notificacoes} notificação(ões) enfileirada(s)'
+            if not sem_envio:
+                emails, usuarios = enviar_notificacoes(lote=lote_envio)
+                mensagem += f', {emails} e-mail(s) enviado(s) para {usuarios} usuário(s)'
+            self.stdout.write(self.style.SUCCESS(f'{mensagem} em {time.monotonic() - inicio:.1f}s'))
+            if not intervalo:
+                break
+            # --desde vale só para a primeira execução
+            desde = None
+            time.sleep(intervalo)
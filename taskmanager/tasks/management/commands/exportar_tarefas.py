@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.models import Tarefa
+from tasks.transferencia import formato_do_arquivo, gerar_exportacao
+
+
+class Command(BaseCommand):
+    help = 'Exporta as tarefas de um usuário em CSV ou JSON Lines, sem carregar tudo na memória'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', type=int, required=True, help='Id do usuário')
+        parser.add_argument('--saida', help='Arquivo de destino (.csv ou .jsonl). Padrão: saída padrão')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'],
+                            help='Padrão: pela extensão de --saida, ou csv')
+        parser.add_argument('--lote', type=int, default=getattr(settings, 'TAREFAS_STREAM_CHUNK', 500),
+                            help='Quantidade de tarefas lidas do banco por vez')
+
+    def handle(self, *args, usuario, saida=None, formato=None, lote=500, **options):
+        if not User.objects.filter(pk=usuario).exists():
+            raise CommandError(f'Usuário {usuario} não existe.')
+        formato = formato or (saida and formato_do_arquivo(saida)) or 'csv'
+        tarefas = Tarefa.objects.filter(usuario_id=usuario)
+        total = tarefas.count()
+
+        inicio = time.monotonic()
+        destino = open(saida, 'w', encoding='utf-8', newline='') if saida else sys.stdout
+        try:
+            for pedaco in gerar_exportacao(tarefas, formato, lote):
+                destino.write(pedaco)
+        finally:
+            if saida:
+                destino.close()
+        segundos = time.monotonic() - inicio
+
+        # O resumo vai para stderr para não misturar com o arquivo na saída padrão
+        taxa = total / segundos if segundos else 0
+        self.stderr.write(self.style.SUCCESS(
+            f'{total} tarefa(s) exportada(s) em {segundos:.1f}s ({taxa:.0f} linhas/s)'
+        ))
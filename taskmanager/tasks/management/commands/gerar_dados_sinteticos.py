@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.sintetico import gerar
+
+
+class Command(BaseCommand):
+    help = 'Cria usuários, categorias e tarefas sintéticos com bulk_create, para testes de carga'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=10, help='Quantidade de usuários')
+        parser.add_argument('--categorias', type=int, default=5, help='Categorias por usuário')
+        parser.add_argument('--tarefas', type=int, default=100, help='Tarefas por usuário')
+        parser.add_argument('--semente', type=int, help='Semente do sorteio, para repetir os mesmos dados')
+        parser.add_argument('--lote', type=int, default=5000, help='Tarefas gravadas por transação')
+        parser.add_argument('--prefixo', default='sintetico', help='Prefixo do nome dos usuários')
+        parser.add_argument('--senha', help='Senha dos usuários criados. Padrão: sem senha utilizável')
+
+    def handle(self, *args, usuarios=10, categorias=5, tarefas=100, semente=None, lote=5000,
+               prefixo='sintetico', senha=None, **options):
+        if min(usuarios, categorias, tarefas) < 0 or usuarios == 0 or lote < 1:
+            raise CommandError('Use --usuarios e --lote maiores que zero e quantidades não negativas.')
+
+        inicio = time.monotonic()
+        ids = gerar(usuarios, categorias, tarefas, semente=semente, lote=lote, prefixo=prefixo, senha=senha)
+        segundos = time.monotonic() - inicio
+        total = len(ids) * tarefas
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(ids)} usuário(s) (ids {ids[0]}-{ids[-1]}), {len(ids) * categorias} categoria(s) e '
+            f'{total} tarefa(s) criados em {segundos:.1f}s ({total / max(segundos, 1e-9):.0f} tarefas/s)'
+        ))
@@ -0,0 +1,41 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tasks.analise import gerar_resumos
+from tasks.estatisticas import ids_usuarios
+
+
+class Command(BaseCommand):
+    help = 'Grava os resumos diários de produtividade (rodar uma vez por noite, depois da meia-noite)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Dia do resumo (AAAA-MM-DD). Padrão: ontem')
+        parser.add_argument('--usuario', type=int, action='append', dest='usuarios',
+                            help='Id do usuário (pode repetir). Padrão: todos')
+        parser.add_argument('--lote', type=int, default=500,
+                            help='Quantidade de usuários calculados por vez')
+
+    def handle(self, *args, data=None, usuarios=None, lote=500, **options):
+        if data:
+            try:
+                dia = datetime.date.fromisoformat(data)
+            except ValueError:
+                raise CommandError('Use --data no formato AAAA-MM-DD.')
+        else:
+            dia = timezone.localdate() - datetime.timedelta(days=1)
+
+        inicio = time.monotonic()
+        lotes = [usuarios] if usuarios else ids_usuarios(lote)
+        processados = 0
+        linhas = 0
+        for ids in lotes:
+            linhas += gerar_resumos(dia, ids)
+            processados += len(ids)
+
+        segundos = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{dia}: {linhas} resumo(s) de {processados} usuário(s) gravados em {segundos:.1f}s'
+        ))
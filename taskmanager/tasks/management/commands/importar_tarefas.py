@@ -0,0 +1,49 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.transferencia import formato_do_arquivo, importar_linhas, ler_linhas
+
+
+class Command(BaseCommand):
+    help = 'Importa tarefas de um arquivo CSV ou JSON Lines em blocos, com bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Arquivo .csv ou .jsonl ("-" para a entrada padrão)')
+        parser.add_argument('--usuario', type=int, required=True, help='Id do usuário dono das tarefas')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'],
+                            help='Padrão: pela extensão do arquivo')
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Quantidade de linhas validadas e gravadas por transação')
+
+    def handle(self, *args, arquivo, usuario, formato=None, lote=1000, **options):
+        dono = User.objects.filter(pk=usuario).first()
+        if dono is None:
+            raise CommandError(f'Usuário {usuario} não existe.')
+        formato = formato or formato_do_arquivo(arquivo)
+        if formato is None:
+            raise CommandError('Informe --formato: extensão do arquivo não reconhecida.')
+
+        try:
+            entrada = sys.stdin if arquivo == '-' else open(arquivo, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(str(e))
+        try:
+            resultado = importar_linhas(dono, ler_linhas(entrada, formato), lote=lote)
+        except UnicodeDecodeError as e:
+            raise CommandError(str(e))
+        finally:
+            if entrada is not sys.stdin:
+                entrada.close()
+
+        for numero, mensagem in resultado.erros:
+            self.stderr.write(f'linha {numero}: {mensagem}')
+        if resultado.invalidas > len(resultado.erros):
+            self.stderr.write(f'... e mais {resultado.invalidas - len(resultado.erros)} linha(s) inválida(s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.importadas} tarefa(s) importada(s), {resultado.invalidas} linha(s) inválida(s), '
+            f'{resultado.categorias_criadas} categoria(s) criada(s) em {resultado.segundos:.1f}s '
+            f'({resultado.linhas_por_segundo:.0f} linhas/s)'
+        ))
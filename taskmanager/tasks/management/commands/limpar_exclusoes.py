@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from tasks.models import Exclusao, SequenciaSync
+
+
+class Command(BaseCommand):
+    help = 'Remove registros de exclusão antigos usados pelo sync do PWA'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30,
+                            help='Mantém as exclusões dos últimos N dias')
+        parser.add_argument('--lote', type=int, default=5000,
+                            help='Quantidade de registros removidos por transação')
+
+    def handle(self, *args, dias=30, lote=5000, **options):
+        antigas = Exclusao.objects.filter(data_exclusao__lt=timezone.now() - timedelta(days=dias))
+
+        # Clientes com cursor anterior à última exclusão removida precisam
+        # sincronizar do zero (SequenciaSync.minimo)
+        for linha in antigas.order_by().values('usuario_id').annotate(maior=Max('versao_sync')):
+            SequenciaSync.objects.filter(
+                usuario_id=linha['usuario_id'], minimo__lt=linha['maior'],
+            ).update(minimo=linha['maior'])
+
+        removidas = 0
+        while True:
+            with transaction.atomic():
+                ids = list(antigas.order_by('pk').values_list('pk', flat=True)[:lote])
+                if not ids:
+                    break
+                removidas += Exclusao.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'{removidas} exclusão(ões) removida(s)'))
@@ -0,0 +1,73 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tasks.desempenho import SERIES, TAMANHOS, comparar, executar
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede latência, consultas SQL e memória de todas as URLs do app com 10, 1 mil e 100 mil tarefas '
+        'por usuário, num banco de teste descartável. Com --base, falha se houver regressão.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', default=','.join(map(str, TAMANHOS)),
+                            help='Tarefas por usuário, separadas por vírgula')
+        parser.add_argument('--repeticoes', type=int, default=20, help='Chamadas medidas por URL')
+        parser.add_argument('--saida', default='desempenho.json', help='Arquivo JSON com o resultado')
+        parser.add_argument('--base', help='Resultado anterior (JSON) para comparar')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Aumento relativo aceito em latência e memória')
+        parser.add_argument('--semente', type=int, default=0, help='Semente dos dados sintéticos')
+        parser.add_argument('--series', type=int, default=SERIES,
+                            help='Séries recorrentes no benchmark da agenda (0 desliga)')
+
+    def handle(self, *args, tamanhos, repeticoes=20, saida='desempenho.json', base=None, tolerancia=0.25,
+               semente=0, series=SERIES, **options):
+        try:
+            tamanhos = [int(tamanho) for tamanho in tamanhos.split(',')]
+        except ValueError:
+            raise CommandError('Use --tamanhos com números separados por vírgula, por exemplo 10,1000.')
+        anterior = None
+        if base:
+            try:
+                with open(base, encoding='utf-8') as arquivo:
+                    anterior = json.load(arquivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Não foi possível ler {base}: {e}')
+
+        setup_test_environment(debug=False)
+        nome_banco = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            resultado = executar(tamanhos, repeticoes, semente, progresso=self.stderr.write, series=series)
+        finally:
+            connection.creation.destroy_test_db(nome_banco, verbosity=0)
+            teardown_test_environment()
+
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+        for tamanho, urls in resultado['resultados'].items():
+            for nome, medida in urls.items():
+                self.stdout.write(
+                    f'{tamanho:>7} {nome:<20} p50 {medida["p50_ms"]:>8.1f}ms  p95 {medida["p95_ms"]:>8.1f}ms  '
+                    f'p99 {medida["p99_ms"]:>8.1f}ms  {medida["consultas"]:>4} SQL  {medida["memoria_kb"]:>9.1f}KB'
+                )
+        recorrencias = resultado.get('recorrencias')
+        if recorrencias:
+            self.stdout.write(
+                f'agenda com {recorrencias["series"]} séries: p50 {recorrencias["p50_ms"]:.1f}ms  '
+                f'p95 {recorrencias["p95_ms"]:.1f}ms  {recorrencias["consultas"]} SQL  '
+                f'{recorrencias["ocorrencias"]} ocorrências geradas em {recorrencias["expansao_ms"]:.1f}ms  '
+                f'tarefas {recorrencias["tarefas_antes"]} -> {recorrencias["tarefas_depois"]}'
+            )
+        self.stdout.write(f'Resultado gravado em {saida}')
+
+        if anterior is not None:
+            regressoes = comparar(resultado, anterior, tolerancia)
+            if regressoes:
+                raise CommandError('Regressões em relação a {}:\n{}'.format(base, '\n'.join(regressoes)))
+            self.stdout.write(self.style.SUCCESS(f'Sem regressões em relação a {base}'))
@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.inicializacao import ErroInicializacao, medir
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o cold start (importar a aplicação e atender a primeira requisição) em processos novos, '
+        'no modo padrão e no enxuto (TAREFAS_ENXUTO), com o tempo de importação por módulo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modo', choices=['padrao', 'enxuto', 'ambos'], default='ambos')
+        parser.add_argument('--caminho', default='/login/', help='URL da primeira requisição')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Processos medidos por modo')
+        parser.add_argument('--modulos', type=int, default=15, help='Quantos módulos mais lentos listar')
+        parser.add_argument('--json', action='store_true', dest='como_json', help='Imprime o resultado como JSON')
+
+    def handle(self, *args, modo='ambos', caminho='/login/', repeticoes=5, modulos=15, como_json=False, **options):
+        if repeticoes < 1:
+            raise CommandError('--repeticoes precisa ser pelo menos 1.')
+        modos = {'padrao': [False], 'enxuto': [True], 'ambos': [False, True]}[modo]
+        try:
+            resultados = [medir(enxuto, caminho, repeticoes) for enxuto in modos]
+        except ErroInicializacao as e:
+            raise CommandError(str(e))
+
+        if como_json:
+            self.stdout.write(json.dumps([resultado.como_dict(modulos) for resultado in resultados], indent=2))
+            return
+
+        self.stdout.write(f'{"modo":<8} {"processo":>10} {"importar":>10} {"resposta":>10}  status')
+        for resultado in resultados:
+            self.stdout.write(
+                f'{resultado.modo:<8} {resultado.mediana("processo_ms"):>8.1f}ms '
+                f'{resultado.mediana("importar_ms"):>8.1f}ms {resultado.mediana("resposta_ms"):>8.1f}ms  '
+                f'{resultado.status}'
+            )
+        if len(resultados) == 2:
+            padrao, enxuto = (resultado.mediana('processo_ms') for resultado in resultados)
+            self.stdout.write(f'enxuto - padrao: {enxuto - padrao:+.1f}ms ({(enxuto - padrao) / padrao:+.1%})')
+
+        for resultado in resultados:
+            self.stdout.write(f'\nImportação por pacote ({resultado.modo}):')
+            for pacote, ms in list(resultado.por_pacote().items())[:modulos]:
+                self.stdout.write(f'  {pacote:<40} {ms:>8.1f}ms')
+            self.stdout.write(f'Módulos mais lentos ({resultado.modo}):')
+            for nome, (proprio, acumulado) in resultado.mais_lentos(modulos):
+                self.stdout.write(f'  {nome:<40} {proprio:>8.1f}ms (acumulado {acumulado:.1f}ms)')
+            if resultado.pesados():
+                self.stdout.write(self.style.WARNING(
+                    'Carregados para atender a requisição: ' + ', '.join(resultado.pesados())
+                ))
+
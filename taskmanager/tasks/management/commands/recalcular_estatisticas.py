@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tasks.estatisticas import divergencias, ids_usuarios, recalcular_usuarios
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói (ou só verifica) os contadores de tarefas por usuário e por categoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', type=int, action='append', dest='usuarios',
+                            help='Id do usuário (pode repetir). Padrão: todos')
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Quantidade de usuários por transação')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Apenas lista contadores divergentes, sem gravar')
+
+    def handle(self, *args, usuarios=None, lote=1000, verificar=False, **options):
+        lotes = [usuarios] if usuarios else ids_usuarios(lote)
+        processados = 0
+        total_erros = 0
+
+        for ids in lotes:
+            if verificar:
+                for usuario_id, campo, gravado, correto in divergencias(ids):
+                    total_erros += 1
+                    self.stdout.write(f'usuário {usuario_id}: {campo} = {gravado}, esperado {correto}')
+            else:
+                with transaction.atomic():
+                    recalcular_usuarios(ids)
+            processados += len(ids)
+
+        if verificar:
+            estilo = self.style.WARNING if total_erros else self.style.SUCCESS
+            self.stdout.write(estilo(f'{processados} usuário(s) verificados, {total_erros} divergência(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{processados} usuário(s) recalculados'))
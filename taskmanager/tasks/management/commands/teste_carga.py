@@ -0,0 +1,75 @@
+import json
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.carga import medir
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara requisições por segundo e latência (p50/p95/p99) de servidores rodando o projeto. '
+        'Exemplo: com "gunicorn taskmanager.wsgi -w 4 --threads 8 -b 127.0.0.1:8000" e '
+        '"uvicorn taskmanager.asgi:application --workers 4 --port 8001" no ar, rode '
+        'teste_carga wsgi=http://127.0.0.1:8000 asgi=http://127.0.0.1:8001 --usuario 1'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('alvos', nargs='+', metavar='NOME=URL',
+                            help='Servidor a medir, por exemplo asgi=http://127.0.0.1:8001')
+        parser.add_argument('--usuario', type=int,
+                            help='Id do usuário logado nas requisições (a sessão é criada no banco local, '
+                                 'que precisa ser o mesmo dos servidores)')
+        parser.add_argument('--caminho', action='append', dest='caminhos',
+                            help='Caminho requisitado (pode repetir). Padrão: a lista de tarefas e a de categorias')
+        parser.add_argument('--concorrencia', type=int, default=200, help='Conexões simultâneas')
+        parser.add_argument('--requisicoes', type=int, default=5000, help='Total de requisições por servidor')
+        parser.add_argument('--aquecimento', type=int, default=200,
+                            help='Requisições feitas antes da medição e descartadas')
+        parser.add_argument('--json', action='store_true', dest='como_json', help='Resultado em JSON')
+
+    def handle(self, *args, alvos, usuario=None, caminhos=None, concorrencia=200, requisicoes=5000,
+               aquecimento=200, como_json=False, **options):
+        servidores = []
+        for alvo in alvos:
+            nome, sep, url = alvo.partition('=')
+            if not sep or not url.startswith('http://'):
+                raise CommandError(f'Alvo inválido: {alvo!r}. Use NOME=http://host:porta')
+            servidores.append((nome, url))
+        caminhos = caminhos or ['/', '/categorias/']
+
+        cabecalhos = {}
+        if usuario is not None:
+            cabecalhos['Cookie'] = f'{settings.SESSION_COOKIE_NAME}={self.criar_sessao(usuario)}'
+
+        resultados = []
+        for nome, url in servidores:
+            self.stderr.write(f'{nome}: {requisicoes} requisições, {concorrencia} conexões...')
+            resultados.append(medir(nome, url, caminhos, cabecalhos, concorrencia, requisicoes, aquecimento))
+
+        if como_json:
+            self.stdout.write(json.dumps([resultado.como_dict() for resultado in resultados], indent=2))
+            return
+        self.stdout.write(f'{"servidor":<12}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"erros":>8}')
+        for resultado in resultados:
+            self.stdout.write(
+                f'{resultado.nome:<12}{resultado.por_segundo:>10.1f}{resultado.percentil(50):>10.1f}'
+                f'{resultado.percentil(95):>10.1f}{resultado.percentil(99):>10.1f}{resultado.erros:>8}'
+            )
+            if resultado.erros:
+                self.stderr.write(f'{resultado.nome}: respostas por status {resultado.status}')
+
+    def criar_sessao(self, usuario_id):
+        usuario = User.objects.filter(pk=usuario_id).first()
+        if usuario is None:
+            raise CommandError(f'Usuário {usuario_id} não existe.')
+        sessao = import_module(settings.SESSION_ENGINE).SessionStore()
+        sessao[SESSION_KEY] = str(usuario.pk)
+        sessao[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sessao[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sessao.save()
+        return sessao.session_key
+
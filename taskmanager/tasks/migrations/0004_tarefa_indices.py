@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_alter_tarefa_tempo_estimado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['usuario', '-prioridade', 'data_vencimento', 'id'], name='tarefa_usuario_ordem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['usuario', 'concluida', '-prioridade', 'data_vencimento', 'id'], name='tarefa_usuario_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(condition=models.Q(('concluida', False)), fields=['usuario', 'data_vencimento'], name='tarefa_pendente_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['categoria', 'usuario'], name='tarefa_categoria_usuario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['-prioridade', 'data_vencimento', 'id'], name='tarefa_ordem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['data_vencimento'], name='tarefa_vencimento_idx'),
+        ),
+    ]
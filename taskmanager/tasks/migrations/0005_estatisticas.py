@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_tarefa_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticasCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('pendentes', models.IntegerField(default=0)),
+                ('tempo_estimado_total', models.BigIntegerField(default=0)),
+                ('categoria', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='estatisticas', to='tasks.categoria')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EstatisticasUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('pendentes', models.IntegerField(default=0)),
+                ('concluidas', models.IntegerField(default=0)),
+                ('prioridade_alta', models.IntegerField(default=0)),
+                ('prioridade_media', models.IntegerField(default=0)),
+                ('prioridade_baixa', models.IntegerField(default=0)),
+                ('tempo_estimado_total', models.BigIntegerField(default=0)),
+                ('tempo_estimado_pendente', models.BigIntegerField(default=0)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='estatisticas_tarefas', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
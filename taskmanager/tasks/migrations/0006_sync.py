@@ -0,0 +1,95 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def numerar_registros_existentes(apps, schema_editor):
+    """
+    Dá a cada linha existente uma versão distinta (o próprio id) e começa a
+    sequência de cada usuário acima de todas elas.
+    """
+    Tarefa = apps.get_model('tasks', 'Tarefa')
+    Categoria = apps.get_model('tasks', 'Categoria')
+    SequenciaSync = apps.get_model('tasks', 'SequenciaSync')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    banco = schema_editor.connection.alias
+
+    Tarefa.objects.using(banco).update(versao_sync=F('id'))
+    Categoria.objects.using(banco).update(versao_sync=F('id'))
+    inicio = max(
+        Tarefa.objects.using(banco).aggregate(m=Max('id'))['m'] or 0,
+        Categoria.objects.using(banco).aggregate(m=Max('id'))['m'] or 0,
+    )
+    SequenciaSync.objects.using(banco).bulk_create(
+        [SequenciaSync(usuario_id=pk, valor=inicio) for pk in User.objects.using(banco).values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_estatisticas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Exclusao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('tarefa', 'Tarefa'), ('categoria', 'Categoria')], max_length=10)),
+                ('objeto_id', models.BigIntegerField()),
+                ('versao_sync', models.BigIntegerField()),
+                ('data_exclusao', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SequenciaSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.BigIntegerField(default=0)),
+                ('minimo', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='versao_sync',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tarefa',
+            name='versao_sync',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(fields=['usuario', 'versao_sync'], name='categoria_usuario_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['usuario', 'versao_sync'], name='tarefa_usuario_sync_idx'),
+        ),
+        migrations.AddField(
+            model_name='exclusao',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='sequenciasync',
+            name='usuario',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sequencia_sync', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='exclusao',
+            index=models.Index(fields=['usuario', 'versao_sync'], name='exclusao_usuario_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exclusao',
+            index=models.Index(fields=['data_exclusao'], name='exclusao_data_idx'),
+        ),
+        migrations.RunPython(numerar_registros_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,131 @@
+from django.db import migrations
+
+# Índice de busca (ver tasks/busca.py). O SQL fica aqui, e não importado do
+# app, para que a migração continue a mesma quando o código mudar.
+
+TABELA_FTS = 'tasks_tarefa_busca'
+CONFIG_POSTGRES = 'portuguese'
+
+SQL_SQLITE_GATILHOS = [
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_ai AFTER INSERT ON tasks_tarefa BEGIN
+        INSERT INTO {TABELA_FTS} (rowid, dono, descricao, notas, categoria)
+        VALUES (new.id, 'u' || new.usuario_id, new.descricao, new.notas,
+                coalesce((SELECT nome FROM tasks_categoria WHERE id = new.categoria_id), ''));
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_ad AFTER DELETE ON tasks_tarefa BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_au AFTER UPDATE OF usuario_id, descricao, notas, categoria_id ON tasks_tarefa
+    WHEN old.usuario_id IS NOT new.usuario_id OR old.descricao IS NOT new.descricao
+        OR old.notas IS NOT new.notas OR old.categoria_id IS NOT new.categoria_id
+    BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+        INSERT INTO {TABELA_FTS} (rowid, dono, descricao, notas, categoria)
+        VALUES (new.id, 'u' || new.usuario_id, new.descricao, new.notas,
+                coalesce((SELECT nome FROM tasks_categoria WHERE id = new.categoria_id), ''));
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_categoria_au AFTER UPDATE OF nome ON tasks_categoria
+    WHEN old.nome IS NOT new.nome
+    BEGIN
+        UPDATE {TABELA_FTS} SET categoria = new.nome
+        WHERE rowid IN (SELECT id FROM tasks_tarefa WHERE categoria_id = new.id);
+    END
+    """,
+]
+
+SQL_SQLITE = [
+    f"""
+    CREATE VIRTUAL TABLE {TABELA_FTS} USING fts5(
+        dono, descricao, notas, categoria,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    *SQL_SQLITE_GATILHOS,
+    f"""
+    INSERT INTO {TABELA_FTS} (rowid, dono, descricao, notas, categoria)
+    SELECT t.id, 'u' || t.usuario_id, t.descricao, t.notas, coalesce(c.nome, '')
+    FROM tasks_tarefa t LEFT JOIN tasks_categoria c ON c.id = t.categoria_id
+    """,
+]
+
+SQL_SQLITE_REMOVER = [
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_categoria_au',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_au',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ad',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ai',
+    f'DROP TABLE IF EXISTS {TABELA_FTS}',
+]
+
+SQL_POSTGRES = [
+    'ALTER TABLE tasks_tarefa ADD COLUMN busca tsvector',
+    f"""
+    CREATE FUNCTION tasks_tarefa_busca() RETURNS trigger AS $$
+    BEGIN
+        NEW.busca :=
+            setweight(to_tsvector('{CONFIG_POSTGRES}', coalesce(NEW.descricao, '')), 'A') ||
+            setweight(to_tsvector('{CONFIG_POSTGRES}', coalesce(
+                (SELECT nome FROM tasks_categoria WHERE id = NEW.categoria_id), '')), 'B') ||
+            setweight(to_tsvector('{CONFIG_POSTGRES}', coalesce(NEW.notas, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER tasks_tarefa_busca BEFORE INSERT OR UPDATE OF descricao, notas, categoria_id
+    ON tasks_tarefa FOR EACH ROW EXECUTE FUNCTION tasks_tarefa_busca()
+    """,
+    """
+    CREATE FUNCTION tasks_categoria_busca() RETURNS trigger AS $$
+    BEGIN
+        UPDATE tasks_tarefa SET categoria_id = categoria_id WHERE categoria_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER tasks_categoria_busca AFTER UPDATE OF nome ON tasks_categoria
+    FOR EACH ROW WHEN (OLD.nome IS DISTINCT FROM NEW.nome) EXECUTE FUNCTION tasks_categoria_busca()
+    """,
+    'UPDATE tasks_tarefa SET descricao = descricao',
+    'CREATE INDEX tarefa_busca_idx ON tasks_tarefa USING GIN (busca)',
+]
+
+SQL_POSTGRES_REMOVER = [
+    'DROP TRIGGER IF EXISTS tasks_categoria_busca ON tasks_categoria',
+    'DROP FUNCTION IF EXISTS tasks_categoria_busca()',
+    'DROP TRIGGER IF EXISTS tasks_tarefa_busca ON tasks_tarefa',
+    'DROP FUNCTION IF EXISTS tasks_tarefa_busca()',
+    'ALTER TABLE tasks_tarefa DROP COLUMN IF EXISTS busca',
+]
+
+
+def executar(schema_editor, sql_por_banco):
+    # Em outros bancos a busca não tem índice
+    for comando in sql_por_banco.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(comando, params=None)
+
+
+def instalar(apps, schema_editor):
+    executar(schema_editor, {'sqlite': SQL_SQLITE, 'postgresql': SQL_POSTGRES})
+
+
+def remover(apps, schema_editor):
+    executar(schema_editor, {'sqlite': SQL_SQLITE_REMOVER, 'postgresql': SQL_POSTGRES_REMOVER})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar, remover),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefa',
+            name='data_conclusao',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('concluidas', models.IntegerField(default=0)),
+                ('pendentes', models.IntegerField(default=0)),
+                ('atrasadas', models.IntegerField(default=0)),
+                ('criadas_no_dia', models.IntegerField(default=0)),
+                ('concluidas_no_dia', models.IntegerField(default=0)),
+                ('concluidas_medidas', models.IntegerField(default=0)),
+                ('concluidas_no_prazo', models.IntegerField(default=0)),
+                ('tempo_estimado_medido', models.BigIntegerField(default=0)),
+                ('tempo_decorrido_medido', models.BigIntegerField(default=0)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='tasks.categoria')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'categoria', 'data'], name='resumo_usuario_data_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,123 @@
+from django.db import migrations, models
+
+PRIORIDADES = {'baixa': 1, 'media': 2, 'alta': 3}
+
+# Triggers do índice de busca no SQLite (migração 0007), copiados para que a
+# migração não dependa do código do app
+TABELA_FTS = 'tasks_tarefa_busca'
+
+GATILHOS = [
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_ai AFTER INSERT ON tasks_tarefa BEGIN
+        INSERT INTO {TABELA_FTS} (rowid, dono, descricao, notas, categoria)
+        VALUES (new.id, 'u' || new.usuario_id, new.descricao, new.notas,
+                coalesce((SELECT nome FROM tasks_categoria WHERE id = new.categoria_id), ''));
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_ad AFTER DELETE ON tasks_tarefa BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_au AFTER UPDATE OF usuario_id, descricao, notas, categoria_id ON tasks_tarefa
+    WHEN old.usuario_id IS NOT new.usuario_id OR old.descricao IS NOT new.descricao
+        OR old.notas IS NOT new.notas OR old.categoria_id IS NOT new.categoria_id
+    BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+        INSERT INTO {TABELA_FTS} (rowid, dono, descricao, notas, categoria)
+        VALUES (new.id, 'u' || new.usuario_id, new.descricao, new.notas,
+                coalesce((SELECT nome FROM tasks_categoria WHERE id = new.categoria_id), ''));
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_categoria_au AFTER UPDATE OF nome ON tasks_categoria
+    WHEN old.nome IS NOT new.nome
+    BEGIN
+        UPDATE {TABELA_FTS} SET categoria = new.nome
+        WHERE rowid IN (SELECT id FROM tasks_tarefa WHERE categoria_id = new.id);
+    END
+    """,
+]
+
+REMOVER_GATILHOS = [
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_categoria_au',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_au',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ad',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ai',
+]
+
+RECARREGAR = [
+    f'DELETE FROM {TABELA_FTS}',
+    f"""
+    INSERT INTO {TABELA_FTS} (rowid, dono, descricao, notas, categoria)
+    SELECT t.id, 'u' || t.usuario_id, t.descricao, t.notas, coalesce(c.nome, '')
+    FROM tasks_tarefa t LEFT JOIN tasks_categoria c ON c.id = t.categoria_id
+    """,
+]
+
+
+def para_inteiro(apps, schema_editor):
+    Tarefa = apps.get_model('tasks', 'Tarefa')
+    for texto, numero in PRIORIDADES.items():
+        Tarefa.objects.using(schema_editor.connection.alias).filter(prioridade=texto).update(prioridade_nova=numero)
+
+
+def para_texto(apps, schema_editor):
+    Tarefa = apps.get_model('tasks', 'Tarefa')
+    for texto, numero in PRIORIDADES.items():
+        Tarefa.objects.using(schema_editor.connection.alias).filter(prioridade_nova=numero).update(prioridade=texto)
+
+
+def suspender_busca(apps, schema_editor):
+    # Remover e renomear colunas recria a tabela de tarefas no SQLite, e os triggers
+    # referenciam a tabela que some no meio da troca
+    if schema_editor.connection.vendor == 'sqlite':
+        for comando in REMOVER_GATILHOS:
+            schema_editor.execute(comando, params=None)
+
+
+def reinstalar_busca(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for comando in [*REMOVER_GATILHOS, *GATILHOS, *RECARREGAR]:
+            schema_editor.execute(comando, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_analise'),
+    ]
+
+    operations = [
+        migrations.RunPython(suspender_busca, reinstalar_busca),
+        migrations.RemoveIndex(model_name='tarefa', name='tarefa_usuario_ordem_idx'),
+        migrations.RemoveIndex(model_name='tarefa', name='tarefa_usuario_status_idx'),
+        migrations.RemoveIndex(model_name='tarefa', name='tarefa_ordem_idx'),
+        migrations.RemoveIndex(model_name='tarefa', name='tarefa_pendente_venc_idx'),
+        migrations.AddField(
+            model_name='tarefa',
+            name='prioridade_nova',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Baixa'), (2, 'Média'), (3, 'Alta')], default=2),
+        ),
+        migrations.RunPython(para_inteiro, para_texto),
+        migrations.RemoveField(model_name='tarefa', name='prioridade'),
+        migrations.RenameField(model_name='tarefa', old_name='prioridade_nova', new_name='prioridade'),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['usuario', '-prioridade', 'data_vencimento', 'id'], name='tarefa_usuario_ordem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['usuario', 'concluida', '-prioridade', 'data_vencimento', 'id'], name='tarefa_usuario_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['-prioridade', 'data_vencimento', 'id'], name='tarefa_ordem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(condition=models.Q(('concluida', False)), fields=['usuario', 'data_vencimento', '-prioridade', 'id'], name='tarefa_proximas_idx'),
+        ),
+        migrations.RunPython(reinstalar_busca, suspender_busca),
+    ]
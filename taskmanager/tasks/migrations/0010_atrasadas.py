@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_prioridade_inteira'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notificacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('atrasadas', 'Tarefas atrasadas')], default='atrasadas', max_length=20)),
+                ('tarefas', models.JSONField(default=list)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('enviada_em', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Varredura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=50, unique=True)),
+                ('dia', models.DateField()),
+                ('atualizada_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tarefa',
+            name='atraso_avisado',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(condition=models.Q(('concluida', False)), fields=['data_vencimento', 'id'], name='tarefa_pendente_vencimento_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(condition=models.Q(('enviada_em__isnull', True)), fields=['usuario', 'id'], name='notificacao_pendente_idx'),
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Triggers do índice de busca no SQLite (migração 0007), copiados para que a
+# migração não dependa do código do app
+TABELA_FTS = 'tasks_tarefa_busca'
+
+GATILHOS = [
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_ai AFTER INSERT ON tasks_tarefa BEGIN
+        INSERT INTO {TABELA_FTS} (rowid, dono, descricao, notas, categoria)
+        VALUES (new.id, 'u' || new.usuario_id, new.descricao, new.notas,
+                coalesce((SELECT nome FROM tasks_categoria WHERE id = new.categoria_id), ''));
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_ad AFTER DELETE ON tasks_tarefa BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_au AFTER UPDATE OF usuario_id, descricao, notas, categoria_id ON tasks_tarefa
+    WHEN old.usuario_id IS NOT new.usuario_id OR old.descricao IS NOT new.descricao
+        OR old.notas IS NOT new.notas OR old.categoria_id IS NOT new.categoria_id
+    BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+        INSERT INTO {TABELA_FTS} (rowid, dono, descricao, notas, categoria)
+        VALUES (new.id, 'u' || new.usuario_id, new.descricao, new.notas,
+                coalesce((SELECT nome FROM tasks_categoria WHERE id = new.categoria_id), ''));
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABELA_FTS}_categoria_au AFTER UPDATE OF nome ON tasks_categoria
+    WHEN old.nome IS NOT new.nome
+    BEGIN
+        UPDATE {TABELA_FTS} SET categoria = new.nome
+        WHERE rowid IN (SELECT id FROM tasks_tarefa WHERE categoria_id = new.id);
+    END
+    """,
+]
+
+REMOVER_GATILHOS = [
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_categoria_au',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_au',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ad',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ai',
+]
+
+RECARREGAR = [
+    f'DELETE FROM {TABELA_FTS}',
+    f"""
+    INSERT INTO {TABELA_FTS} (rowid, dono, descricao, notas, categoria)
+    SELECT t.id, 'u' || t.usuario_id, t.descricao, t.notas, coalesce(c.nome, '')
+    FROM tasks_tarefa t LEFT JOIN tasks_categoria c ON c.id = t.categoria_id
+    """,
+]
+
+
+def suspender_busca(apps, schema_editor):
+    # A restrição única recria a tabela de tarefas no SQLite, e os triggers
+    # referenciam a tabela que some no meio da troca
+    if schema_editor.connection.vendor == 'sqlite':
+        for comando in REMOVER_GATILHOS:
+            schema_editor.execute(comando, params=None)
+
+
+def reinstalar_busca(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for comando in [*REMOVER_GATILHOS, *GATILHOS, *RECARREGAR]:
+            schema_editor.execute(comando, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_atrasadas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(suspender_busca, reinstalar_busca),
+        migrations.AddField(
+            model_name='tarefa',
+            name='data_ocorrencia',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='Recorrencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('regra', models.CharField(max_length=200)),
+                ('inicio', models.DateField()),
+                ('termino', models.DateField(blank=True, null=True)),
+                ('excecoes', models.JSONField(blank=True, default=list)),
+                ('tarefa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recorrencia', to='tasks.tarefa')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tarefa',
+            name='serie',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ocorrencias', to='tasks.recorrencia'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['usuario', 'data_vencimento'], name='tarefa_usuario_vencimento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(condition=models.Q(('data_ocorrencia__isnull', False)), fields=['usuario', 'data_ocorrencia'], name='tarefa_usuario_ocorrencia_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tarefa',
+            constraint=models.UniqueConstraint(fields=('serie', 'data_ocorrencia'), name='tarefa_ocorrencia_unica'),
+        ),
+        migrations.AddIndex(
+            model_name='recorrencia',
+            index=models.Index(fields=['usuario', 'inicio'], name='recorrencia_usuario_inicio_idx'),
+        ),
+        migrations.RunPython(reinstalar_busca, suspender_busca),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_recorrencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('descricao', models.CharField(max_length=200)),
+                ('prioridade', models.PositiveSmallIntegerField(choices=[(1, 'Baixa'), (2, 'Média'), (3, 'Alta')])),
+                ('data_vencimento', models.DateField()),
+                ('data_criacao', models.DateTimeField()),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True)),
+                ('notas', models.TextField(blank=True)),
+                ('tempo_estimado', models.IntegerField(default=0)),
+                ('arquivada_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-data_vencimento', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(condition=models.Q(('concluida', True)), fields=['serie', 'data_conclusao', 'data_vencimento'], name='tarefa_arquivavel_idx'),
+        ),
+        migrations.AddField(
+            model_name='tarefaarquivada',
+            name='categoria',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tasks.categoria'),
+        ),
+        migrations.AddField(
+            model_name='tarefaarquivada',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tarefaarquivada',
+            index=models.Index(fields=['usuario', '-data_vencimento', '-id'], name='arquivada_usuario_ordem_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator
@@ -7,32 +7,398 @@ class Categoria(models.Model):
     nome = models.CharField(max_length=50)
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     cor = models.CharField(max_length=7, default='#007bff')  
+    # Posição na sequência de alterações do usuário (ver tasks/sync.py)
+    versao_sync = models.BigIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.nome
+    
+    def save(self, *args, **kwargs):
+        from .sync import marcar_versao
+        with transaction.atomic():
+            marcar_versao(self, kwargs)
+            super().save(*args, **kwargs)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'versao_sync'], name='categoria_usuario_sync_idx'),
+        ]
 
 class Tarefa(models.Model):
-    PRIORIDADE_CHOICES = [
-        ('alta', 'Alta'),
-        ('media', 'Média'),
-        ('baixa', 'Baixa'),
-    ]
+    class Prioridade(models.IntegerChoices):
+        # Inteiros para que "-prioridade" ordene alta > média > baixa
+        BAIXA = 1, 'Baixa'
+        MEDIA = 2, 'Média'
+        ALTA = 3, 'Alta'
+        
+        @property
+        def slug(self):
+            """Nome usado em URLs, classes CSS e arquivos: 'alta', 'media', 'baixa'"""
+            return self.name.lower()
+        
+        @classmethod
+        def de_texto(cls, valor):
+            """Aceita o slug ou o número; None se não for uma prioridade válida"""
+            texto = str(valor).strip().lower()
+            if texto.upper() in cls.names:
+                return cls[texto.upper()]
+            if texto.isdigit() and int(texto) in cls.values:
+                return cls(int(texto))
+            return None
+    
+    PRIORIDADE_CHOICES = Prioridade.choices
+    # "Próximas": pendentes por vencimento e, no mesmo dia, por prioridade
+    # (índice parcial tarefa_proximas_idx)
+    ORDEM_URGENCIA = ['data_vencimento', '-prioridade', 'id']
     
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     descricao = models.CharField(max_length=200)
-    prioridade = models.CharField(max_length=10, choices=PRIORIDADE_CHOICES, default='media')
+    prioridade = models.PositiveSmallIntegerField(choices=Prioridade.choices, default=Prioridade.MEDIA)
     data_vencimento = models.DateField()
     data_criacao = models.DateTimeField(auto_now_add=True)
     concluida = models.BooleanField(default=False)
+    # Preenchida quando a tarefa é concluída (ver tasks/analise.py)
+    data_conclusao = models.DateTimeField(null=True, blank=True, editable=False)
     categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True)
     notas = models.TextField(blank=True)
     tempo_estimado = models.IntegerField(default=0,validators=[MinValueValidator(0)],help_text="Tempo estimado em minutos (mínimo: 0)")
+    versao_sync = models.BigIntegerField(default=0, editable=False)
+    # data_vencimento cujo atraso já foi avisado (ver tasks/notificacoes.py)
+    atraso_avisado = models.DateField(null=True, blank=True, editable=False)
+    # Série da qual a tarefa é uma ocorrência gravada, e a data que a regra
+    # deu a essa ocorrência (ver tasks/recorrencia.py)
+    serie = models.ForeignKey(
+        'Recorrencia', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='ocorrencias',
+    )
+    data_ocorrencia = models.DateField(null=True, blank=True, editable=False)
+    
+    # Estado carregado do banco, usado para atualizar os contadores de
+    # EstatisticasUsuario sem precisar reler a linha (ver tasks/estatisticas.py)
+    _estado_original = None
     
     def __str__(self):
         return f"{self.descricao} - {self.get_prioridade_display()}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        from .estatisticas import estado_tarefa
+        instance._estado_original = estado_tarefa(instance)
+        return instance
+    
+    def save(self, *args, **kwargs):
+        from .estatisticas import estado_tarefa, registrar_alteracao
+        from .sync import marcar_versao
+        if self.concluida != (self.data_conclusao is not None):
+            self.data_conclusao = timezone.now() if self.concluida else None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'data_conclusao'}
+        with transaction.atomic():
+            marcar_versao(self, kwargs)
+            super().save(*args, **kwargs)
+            depois = estado_tarefa(self)
+            registrar_alteracao(self.usuario_id, self._estado_original, depois)
+            self._estado_original = depois
+    
+    @property
+    def prioridade_slug(self):
+        return self.Prioridade(self.prioridade).slug
+    
     def esta_atrasada(self):
-        return not self.concluida and self.data_vencimento < timezone.now().date()
+        # Mesmo dia (no fuso do projeto) da varredura de atrasadas e do cache das linhas
+        return not self.concluida and self.data_vencimento < timezone.localdate()
+    
+    class Meta:
+        ordering = ['-prioridade', 'data_vencimento']
+        # Cada índice corresponde a um caminho de acesso real (ver
+        # QueryPlanTests em tests.py). O id no final dá o desempate da
+        # paginação por cursor sem precisar ordenar em memória.
+        indexes = [
+            # lista_tarefas: "todas" e filtros por prioridade
+            models.Index(fields=['usuario', '-prioridade', 'data_vencimento', 'id'], name='tarefa_usuario_ordem_idx'),
+            # lista_tarefas: pendentes / concluídas
+            models.Index(fields=['usuario', 'concluida', '-prioridade', 'data_vencimento', 'id'], name='tarefa_usuario_status_idx'),
+            # Tarefas pendentes em ORDEM_URGENCIA ("próximas", atrasadas):
+            # as N primeiras saem de uma leitura do índice com LIMIT
+            models.Index(
+                fields=['usuario', 'data_vencimento', '-prioridade', 'id'],
+                condition=models.Q(concluida=False),
+                name='tarefa_proximas_idx',
+            ),
+            # excluir_categoria: existe tarefa do usuário nesta categoria?
+            models.Index(fields=['categoria', 'usuario'], name='tarefa_categoria_usuario_idx'),
+            # admin: listagem geral e filtro por data de vencimento
+            models.Index(fields=['-prioridade', 'data_vencimento', 'id'], name='tarefa_ordem_idx'),
+            models.Index(fields=['data_vencimento'], name='tarefa_vencimento_idx'),
+            # Varredura de atrasadas: pendentes que venceram desde a última execução
+            models.Index(
+                fields=['data_vencimento', 'id'],
+                condition=models.Q(concluida=False),
+                name='tarefa_pendente_vencimento_idx',
+            ),
+            # sync: alterações do usuário desde um cursor
+            models.Index(fields=['usuario', 'versao_sync'], name='tarefa_usuario_sync_idx'),
+            # agenda: tarefas do usuário num intervalo de datas, e as
+            # ocorrências gravadas que saíram de lá (vencimento alterado)
+            models.Index(fields=['usuario', 'data_vencimento'], name='tarefa_usuario_vencimento_idx'),
+            models.Index(
+                fields=['usuario', 'data_ocorrencia'],
+                condition=models.Q(data_ocorrencia__isnull=False),
+                name='tarefa_usuario_ocorrencia_idx',
+            ),
+            # Arquivo: concluídas há mais de N dias (as antigas, sem data de
+            # conclusão, pelo vencimento). A série vem primeiro: com "serie IS
+            # NULL" fora do índice o SQLite prefere o índice da FK, que traz quase todas
+            models.Index(
+                fields=['serie', 'data_conclusao', 'data_vencimento'],
+                condition=models.Q(concluida=True),
+                name='tarefa_arquivavel_idx',
+            ),
+        ]
+        constraints = [
+            # Cada ocorrência de uma série vira no máximo uma linha
+            models.UniqueConstraint(fields=['serie', 'data_ocorrencia'], name='tarefa_ocorrencia_unica'),
+        ]
+
+
+class TarefaArquivada(models.Model):
+    """
+    Tarefa concluída há muito tempo, fora da tabela de tarefas (ver
+    tasks/arquivo.py). Guarda o id que tinha em Tarefa.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    descricao = models.CharField(max_length=200)
+    prioridade = models.PositiveSmallIntegerField(choices=Tarefa.Prioridade.choices)
+    data_vencimento = models.DateField()
+    data_criacao = models.DateTimeField()
+    data_conclusao = models.DateTimeField(null=True, blank=True)
+    categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    notas = models.TextField(blank=True)
+    tempo_estimado = models.IntegerField(default=0)
+    arquivada_em = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.descricao
+    
+    @property
+    def prioridade_slug(self):
+        return Tarefa.Prioridade(self.prioridade).slug
+    
+    class Meta:
+        ordering = ['-data_vencimento', '-id']
+        indexes = [
+            # Tela do arquivo: do vencimento mais recente para o mais antigo
+            models.Index(fields=['usuario', '-data_vencimento', '-id'], name='arquivada_usuario_ordem_idx'),
+        ]
+
+
+class Recorrencia(models.Model):
+    """
+    Repetição de uma tarefa por uma regra RRULE (RFC 5545) a partir do
+    vencimento da tarefa modelo. As ocorrências não são gravadas: são geradas
+    só para o período exibido e viram Tarefa quando são concluídas ou
+    editadas (ver tasks/recorrencia.py).
+    """
+    FREQUENCIAS = {
+        'diaria': 'FREQ=DAILY',
+        'semanal': 'FREQ=WEEKLY',
+        'mensal': 'FREQ=MONTHLY',
+    }
+    
+    tarefa = models.OneToOneField(Tarefa, on_delete=models.CASCADE, related_name='recorrencia')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    regra = models.CharField(max_length=200)
+    inicio = models.DateField()
+    # Última ocorrência, se a regra tem COUNT ou UNTIL
+    termino = models.DateField(null=True, blank=True)
+    # Datas (AAAA-MM-DD) de ocorrências excluídas
+    excecoes = models.JSONField(default=list, blank=True)
+    
+    def __str__(self):
+        return f"{self.tarefa.descricao}: {self.regra}"
+    
+    def save(self, *args, **kwargs):
+        from .recorrencia import calcular_termino
+        self.termino = calcular_termino(self.regra, self.inicio)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'termino'}
+        super().save(*args, **kwargs)
+    
+    class Meta:
+        indexes = [
+            # agenda: séries do usuário que começam antes do fim do período
+            models.Index(fields=['usuario', 'inicio'], name='recorrencia_usuario_inicio_idx'),
+        ]
+
+
+class EstatisticasUsuario(models.Model):
+    """
+    Contadores de tarefas por usuário, mantidos de forma incremental na mesma
+    transação de cada escrita. O comando ``recalcular_estatisticas``
+    reconstrói tudo a partir da tabela de tarefas.
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='estatisticas_tarefas')
+    total = models.IntegerField(default=0)
+    pendentes = models.IntegerField(default=0)
+    concluidas = models.IntegerField(default=0)
+    prioridade_alta = models.IntegerField(default=0)
+    prioridade_media = models.IntegerField(default=0)
+    prioridade_baixa = models.IntegerField(default=0)
+    tempo_estimado_total = models.BigIntegerField(default=0)
+    tempo_estimado_pendente = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Estatísticas de {self.usuario}"
+    
+    def contagem(self, filtro):
+        """Número de tarefas que aparecem na lista com o filtro informado"""
+        if filtro in ['pendentes', 'proximas']:
+            return self.pendentes
+        if filtro == 'concluidas':
+            return self.concluidas
+        if filtro in ['alta', 'media', 'baixa']:
+            return getattr(self, f'prioridade_{filtro}')
+        return self.total
+
+
+class EstatisticasCategoria(models.Model):
+    categoria = models.OneToOneField(Categoria, on_delete=models.CASCADE, related_name='estatisticas')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    total = models.IntegerField(default=0)
+    pendentes = models.IntegerField(default=0)
+    tempo_estimado_total = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Estatísticas de {self.categoria}"
+
+
+class SequenciaSync(models.Model):
+    """
+    Contador de alterações por usuário. Cada escrita em Tarefa/Categoria pega o
+    próximo valor com um UPDATE na linha do usuário, que fica travada até o fim
+    da transação; assim os valores ficam visíveis na ordem em que são
+    confirmados e nenhum cliente pula uma alteração.
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='sequencia_sync')
+    valor = models.BigIntegerField(default=0)
+    # Cursores abaixo deste valor podem ter perdido exclusões já removidas
+    minimo = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.usuario}: {self.valor}"
+
+
+class Exclusao(models.Model):
+    """Registro (tombstone) de uma tarefa ou categoria excluída, para o sync"""
+    TIPO_CHOICES = [
+        ('tarefa', 'Tarefa'),
+        ('categoria', 'Categoria'),
+    ]
+    
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    versao_sync = models.BigIntegerField()
+    data_exclusao = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.objeto_id} excluída"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'versao_sync'], name='exclusao_usuario_sync_idx'),
+            models.Index(fields=['data_exclusao'], name='exclusao_data_idx'),
+        ]
+
+
+class ResumoDiario(models.Model):
+    """
+    Métricas de produtividade de um dia, por usuário (sem categoria) e por
+    categoria. Gravado pelo comando ``gerar_resumos_diarios``; os relatórios
+    leem daqui em vez de varrer a tabela de tarefas.
+    """
+    data = models.DateField()
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, null=True, blank=True)
+    METRICAS = [
+        'total', 'concluidas', 'pendentes', 'atrasadas', 'criadas_no_dia', 'concluidas_no_dia',
+        'concluidas_medidas', 'concluidas_no_prazo', 'tempo_estimado_medido', 'tempo_decorrido_medido',
+    ]
+    total = models.IntegerField(default=0)
+    concluidas = models.IntegerField(default=0)
+    pendentes = models.IntegerField(default=0)
+    atrasadas = models.IntegerField(default=0)
+    criadas_no_dia = models.IntegerField(default=0)
+    concluidas_no_dia = models.IntegerField(default=0)
+    # Concluídas com data_conclusao conhecida, base das métricas de prazo e tempo
+    concluidas_medidas = models.IntegerField(default=0)
+    concluidas_no_prazo = models.IntegerField(default=0)
+    # Soma, em minutos, sobre as concluídas medidas que tinham estimativa
+    tempo_estimado_medido = models.BigIntegerField(default=0)
+    tempo_decorrido_medido = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Resumo de {self.usuario} em {self.data}"
+    
+    @property
+    def taxa_conclusao(self):
+        return self.concluidas / self.total if self.total else None
+    
+    @property
+    def taxa_no_prazo(self):
+        return self.concluidas_no_prazo / self.concluidas_medidas if self.concluidas_medidas else None
+    
+    @property
+    def razao_estimativa(self):
+        """Tempo decorrido / tempo estimado (acima de 1: estimativas otimistas)"""
+        return self.tempo_decorrido_medido / self.tempo_estimado_medido if self.tempo_estimado_medido else None
+    
+    def como_dict(self):
+        dados = {'data': self.data.isoformat(), **{campo: getattr(self, campo) for campo in self.METRICAS}}
+        for taxa in ['taxa_conclusao', 'taxa_no_prazo', 'razao_estimativa']:
+            dados[taxa] = getattr(self, taxa)
+        return dados
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'categoria', 'data'], name='resumo_usuario_data_idx'),
+        ]
+
+
+
+class Varredura(models.Model):
+    """Até que dia uma tarefa de fundo já processou (ver tasks/notificacoes.py)"""
+    nome = models.CharField(max_length=50, unique=True)
+    dia = models.DateField()
+    atualizada_em = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.nome}: {self.dia}"
+
+
+class Notificacao(models.Model):
+    """
+    Fila de avisos por usuário. A varredura de atrasadas grava aqui e o envio
+    junta todas as pendentes de um usuário num único e-mail.
+    """
+    TIPO_CHOICES = [
+        ('atrasadas', 'Tarefas atrasadas'),
+    ]
+    
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, default='atrasadas')
+    # Ids das tarefas avisadas
+    tarefas = models.JSONField(default=list)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    enviada_em = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} para {self.usuario}"
     
     class Meta:
-        ordering = ['-prioridade', 'data_vencimento']
\ No newline at end of file
+        indexes = [
+            # Envio: próximos usuários com avisos pendentes
+            models.Index(fields=['usuario', 'id'], condition=models.Q(enviada_em__isnull=True),
+                         name='notificacao_pendente_idx'),
+        ]
@@ -0,0 +1,140 @@
+"""
+Aviso de tarefas atrasadas, em segundo plano.
+
+``varrer_atrasadas`` olha só os dias que viraram desde a execução anterior
+(guardada em Varredura): lê pelo índice parcial tarefa_pendente_vencimento_idx
+as pendentes com vencimento entre o último dia varrido e ontem, marca cada uma
+em ``atraso_avisado`` e grava um registro por usuário na fila (Notificacao).
+O trabalho acompanha o número de tarefas que acabaram de atrasar, não o total
+de tarefas. Rodar de novo no mesmo dia não lê nada; se uma execução parar no
+meio, a seguinte refaz o intervalo e pula as já marcadas.
+
+Uma tarefa cujo vencimento é alterado para um dia já varrido não é avisada:
+quem a editou já sabe que ela está atrasada.
+
+``enviar_notificacoes`` junta as pendentes de cada usuário num único e-mail
+(resumo) e envia por lotes de usuários, numa conexão só com o servidor de
+e-mail por lote.
+"""
+import datetime
+from collections import defaultdict
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Notificacao, Tarefa, Varredura
+
+VARREDURA = 'atrasadas'
+
+
+def vencidas(inicio, fim):
+    """Pendentes ainda não avisadas com vencimento em [inicio, fim), na ordem do índice"""
+    return (
+        Tarefa.objects.filter(concluida=False, data_vencimento__gte=inicio, data_vencimento__lt=fim)
+        .exclude(atraso_avisado=F('data_vencimento'))
+        .order_by('data_vencimento', 'id')
+    )
+
+
+def varrer_atrasadas(hoje=None, desde=None, lote=1000):
+    """
+    Avisa as tarefas que venceram de ``desde`` (padrão: o dia seguinte à
+    última varredura; na primeira, ontem) até a véspera de ``hoje``.
+    Retorna (tarefas, notificacoes) gravadas.
+    """
+    hoje = hoje or timezone.localdate()
+    varredura, _ = Varredura.objects.get_or_create(
+        nome=VARREDURA, defaults={'dia': hoje - datetime.timedelta(days=1)},
+    )
+    pendentes = vencidas(desde or varredura.dia, hoje)
+
+    tarefas = notificacoes = 0
+    cursor = None
+    while True:
+        pagina = pendentes
+        if cursor is not None:
+            vencimento, pk = cursor
+            pagina = pagina.filter(Q(data_vencimento__gt=vencimento) | Q(data_vencimento=vencimento, id__gt=pk))
+        linhas = list(pagina.values_list('id', 'usuario_id', 'data_vencimento')[:lote])
+        if not linhas:
+            break
+        cursor = linhas[-1][2], linhas[-1][0]
+
+        por_usuario = defaultdict(list)
+        for pk, usuario_id, _ in linhas:
+            por_usuario[usuario_id].append(pk)
+        # O UPDATE não passa por Tarefa.save: o aviso não é uma alteração
+        # da tarefa (não muda versao_sync nem os contadores)
+        with transaction.atomic():
+            Tarefa.objects.filter(pk__in=[linha[0] for linha in linhas]).update(
+                atraso_avisado=F('data_vencimento'),
+            )
+            Notificacao.objects.bulk_create([
+                Notificacao(usuario_id=usuario_id, tipo=VARREDURA, tarefas=ids)
+                for usuario_id, ids in por_usuario.items()
+            ])
+        tarefas += len(linhas)
+        notificacoes += len(por_usuario)
+
+    if hoje > varredura.dia:
+        varredura.dia = hoje
+        varredura.save(update_fields=['dia', 'atualizada_em'])
+    return tarefas, notificacoes
+
+
+def _mensagem(usuario, tarefas):
+    contexto = {'usuario': usuario, 'tarefas': tarefas}
+    return EmailMessage(
+        subject=f'Tarefando: {len(tarefas)} tarefa(s) atrasada(s)',
+        body=render_to_string('tasks/email_atrasadas.txt', contexto),
+        to=[usuario.email],
+    )
+
+
+def enviar_notificacoes(lote=100):
+    """
+    Envia as notificações pendentes, um e-mail por usuário, ``lote``
+    usuários por vez. Tarefas concluídas ou excluídas desde a varredura saem
+    do resumo. Retorna (emails, usuarios) processados.
+    """
+    pendentes = Notificacao.objects.filter(enviada_em__isnull=True)
+    emails = usuarios = 0
+    while True:
+        with transaction.atomic():
+            # skip_locked: vários processos enviando não pegam o mesmo usuário
+            notificacoes = list(
+                pendentes.filter(usuario_id__in=pendentes.order_by('usuario_id').values('usuario_id').distinct()[:lote])
+                .select_related('usuario')
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('usuario_id', 'id')
+            )
+            if not notificacoes:
+                break
+            por_usuario = defaultdict(list)
+            for notificacao in notificacoes:
+                por_usuario[notificacao.usuario].extend(notificacao.tarefas)
+            ids = {pk for tarefa_ids in por_usuario.values() for pk in tarefa_ids}
+            atrasadas = defaultdict(list)
+            for tarefa in (
+                Tarefa.objects.filter(pk__in=ids, concluida=False)
+                .only('usuario', 'descricao', 'data_vencimento')
+                .order_by(*Tarefa.ORDEM_URGENCIA)
+            ):
+                atrasadas[tarefa.usuario_id].append(tarefa)
+
+            mensagens = [
+                _mensagem(usuario, atrasadas[usuario.pk])
+                for usuario in por_usuario
+                if usuario.email and atrasadas[usuario.pk]
+            ]
+            if mensagens:
+                get_connection(fail_silently=False).send_messages(mensagens)
+            Notificacao.objects.filter(pk__in=[notificacao.pk for notificacao in notificacoes]).update(
+                enviada_em=timezone.now(),
+            )
+        emails += len(mensagens)
+        usuarios += len(por_usuario)
+    return emails, usuarios
@@ -0,0 +1,118 @@
+"""
+Orçamento de consultas SQL por view.
+
+Cada view declara quantas consultas pode fazer com ``@orcamento_sql``. O
+decorator mede número e tempo das consultas executadas dentro da view, guarda
+o resultado em ``request.estatisticas_sql`` e avisa no log quando o orçamento
+é estourado. Com ``ORCAMENTO_SQL_ESTRITO = True`` (usado nos testes) o estouro
+vira exceção, então um N+1 novo quebra a suíte em vez de passar em silêncio.
+
+Consultas feitas depois que a view retorna (por exemplo, no corpo de uma
+StreamingHttpResponse) não entram na conta.
+
+Views assíncronas também podem ser decoradas: nelas o ORM roda na thread de
+``sync_to_async``, então o contador é instalado na conexão dessa thread.
+"""
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class OrcamentoExcedido(AssertionError):
+    pass
+
+
+@dataclass
+class EstatisticasSQL:
+    consultas: int = 0
+    tempo_ms: float = 0.0
+    sql: list = field(default_factory=list)
+
+    def __call__(self, execute, sql, params, many, context):
+        # Usado como execute_wrapper da conexão
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.tempo_ms += (time.perf_counter() - inicio) * 1000
+            self.sql.append(sql)
+
+
+@dataclass(frozen=True)
+class Orcamento:
+    max_consultas: int
+    max_ms: float | None = None
+
+    def verificar(self, nome, estatisticas):
+        """Retorna a mensagem de erro, ou None se estiver dentro do orçamento"""
+        if estatisticas.consultas > self.max_consultas:
+            return (f'{nome} fez {estatisticas.consultas} consultas SQL '
+                    f'(orçamento: {self.max_consultas})')
+        if self.max_ms is not None and estatisticas.tempo_ms > self.max_ms:
+            return (f'{nome} gastou {estatisticas.tempo_ms:.1f}ms em SQL '
+                    f'(orçamento: {self.max_ms}ms)')
+        return None
+
+
+@contextmanager
+def _instalar(estatisticas):
+    with ExitStack() as pilha:
+        for alias in connections:
+            pilha.enter_context(connections[alias].execute_wrapper(estatisticas))
+        yield
+
+
+def medir_sql():
+    """Context manager que conta as consultas de todos os bancos (o padrão e as réplicas)"""
+    estatisticas = EstatisticasSQL()
+    return _instalar(estatisticas), estatisticas
+
+
+def orcamento_sql(max_consultas, max_ms=None):
+    orcamento = Orcamento(max_consultas, max_ms)
+
+    def decorator(view):
+        nome = view.__name__
+
+        def verificar(request, estatisticas):
+            request.estatisticas_sql = estatisticas
+            erro = orcamento.verificar(nome, estatisticas)
+            if erro:
+                if getattr(settings, 'ORCAMENTO_SQL_ESTRITO', False):
+                    raise OrcamentoExcedido(erro + '\n' + '\n'.join(estatisticas.sql))
+                logger.warning(erro)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                contexto, estatisticas = await sync_to_async(medir_sql)()
+                await sync_to_async(contexto.__enter__)()
+                try:
+                    resposta = await view(request, *args, **kwargs)
+                finally:
+                    await sync_to_async(contexto.__exit__)(None, None, None)
+                verificar(request, estatisticas)
+                return resposta
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                contexto, estatisticas = medir_sql()
+                with contexto:
+                    resposta = view(request, *args, **kwargs)
+                verificar(request, estatisticas)
+                return resposta
+
+        wrapper.orcamento_sql = orcamento
+        return wrapper
+
+    return decorator
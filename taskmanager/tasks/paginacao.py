@@ -0,0 +1,164 @@
+"""
+Paginação por cursor (keyset) para listas ordenadas de modelos.
+
+Em vez de OFFSET, cada página guarda os valores da última linha exibida e a
+próxima consulta continua a partir deles. O custo de cada página é o mesmo,
+não importa o quão longe o usuário já navegou.
+
+Para quem ainda precisa de um total (o admin), ``PaginatorEstimado`` usa a
+estimativa do planner do PostgreSQL em vez de COUNT(*) quando o resultado é
+grande.
+"""
+import json
+from dataclasses import dataclass
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+SALT_CURSOR = 'tasks.paginacao.cursor'
+# Abaixo disto (pela estimativa) o COUNT(*) é barato e o total é exato
+CONTAGEM_EXATA_ATE = 10000
+
+
+@dataclass
+class Pagina:
+    objetos: list
+    proximo_cursor: str | None = None
+    cursor_atual: str | None = None
+
+    @property
+    def tem_proxima(self):
+        return self.proximo_cursor is not None
+
+    @property
+    def eh_primeira(self):
+        return self.cursor_atual is None
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def __bool__(self):
+        return bool(self.objetos)
+
+
+class KeysetPaginator:
+    """
+    Pagina um queryset seguindo ``ordering``, a ordem já aplicada com
+    ``order_by()`` ou o ``Meta.ordering`` do modelo, com ``id`` como
+    desempate. Os campos da ordenação não podem ser nulos.
+    """
+
+    def __init__(self, queryset, por_pagina=50, ordering=None):
+        self.queryset = queryset
+        self.por_pagina = por_pagina
+        self.modelo = queryset.model
+        ordering = list(ordering or queryset.query.order_by or self.modelo._meta.ordering)
+        if 'id' not in ordering and '-id' not in ordering:
+            ordering.append('id')
+        self.ordering = ordering
+
+    def _campos(self):
+        for item in self.ordering:
+            nome = item.lstrip('-')
+            yield nome, item.startswith('-'), self.modelo._meta.get_field(nome)
+
+    def codificar(self, obj):
+        valores = [campo.value_to_string(obj) for _, _, campo in self._campos()]
+        return signing.dumps(valores, salt=SALT_CURSOR, compress=True)
+
+    def decodificar(self, cursor):
+        """Retorna os valores do cursor, ou None se ele for inválido."""
+        if not cursor:
+            return None
+        try:
+            valores = signing.loads(cursor, salt=SALT_CURSOR)
+        except signing.BadSignature:
+            return None
+        campos = list(self._campos())
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            return None
+        try:
+            return [campo.to_python(valor) for (_, _, campo), valor in zip(campos, valores)]
+        except Exception:
+            return None
+
+    def filtro_apos(self, valores):
+        """
+        Monta o Q equivalente a ``(c1, c2, ...) > (v1, v2, ...)`` respeitando
+        a direção de cada campo.
+        """
+        condicao = Q()
+        iguais = {}
+        for (nome, desc, _), valor in zip(self._campos(), valores):
+            lookup = f'{nome}__lt' if desc else f'{nome}__gt'
+            condicao |= Q(**iguais, **{lookup: valor})
+            iguais[nome] = valor
+        return condicao
+
+    def _consulta(self, cursor):
+        """(queryset da página, cursor válido ou None)"""
+        queryset = self.queryset.order_by(*self.ordering)
+        valores = self.decodificar(cursor)
+        if valores is None:
+            cursor = None
+        else:
+            queryset = queryset.filter(self.filtro_apos(valores))
+        # Busca uma linha a mais só para saber se existe próxima página
+        return queryset[:self.por_pagina + 1], cursor
+
+    def pagina(self, cursor=None):
+        queryset, cursor = self._consulta(cursor)
+        return self._montar(list(queryset), cursor)
+
+    async def apagina(self, cursor=None):
+        """Versão assíncrona de ``pagina``"""
+        queryset, cursor = self._consulta(cursor)
+        return self._montar([obj async for obj in queryset], cursor)
+
+    def _montar(self, objetos, cursor):
+        proximo = None
+        if len(objetos) > self.por_pagina:
+            objetos = objetos[:self.por_pagina]
+            proximo = self.codificar(objetos[-1])
+
+        return Pagina(objetos=objetos, proximo_cursor=proximo, cursor_atual=cursor)
+
+
+def estimar_linhas(queryset):
+    """
+    Linhas que o planner espera para o queryset (EXPLAIN, sem executar), ou
+    None se o banco não der estimativa. No PostgreSQL ela vem das
+    estatísticas do ANALYZE (pg_class.reltuples e histogramas).
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plano = json.loads(queryset.order_by().explain(format='json'))
+    return int(plano[0]['Plan']['Plan Rows'])
+
+
+def contagem_estimada(queryset, exata_ate=CONTAGEM_EXATA_ATE):
+    """
+    (número de linhas do queryset, se é estimado): exato se a estimativa for
+    pequena ou se o banco não estimar, a estimativa se for grande
+    """
+    estimativa = estimar_linhas(queryset)
+    if estimativa is None or estimativa < exata_ate:
+        return queryset.count(), False
+    return estimativa, True
+
+
+class PaginatorEstimado(Paginator):
+    """Paginator cujo ``count`` vem de ``contagem_estimada``; ``estimado`` diz se é aproximado"""
+
+    estimado = False
+
+    @cached_property
+    def count(self):
+        total, self.estimado = contagem_estimada(self.object_list)
+        return total
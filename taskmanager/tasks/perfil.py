@@ -0,0 +1,384 @@
+"""
+Perfil de requisições: tempo por fase, Server-Timing e métricas Prometheus.
+
+Ligado com ``TAREFAS_PERFIL = True``, que põe ``PerfilMiddleware`` no início
+de MIDDLEWARE e o backend ``tasks.perfil.DjangoTemplates`` em TEMPLATES. Em
+cada requisição são medidas as fases:
+
+- ``sql``: consultas ao banco (execute_wrapper instalado em toda conexão);
+- ``template``: renderização de templates;
+- ``sessao``: carga e gravação da sessão;
+- ``mensagens``: leitura e gravação do django.contrib.messages;
+- ``conexao``: abertura de conexões com o banco ou retirada do pool (com os
+  backends de ``tasks.bancos``);
+- ``total``: a requisição inteira, do primeiro middleware à resposta.
+
+As fases se sobrepõem: o SQL da sessão conta em ``sql`` e em ``sessao``, e
+consultas disparadas pelo template contam também em ``template``. Respostas
+em streaming só medem o que acontece até a view retornar.
+
+O resultado vai no cabeçalho ``Server-Timing`` e em histogramas por nome de
+URL e fase, guardados na memória do processo e expostos em ``/metrics`` no
+formato texto do Prometheus (com vários workers cada um tem os seus; o
+Prometheus separa pelo alvo). As métricas incluem as conexões adquiridas por
+origem (``nova``, ``pool`` ou ``persistente``, quando a requisição usou o
+banco sem precisar conectar) e, nos bancos com pool, as estatísticas do
+pool do psycopg.
+
+Uma fração ``TAREFAS_PERFIL_AMOSTRA`` das requisições roda sob cProfile e, se
+passar de ``TAREFAS_PERFIL_LENTO_MS``, o perfil é gravado em
+``TAREFAS_PERFIL_DIR`` (abra com ``python -m pstats``). Em views assíncronas o
+cProfile só enxerga a thread do event loop.
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends import django as backend_django
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FASES = ['sql', 'template', 'sessao', 'mensagens', 'conexao', 'total']
+# Limites dos baldes em segundos (os padrões dos clientes Prometheus)
+BALDES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class Medicao:
+    inicio: float = field(default_factory=time.perf_counter)
+    # Fase -> milissegundos
+    fases: Counter = field(default_factory=Counter)
+    consultas: int = 0
+    conexoes: int = 0
+
+
+# Medição da requisição em andamento. Como é uma ContextVar, ela acompanha a
+# requisição para dentro de sync_to_async/async_to_sync.
+_medicao = ContextVar('tasks_perfil_medicao', default=None)
+
+
+@contextmanager
+def fase(nome):
+    """Soma o tempo do bloco à fase ``nome`` da requisição atual, se houver"""
+    medicao = _medicao.get()
+    if medicao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.fases[nome] += (time.perf_counter() - inicio) * 1000
+
+
+def _cronometrar(funcao, nome):
+    if iscoroutinefunction(funcao):
+        @wraps(funcao)
+        async def medida(*args, **kwargs):
+            with fase(nome):
+                return await funcao(*args, **kwargs)
+    else:
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            with fase(nome):
+                return funcao(*args, **kwargs)
+    return medida
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.fases['sql'] += (time.perf_counter() - inicio) * 1000
+        medicao.consultas += 1
+
+
+# Conexões do driver já entregues ao Django: se voltam, vieram do pool. As do
+# sqlite3 não aceitam weakref, mas também nunca vêm de um pool.
+_conectadas = weakref.WeakSet()
+
+
+def conexao_adquirida(bruta, segundos):
+    """Chamada pelos backends de ``tasks.bancos`` a cada ``connect()``"""
+    try:
+        origem = 'pool' if bruta in _conectadas else 'nova'
+        _conectadas.add(bruta)
+    except TypeError:
+        origem = 'nova'
+    metricas.observar_conexao(origem, segundos)
+    medicao = _medicao.get()
+    if medicao is not None:
+        medicao.fases['conexao'] += segundos * 1000
+        medicao.conexoes += 1
+
+
+def _instalar_na_conexao(sender=None, connection=None, **kwargs):
+    # No início da lista: connection.execute_wrapper() desempilha do fim, e
+    # a conexão pode abrir dentro de um desses blocos (ver tasks.orcamento)
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _medir_consulta)
+
+
+class TemplateMedido:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, nome):
+        return getattr(self.template, nome)
+
+    def render(self, context=None, request=None):
+        with fase('template'):
+            return self.template.render(context, request)
+
+
+class DjangoTemplates(backend_django.DjangoTemplates):
+    """Backend padrão do Django, medindo a renderização na fase ``template``"""
+
+    def from_string(self, template_code):
+        return TemplateMedido(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TemplateMedido(super().get_template(template_name))
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _rotulos(**rotulos):
+    return ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos.items())
+
+
+class Metricas:
+    """Histogramas de tempo por (URL, fase) e contadores, seguros entre threads"""
+
+    def __init__(self, baldes=BALDES):
+        self.baldes = baldes
+        self._trava = threading.Lock()
+        self.limpar()
+
+    def limpar(self):
+        with self._trava:
+            # (url, fase) -> [contagem por balde..., +Inf], soma em segundos
+            self._histogramas = {}
+            self._somas = Counter()
+            self._requisicoes = Counter()
+            self._consultas = Counter()
+            # Origem -> contagem por balde; as de origem "persistente" não
+            # passam por connect() e só são contadas
+            self._aquisicoes = {}
+            self._somas_aquisicao = Counter()
+            self._conexoes = Counter()
+
+    def _contar(self, contagens, segundos):
+        contagens[bisect_left(self.baldes, segundos)] += 1
+
+    def observar(self, url, status, medicao):
+        with self._trava:
+            for nome in FASES:
+                segundos = medicao.fases[nome] / 1000
+                self._contar(self._histogramas.setdefault((url, nome), [0] * (len(self.baldes) + 1)), segundos)
+                self._somas[url, nome] += segundos
+            self._requisicoes[url, status] += 1
+            self._consultas[url] += medicao.consultas
+            if medicao.consultas and not medicao.conexoes:
+                self._conexoes['persistente'] += 1
+
+    def observar_conexao(self, origem, segundos):
+        with self._trava:
+            self._contar(self._aquisicoes.setdefault(origem, [0] * (len(self.baldes) + 1)), segundos)
+            self._somas_aquisicao[origem] += segundos
+            self._conexoes[origem] += 1
+
+    def texto(self):
+        """Exposição no formato texto do Prometheus (versão 0.0.4)"""
+        with self._trava:
+            histogramas = {chave: list(contagens) for chave, contagens in self._histogramas.items()}
+            somas, requisicoes, consultas = Counter(self._somas), Counter(self._requisicoes), Counter(self._consultas)
+            aquisicoes = {origem: list(contagens) for origem, contagens in self._aquisicoes.items()}
+            somas_aquisicao, conexoes = Counter(self._somas_aquisicao), Counter(self._conexoes)
+
+        linhas = [
+            '# HELP tarefando_fase_segundos Tempo de cada fase da requisição, por nome de URL.',
+            '# TYPE tarefando_fase_segundos histogram',
+        ]
+        for (url, nome), contagens in sorted(histogramas.items()):
+            linhas += self._histograma('tarefando_fase_segundos', contagens, somas[url, nome], url=url, fase=nome)
+
+        linhas += [
+            '# HELP tarefando_requisicoes_total Requisições atendidas, por nome de URL e status.',
+            '# TYPE tarefando_requisicoes_total counter',
+        ]
+        for (url, status), total in sorted(requisicoes.items()):
+            linhas.append(f'tarefando_requisicoes_total{{{_rotulos(url=url, status=status)}}} {total}')
+
+        linhas += [
+            '# HELP tarefando_consultas_sql_total Consultas SQL executadas, por nome de URL.',
+            '# TYPE tarefando_consultas_sql_total counter',
+        ]
+        for url, total in sorted(consultas.items()):
+            linhas.append(f'tarefando_consultas_sql_total{{{_rotulos(url=url)}}} {total}')
+
+        linhas += [
+            '# HELP tarefando_conexao_aquisicao_segundos Tempo para abrir uma conexão ou retirá-la do pool.',
+            '# TYPE tarefando_conexao_aquisicao_segundos histogram',
+        ]
+        for origem, contagens in sorted(aquisicoes.items()):
+            linhas += self._histograma(
+                'tarefando_conexao_aquisicao_segundos', contagens, somas_aquisicao[origem], origem=origem,
+            )
+
+        linhas += [
+            '# HELP tarefando_conexoes_total Conexões usadas, por origem (nova, pool ou persistente).',
+            '# TYPE tarefando_conexoes_total counter',
+        ]
+        for origem, total in sorted(conexoes.items()):
+            linhas.append(f'tarefando_conexoes_total{{{_rotulos(origem=origem)}}} {total}')
+        return '\n'.join(linhas + _estatisticas_pool()) + '\n'
+
+    def _histograma(self, nome, contagens, soma, **rotulos):
+        linhas, acumulado = [], 0
+        for limite, contagem in zip([*map(str, self.baldes), '+Inf'], contagens):
+            acumulado += contagem
+            linhas.append(f'{nome}_bucket{{{_rotulos(**rotulos, le=limite)}}} {acumulado}')
+        linhas.append(f'{nome}_sum{{{_rotulos(**rotulos)}}} {soma!r}')
+        linhas.append(f'{nome}_count{{{_rotulos(**rotulos)}}} {acumulado}')
+        return linhas
+
+
+def _estatisticas_pool():
+    """Estatísticas (``get_stats()``) dos pools do psycopg, nos bancos com OPTIONS['pool']"""
+    linhas = []
+    for alias in connections:
+        if not connections.settings[alias]['OPTIONS'].get('pool'):
+            continue
+        pool = connections[alias].pool
+        for chave, valor in sorted(pool.get_stats().items()):
+            linhas.append(f'tarefando_pool{{{_rotulos(banco=alias, estatistica=chave)}}} {valor}')
+    if linhas:
+        linhas[:0] = [
+            '# HELP tarefando_pool Estatísticas do pool de conexões do psycopg, por banco.',
+            '# TYPE tarefando_pool gauge',
+        ]
+    return linhas
+
+
+metricas = Metricas()
+
+
+def _nome_url(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    return resolver_match.view_name if resolver_match else 'nao_resolvida'
+
+
+def _iniciar_perfil():
+    amostra = settings.TAREFAS_PERFIL_AMOSTRA
+    if amostra <= 0 or random.random() >= amostra:
+        return None
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # Outro profiler ativo (a partir do Python 3.12 só cabe um por processo)
+        return None
+    return perfil
+
+
+def _gravar_perfil(perfil, url, total_ms):
+    diretorio = settings.TAREFAS_PERFIL_DIR
+    os.makedirs(diretorio, exist_ok=True)
+    nome = re.sub(r'[^\w.-]', '_', url)
+    caminho = os.path.join(
+        diretorio, f'{timezone.now():%Y%m%d-%H%M%S-%f}-{nome}-{total_ms:.0f}ms.prof',
+    )
+    perfil.dump_stats(caminho)
+    logger.warning('%s levou %.0fms; perfil gravado em %s', url, total_ms, caminho)
+    return caminho
+
+
+class PerfilMiddleware:
+    """Deve ser o primeiro de MIDDLEWARE, para que ``total`` inclua os demais"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(_instalar_na_conexao, dispatch_uid='tasks.perfil')
+        for conexao in connections.all(initialized_only=True):
+            _instalar_na_conexao(connection=conexao)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        medicao, perfil = Medicao(), _iniciar_perfil()
+        token = _medicao.set(medicao)
+        try:
+            resposta = self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self.concluir(request, resposta, medicao, perfil)
+
+    async def __acall__(self, request):
+        medicao, perfil = Medicao(), _iniciar_perfil()
+        token = _medicao.set(medicao)
+        try:
+            resposta = await self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self.concluir(request, resposta, medicao, perfil)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Sessão e mensagens já foram criadas pelos middlewares, mas ainda não
+        # carregadas: as duas são lidas sob demanda
+        if _medicao.get() is None:
+            return None
+        sessao = getattr(request, 'session', None)
+        if sessao is not None:
+            for metodo in ('load', 'save', 'aload', 'asave'):
+                if hasattr(sessao, metodo):
+                    setattr(sessao, metodo, _cronometrar(getattr(sessao, metodo), 'sessao'))
+        mensagens = getattr(request, '_messages', None)
+        if mensagens is not None:
+            for metodo in ('_get', 'update'):
+                setattr(mensagens, metodo, _cronometrar(getattr(mensagens, metodo), 'mensagens'))
+        return None
+
+    def concluir(self, request, resposta, medicao, perfil):
+        medicao.fases['total'] = (time.perf_counter() - medicao.inicio) * 1000
+        if perfil is not None:
+            perfil.disable()
+        url = _nome_url(request)
+        metricas.observar(url, resposta.status_code, medicao)
+
+        resposta.headers['Server-Timing'] = ', '.join(
+            f'{nome};dur={medicao.fases[nome]:.1f}' + (f';desc="{medicao.consultas} consultas"' if nome == 'sql' else '')
+            for nome in FASES
+        )
+        if perfil is not None and medicao.fases['total'] >= settings.TAREFAS_PERFIL_LENTO_MS:
+            _gravar_perfil(perfil, url, medicao.fases['total'])
+        return resposta
@@ -0,0 +1,250 @@
+"""
+Tarefas recorrentes com ocorrências geradas sob demanda.
+
+Uma série (Recorrencia) é uma regra RRULE presa a uma tarefa modelo, que é a
+primeira ocorrência. As outras ocorrências não são gravadas: ``tarefas_do_periodo``
+as gera só para as datas exibidas, como instâncias de Tarefa sem pk copiadas
+do modelo. Uma ocorrência vira uma linha de verdade (``gravar``) quando é
+concluída ou editada; a linha guarda a série e a data da ocorrência
+(``serie``, ``data_ocorrencia``), o que impede gerar a mesma ocorrência de
+novo, mesmo que o vencimento seja alterado. Ocorrências gravadas que são
+excluídas ficam em ``Recorrencia.excecoes``.
+
+Assim a tabela de tarefas cresce com o que o usuário fez, não com o número
+de séries vezes o número de datas. Alterações no modelo (descrição,
+prioridade...) valem para as ocorrências ainda não gravadas.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+
+from dateutil.rrule import rrule, rrulestr
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import Recorrencia, Tarefa
+
+FREQUENCIAS_ACEITAS = {'DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'}
+# Séries com COUNT/UNTIL mais longas que isto são tratadas como sem fim
+# (``termino`` só serve para descartar séries encerradas na consulta)
+LIMITE_TERMINO = 5000
+# Início usado na validação: mesmo calendário de 2000 (bissexto, começando num
+# sábado), 28 anos antes do fim. O dateutil para de procurar datas em
+# datetime.MAXYEAR, então uma regra que nunca gera datas é recusada sem
+# percorrer milhares de anos
+INICIO_VALIDACAO = datetime(9972, 1, 1)
+
+
+def normalizar_regra(texto):
+    """
+    Valida uma regra RRULE ("FREQ=WEEKLY;BYDAY=MO,WE", com ou sem o prefixo
+    "RRULE:") e a devolve em maiúsculas. Levanta ValueError se for inválida
+    ou se não gerar nenhuma data em 28 anos.
+    """
+    texto = texto.strip().upper()
+    if texto.startswith('RRULE:'):
+        texto = texto[len('RRULE:'):]
+    try:
+        partes = dict(parte.split('=', 1) for parte in texto.split(';') if parte)
+    except ValueError:
+        raise ValueError('Regra inválida: use pares NOME=VALOR separados por ";".')
+    if partes.get('FREQ') not in FREQUENCIAS_ACEITAS:
+        raise ValueError('A frequência (FREQ) precisa ser DAILY, WEEKLY, MONTHLY ou YEARLY.')
+    try:
+        regra = rrulestr(texto, dtstart=INICIO_VALIDACAO)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Regra inválida: {e}')
+    if not isinstance(regra, rrule):
+        raise ValueError('Informe uma única regra RRULE.')
+    # Com INTERVAL=0 o dateutil procura a próxima data para sempre
+    if int(partes.get('INTERVAL', 1)) < 1:
+        raise ValueError('O intervalo (INTERVAL) precisa ser pelo menos 1.')
+    # Sem COUNT/UNTIL, que aqui só cortariam a busca
+    if next(iter(regra.replace(count=None, until=None)), None) is None:
+        raise ValueError('A regra não gera nenhuma data.')
+    return texto
+
+
+@lru_cache(maxsize=4096)
+def _regra(texto, inicio):
+    # A interpretação do texto custa mais que gerar as datas: a mesma regra
+    # serve a todas as requisições do processo
+    return rrulestr(texto, dtstart=datetime.combine(inicio, time.min))
+
+
+def calcular_termino(texto, inicio):
+    """Data da última ocorrência, ou None se a regra não tem fim (ou um fim distante)"""
+    if not any(parte.startswith(('COUNT=', 'UNTIL=')) for parte in texto.split(';')):
+        return None
+    datas = list(islice(_regra(texto, inicio), LIMITE_TERMINO + 1))
+    if len(datas) > LIMITE_TERMINO:
+        return None
+    return datas[-1].date() if datas else inicio
+
+
+def _datas(recorrencia, inicio, fim):
+    """Gera, em ordem e só conforme pedidas, as datas de ``datas``"""
+    if fim <= inicio:
+        return
+    excecoes = set(recorrencia.excecoes)
+    for momento in _regra(recorrencia.regra, recorrencia.inicio).xafter(datetime.combine(inicio, time.min), inc=True):
+        dia = momento.date()
+        if dia >= fim:
+            return
+        if dia.isoformat() not in excecoes:
+            yield dia
+
+
+def datas(recorrencia, inicio, fim):
+    """Datas das ocorrências da série em [inicio, fim), sem as excluídas"""
+    return list(_datas(recorrencia, inicio, fim))
+
+
+def ocorre_em(recorrencia, dia):
+    return bool(datas(recorrencia, dia, dia + timedelta(days=1)))
+
+
+def ocorrencia(recorrencia, dia):
+    """
+    Ocorrência ``dia`` da série, ainda não gravada: uma Tarefa sem pk com os
+    campos do modelo.
+    """
+    modelo = recorrencia.tarefa
+    return Tarefa(
+        usuario_id=modelo.usuario_id,
+        descricao=modelo.descricao,
+        prioridade=modelo.prioridade,
+        categoria_id=modelo.categoria_id,
+        notas=modelo.notas,
+        tempo_estimado=modelo.tempo_estimado,
+        data_vencimento=dia,
+        serie=recorrencia,
+        data_ocorrencia=dia,
+        # Entra na chave do cache da linha (ver tasks.cache): muda quando o modelo muda
+        versao_sync=modelo.versao_sync,
+    )
+
+
+def _ordem(data_vencimento, prioridade, pk, serie_id):
+    return data_vencimento, -prioridade, pk or 0, serie_id or 0
+
+
+def _ocorrencias_pendentes(recorrencia, inicio, fim, gravadas):
+    prioridade = recorrencia.tarefa.prioridade
+    for dia in _datas(recorrencia, inicio, fim):
+        if (recorrencia.pk, dia) not in gravadas:
+            yield _ordem(dia, prioridade, None, recorrencia.pk), (recorrencia, dia)
+
+
+def _periodo(usuario_id, inicio, fim):
+    """
+    Itens de ``tarefas_do_periodo`` em ordem, como (ordem, tarefa) ou
+    (ordem, (série, dia)). As datas de cada série são geradas só até onde o
+    iterador for consumido.
+    """
+    no_periodo = {'data_vencimento__gte': inicio, 'data_vencimento__lt': fim}
+    ocorrencia_no_periodo = {'data_ocorrencia__gte': inicio, 'data_ocorrencia__lt': fim}
+    tarefas = []
+    gravadas = set()
+    # As ocorrências gravadas entram mesmo que o vencimento tenha saído do período
+    for tarefa in Tarefa.objects.filter(
+        Q(**no_periodo) | Q(**ocorrencia_no_periodo), usuario_id=usuario_id,
+    ):
+        if tarefa.data_ocorrencia is not None and inicio <= tarefa.data_ocorrencia < fim:
+            gravadas.add((tarefa.serie_id, tarefa.data_ocorrencia))
+        if inicio <= tarefa.data_vencimento < fim:
+            tarefas.append((_ordem(tarefa.data_vencimento, tarefa.prioridade, tarefa.pk, tarefa.serie_id), tarefa))
+    tarefas.sort(key=itemgetter(0))
+
+    series = Recorrencia.objects.filter(
+        Q(termino__isnull=True) | Q(termino__gte=inicio), usuario_id=usuario_id, inicio__lt=fim,
+    ).select_related('tarefa')
+    fontes = [tarefas] + [_ocorrencias_pendentes(recorrencia, inicio, fim, gravadas) for recorrencia in series]
+    return heapq.merge(*fontes, key=itemgetter(0))
+
+
+def _tarefa(item):
+    return item if isinstance(item, Tarefa) else ocorrencia(*item)
+
+
+def tarefas_do_periodo(usuario_id, inicio, fim):
+    """
+    Tarefas do usuário com vencimento em [inicio, fim) mais as ocorrências
+    das séries nesse período ainda não gravadas, em ordem de vencimento e
+    prioridade. São duas consultas, qualquer que seja o número de séries.
+    """
+    return [_tarefa(item) for _, item in _periodo(usuario_id, inicio, fim)]
+
+
+def pagina_do_periodo(usuario_id, inicio, fim, numero, por_pagina):
+    """
+    Página ``numero`` (a partir de 1) de ``tarefas_do_periodo``; retorna
+    (tarefas, tem_mais). As datas das séries são geradas só até o fim da
+    página, e só as ocorrências da página viram Tarefa.
+    """
+    itens = islice(_periodo(usuario_id, inicio, fim), (numero - 1) * por_pagina, numero * por_pagina + 1)
+    tarefas = [_tarefa(item) for _, item in itens]
+    return tarefas[:por_pagina], len(tarefas) > por_pagina
+
+
+def gravar(tarefa):
+    """
+    Grava uma ocorrência montada por ``ocorrencia`` (e talvez alterada).
+    Se outra requisição já a gravou, devolve a existente sem alterá-la.
+    Retorna (tarefa, criada).
+    """
+    try:
+        with transaction.atomic():
+            tarefa.save()
+    except IntegrityError:
+        return Tarefa.objects.get(serie_id=tarefa.serie_id, data_ocorrencia=tarefa.data_ocorrencia), False
+    return tarefa, True
+
+
+def criar_serie(tarefa, regra):
+    """Faz da tarefa (já gravada) o modelo de uma série com a regra ``regra``"""
+    with transaction.atomic():
+        recorrencia = Recorrencia.objects.create(
+            tarefa=tarefa, usuario_id=tarefa.usuario_id, regra=regra, inicio=tarefa.data_vencimento,
+        )
+        tarefa.serie = recorrencia
+        tarefa.data_ocorrencia = recorrencia.inicio
+        # Sem save(): a tarefa acabou de ser gravada, com versão nova, e a
+        # série não entra no sync
+        Tarefa.objects.filter(pk=tarefa.pk).update(serie=recorrencia, data_ocorrencia=recorrencia.inicio)
+    return recorrencia
+
+
+def encerrar_serie(recorrencia):
+    """
+    Apaga a série. As ocorrências gravadas (e o modelo) continuam como
+    tarefas avulsas; as não gravadas deixam de existir.
+    """
+    from .lote import alterar_em_lote
+
+    with transaction.atomic():
+        # Pelo lote, para que a versão das linhas mude (cache e sync)
+        alterar_em_lote(Tarefa.objects.filter(serie=recorrencia), serie_id=None)
+        recorrencia.delete()
+
+
+def registrar_excecoes(pares):
+    """
+    Guarda as datas das ocorrências gravadas que foram excluídas, para que
+    não voltem a ser geradas. ``pares`` é uma lista de (serie_id, data_ocorrencia).
+    """
+    por_serie = defaultdict(set)
+    for serie_id, dia in pares:
+        if serie_id is not None and dia is not None:
+            por_serie[serie_id].add(dia.isoformat())
+    if not por_serie:
+        return
+    # Quem chama já está numa transação (a da exclusão): sem savepoint próprio
+    with transaction.atomic(savepoint=False):
+        for recorrencia in Recorrencia.objects.select_for_update().filter(pk__in=por_serie).only('excecoes'):
+            novas = por_serie[recorrencia.pk].difference(recorrencia.excecoes)
+            if novas:
+                Recorrencia.objects.filter(pk=recorrencia.pk).update(excecoes=sorted({*recorrencia.excecoes, *novas}))
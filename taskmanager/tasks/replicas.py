@@ -0,0 +1,169 @@
+"""
+Leituras em réplicas do banco.
+
+``TAREFAS_REPLICAS`` lista os aliases de DATABASES que são réplicas de
+leitura do ``default`` (em settings, a partir de DATABASE_REPLICA_URLS).
+``RoteadorReplicas`` manda para uma delas, sorteada, só as leituras feitas
+dentro das views marcadas com ``@ler_da_replica`` (as listas de tarefas e de
+categorias e as listagens do admin). Gravações, leituras das outras views,
+comandos e tarefas de fundo continuam no ``default``.
+
+Como a réplica pode estar atrasada, ``ReplicaMiddleware`` prende ao primário:
+
+- requisições que não são GET/HEAD/OPTIONS, do começo ao fim;
+- o resto da requisição depois de qualquer gravação;
+- as requisições seguintes do mesmo navegador por
+  ``TAREFAS_REPLICA_FIXAR`` segundos depois de uma gravação, pelo cookie
+  ``tarefas_primario``. Assim quem acabou de gravar lê o que gravou. Outros
+  aparelhos do mesmo usuário podem ver a réplica atrasada nesse intervalo.
+
+Uma resposta montada com dados da réplica pode estar atrasada, então não
+ganha ETag/Last-Modified (que a fariam valer até a próxima alteração) e a
+view não deve guardá-la em cache (ver ``leu_da_replica``). Respostas em
+streaming leem depois que a view retorna, então vão ao primário.
+"""
+import random
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+COOKIE = 'tarefas_primario'
+METODOS_SEGUROS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+@dataclass
+class Estado:
+    # Todas as leituras vão ao primário
+    primario: bool = False
+    # Dentro de uma view @ler_da_replica
+    replica: bool = False
+    usou_replica: bool = False
+    gravou: bool = False
+
+
+# Estado da requisição em andamento (ver ReplicaMiddleware)
+_estado = ContextVar('tasks_replicas_estado', default=None)
+
+
+class RoteadorReplicas:
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        replicas = settings.TAREFAS_REPLICAS
+        if estado is None or not estado.replica or estado.primario or not replicas:
+            return None
+        estado.usou_replica = True
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Também é chamado por get_or_create e select_for_update, que leem
+        # para gravar: melhor prender ao primário sem necessidade do que ler
+        # da réplica o que acabou de ser gravado
+        estado = _estado.get()
+        if estado is not None:
+            estado.primario = estado.gravou = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bancos = {DEFAULT_DB_ALIAS, *settings.TAREFAS_REPLICAS}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+
+def fixar_primario():
+    """Manda ao primário as leituras seguintes da requisição (para quem lê para gravar)"""
+    estado = _estado.get()
+    if estado is not None:
+        estado.primario = True
+
+
+def leu_da_replica():
+    """Se a requisição atual já leu alguma coisa de uma réplica"""
+    estado = _estado.get()
+    return estado is not None and estado.usou_replica
+
+
+def _concluir_view(estado, resposta):
+    if estado.usou_replica:
+        del resposta['ETag']
+        del resposta['Last-Modified']
+    return resposta
+
+
+def ler_da_replica(view):
+    """
+    Leituras da view vão a uma réplica, se a requisição não estiver presa ao
+    primário. Deve ficar acima de @condition, para tirar os validadores.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            estado = _estado.get()
+            if estado is None:
+                return await view(request, *args, **kwargs)
+            estado.replica = True
+            try:
+                resposta = await view(request, *args, **kwargs)
+            finally:
+                estado.replica = False
+            return _concluir_view(estado, resposta)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            estado = _estado.get()
+            if estado is None:
+                return view(request, *args, **kwargs)
+            estado.replica = True
+            try:
+                resposta = view(request, *args, **kwargs)
+            finally:
+                estado.replica = False
+            return _concluir_view(estado, resposta)
+    return wrapper
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def iniciar(self, request):
+        return Estado(primario=request.method not in METODOS_SEGUROS or COOKIE in request.COOKIES)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        estado = self.iniciar(request)
+        token = _estado.set(estado)
+        try:
+            resposta = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self.concluir(resposta, estado)
+
+    async def __acall__(self, request):
+        estado = self.iniciar(request)
+        token = _estado.set(estado)
+        try:
+            resposta = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self.concluir(resposta, estado)
+
+    def concluir(self, resposta, estado):
+        if estado.gravou:
+            resposta.set_cookie(
+                COOKIE, '1', max_age=settings.TAREFAS_REPLICA_FIXAR, httponly=True, samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return resposta
@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidar_usuario
+from .categorias import invalidar_categorias
+from .estatisticas import estado_tarefa, registrar_alteracao
+from .lote import em_lote
+from .models import Categoria, EstatisticasCategoria, EstatisticasUsuario, SequenciaSync, Tarefa
+from .recorrencia import registrar_excecoes
+from .sync import registrar_exclusoes
+
+
+@receiver(post_save, sender=Tarefa)
+@receiver(post_delete, sender=Tarefa)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_cache_usuario(sender, instance, **kwargs):
+    """Qualquer alteração em tarefa ou categoria invalida o cache do dono"""
+    if not em_lote():
+        invalidar_usuario(instance.usuario_id)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_cache_categorias(sender, instance, **kwargs):
+    """O mapa de categorias do dono (ver tasks/categorias.py) é lido de novo"""
+    invalidar_categorias(instance.usuario_id)
+
+
+@receiver(post_delete, sender=Tarefa)
+def descontar_tarefa_excluida(sender, instance, origin=None, **kwargs):
+    """
+    Roda dentro da transação do Collector, tanto para ``tarefa.delete()``
+    quanto para ``queryset.delete()``. Exclusões em cascata a partir do usuário
+    são ignoradas: as estatísticas dele também estão sendo apagadas. Em
+    operações de ``tasks.lote`` os contadores são ajustados de uma vez só.
+    """
+    if em_lote() or isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    antes = instance._estado_original or estado_tarefa(instance)
+    registrar_alteracao(instance.usuario_id, antes, None)
+
+
+@receiver(post_delete, sender=Tarefa)
+@receiver(post_delete, sender=Categoria)
+def registrar_exclusao_sync(sender, instance, origin=None, **kwargs):
+    """Deixa o tombstone que avisa os clientes offline da exclusão"""
+    if em_lote() or isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    registrar_exclusoes(instance.usuario_id, sender._meta.model_name, [instance.pk])
+
+
+@receiver(post_delete, sender=Tarefa)
+def registrar_ocorrencia_excluida(sender, instance, origin=None, **kwargs):
+    """Uma ocorrência gravada que é excluída não volta a ser gerada (ver tasks/recorrencia.py)"""
+    if instance.serie_id is None or em_lote() or isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    registrar_excecoes([(instance.serie_id, instance.data_ocorrencia)])
+
+
+@receiver(post_save, sender=User)
+def criar_estatisticas_usuario(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        EstatisticasUsuario.objects.create(usuario=instance)
+        SequenciaSync.objects.create(usuario=instance)
+
+
+@receiver(post_save, sender=Categoria)
+def criar_estatisticas_categoria(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        EstatisticasCategoria.objects.create(categoria=instance, usuario_id=instance.usuario_id)
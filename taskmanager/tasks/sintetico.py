@@ -0,0 +1,137 @@
+"""
+Dados sintéticos para testes de carga e benchmarks.
+
+Usuários, categorias e tarefas são gravados com ``bulk_create`` em blocos, e
+os valores de cada bloco são sorteados de uma vez com numpy, seguindo
+distribuições parecidas com as de uso real:
+
+- prioridade: 30% baixa, 50% média, 20% alta;
+- vencimento: 70% no futuro, concentrado nas próximas duas semanas, e 30% no
+  passado, com cauda de alguns meses;
+- conclusão: 85% das tarefas vencidas e 20% das futuras estão concluídas;
+- categoria: poucas categorias concentram a maioria das tarefas (pesos
+  1/posição) e 15% das tarefas ficam sem categoria;
+- tempo estimado em valores "redondos" e notas em 25% das tarefas.
+
+Como no ``bulk_create`` não rodam save() nem signals, os contadores são
+recalculados e o cache invalidado ao fim de cada usuário. A data de criação
+e a de conclusão (nas concluídas) são a da geração, como nas tarefas
+importadas sem ``data_conclusao`` (ver tasks/transferencia.py).
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidar_usuario
+from .categorias import invalidar_categorias
+from .estatisticas import recalcular_usuarios
+from .models import Categoria, EstatisticasUsuario, SequenciaSync, Tarefa
+
+PRIORIDADES = [Tarefa.Prioridade.BAIXA, Tarefa.Prioridade.MEDIA, Tarefa.Prioridade.ALTA]
+PESOS_PRIORIDADE = [0.3, 0.5, 0.2]
+TEMPOS = [0, 15, 30, 45, 60, 90, 120, 240]
+PESOS_TEMPO = [0.25, 0.2, 0.2, 0.05, 0.15, 0.05, 0.07, 0.03]
+
+VERBOS = ['Revisar', 'Enviar', 'Pagar', 'Comprar', 'Ligar para', 'Agendar', 'Estudar', 'Organizar',
+          'Preparar', 'Responder', 'Atualizar', 'Limpar']
+OBJETOS = ['relatório', 'contas', 'mercado', 'médico', 'apresentação', 'e-mails', 'contrato', 'garagem',
+           'orçamento', 'prova', 'documentos', 'reunião', 'planilha', 'academia']
+NOTAS = ['Ver com a equipe antes.', 'Prioridade do mês.', 'Levar os comprovantes.',
+         'Lembrar de anexar o arquivo.', 'Confirmar horário por telefone.']
+CATEGORIAS = [('Trabalho', '#007bff'), ('Pessoal', '#28a745'), ('Estudos', '#ffc107'), ('Casa', '#6f42c1'),
+              ('Saúde', '#dc3545'), ('Finanças', '#20c997'), ('Compras', '#fd7e14'), ('Lazer', '#17a2b8')]
+
+
+def criar_usuarios(quantidade, prefixo='sintetico', senha=None):
+    """Cria os usuários (com estatísticas e sequência de sync) e retorna seus ids"""
+    # Um único hash para todos: calcular um por usuário custaria segundos
+    hash_senha = make_password(senha)
+    inicio = User.objects.filter(username__startswith=prefixo).count()
+    with transaction.atomic():
+        usuarios = User.objects.bulk_create([
+            User(username=f'{prefixo}{inicio + i}', password=hash_senha) for i in range(quantidade)
+        ])
+        EstatisticasUsuario.objects.bulk_create([EstatisticasUsuario(usuario=u) for u in usuarios])
+        SequenciaSync.objects.bulk_create([SequenciaSync(usuario=u, valor=1) for u in usuarios])
+    return [usuario.pk for usuario in usuarios]
+
+
+def criar_categorias(usuario_id, quantidade):
+    """Categorias do usuário, na ordem de popularidade; retorna os ids"""
+    categorias = []
+    for i in range(quantidade):
+        nome, cor = CATEGORIAS[i % len(CATEGORIAS)]
+        if i >= len(CATEGORIAS):
+            nome = f'{nome} {i // len(CATEGORIAS) + 1}'
+        categorias.append(Categoria(usuario_id=usuario_id, nome=nome, cor=cor, versao_sync=1))
+    ids = [categoria.pk for categoria in Categoria.objects.bulk_create(categorias)]
+    invalidar_categorias(usuario_id)
+    return ids
+
+
+def sortear_tarefas(rng, usuario_id, categoria_ids, quantidade, hoje):
+    """Lista de Tarefa (ainda não gravadas) com valores sorteados por ``rng``"""
+    prioridades = rng.choice(len(PRIORIDADES), size=quantidade, p=PESOS_PRIORIDADE)
+    futuras = rng.random(quantidade) < 0.7
+    dias = np.where(futuras, rng.gamma(2.0, 7.0, quantidade), -rng.gamma(2.0, 10.0, quantidade) - 1)
+    concluidas = rng.random(quantidade) < np.where(futuras, 0.2, 0.85)
+    tempos = rng.choice(TEMPOS, size=quantidade, p=PESOS_TEMPO)
+    verbos = rng.integers(len(VERBOS), size=quantidade)
+    objetos = rng.integers(len(OBJETOS), size=quantidade)
+    notas = np.where(rng.random(quantidade) < 0.25, rng.integers(len(NOTAS), size=quantidade), -1)
+    agora = timezone.now()
+
+    if categoria_ids:
+        pesos = 1 / np.arange(1, len(categoria_ids) + 1)
+        categorias = rng.choice(len(categoria_ids), size=quantidade, p=pesos / pesos.sum())
+        sem_categoria = rng.random(quantidade) < 0.15
+    else:
+        categorias = sem_categoria = np.zeros(quantidade, dtype=int)
+
+    return [
+        Tarefa(
+            usuario_id=usuario_id,
+            descricao=f'{VERBOS[verbos[i]]} {OBJETOS[objetos[i]]}',
+            prioridade=PRIORIDADES[prioridades[i]],
+            data_vencimento=hoje + timedelta(days=int(dias[i])),
+            concluida=bool(concluidas[i]),
+            data_conclusao=agora if concluidas[i] else None,
+            categoria_id=None if not categoria_ids or sem_categoria[i] else categoria_ids[categorias[i]],
+            notas=NOTAS[notas[i]] if notas[i] >= 0 else '',
+            tempo_estimado=int(tempos[i]),
+            versao_sync=1,
+        )
+        for i in range(quantidade)
+    ]
+
+
+def popular_usuario(usuario_id, categorias=5, tarefas=100, rng=None, lote=5000):
+    """Cria as categorias e as tarefas de um usuário existente"""
+    rng = rng if rng is not None else np.random.default_rng()
+    hoje = timezone.localdate()
+    categoria_ids = criar_categorias(usuario_id, categorias)
+    for inicio in range(0, tarefas, lote):
+        with transaction.atomic():
+            Tarefa.objects.bulk_create(
+                sortear_tarefas(rng, usuario_id, categoria_ids, min(lote, tarefas - inicio), hoje),
+                batch_size=1000,
+            )
+    recalcular_usuarios([usuario_id])
+    invalidar_usuario(usuario_id)
+
+
+def gerar(usuarios=10, categorias=5, tarefas=100, semente=None, lote=5000, prefixo='sintetico', senha=None):
+    """
+    Cria ``usuarios`` usuários com ``categorias`` categorias e ``tarefas``
+    tarefas cada. Com ``semente`` os dados são sempre os mesmos. Retorna os
+    ids dos usuários criados.
+    """
+    rng = np.random.default_rng(semente)
+    usuario_ids = criar_usuarios(usuarios, prefixo, senha)
+    for usuario_id in usuario_ids:
+        popular_usuario(usuario_id, categorias, tarefas, rng, lote)
+    return usuario_ids
@@ -0,0 +1,194 @@
+"""
+Sincronização incremental para clientes offline (PWA).
+
+Toda escrita em Tarefa ou Categoria recebe o próximo valor da sequência de
+alterações do usuário (``versao_sync``), e toda exclusão deixa um registro em
+Exclusao com o seu próprio valor. O cliente guarda o maior valor que já viu
+(o cursor) e, ao reconectar, pede só o que tem ``versao_sync`` maior que ele:
+o custo depende do número de alterações, não do tamanho da base.
+
+Protocolo (``tasks:sync``):
+
+GET ?cursor=N&limite=L
+    {"cursor": M, "tem_mais": bool, "reiniciar": bool,
+     "tarefas": [...], "categorias": [...],
+     "exclusoes": {"tarefas": [ids], "categorias": [ids]}}
+    Sem cursor devolve a base inteira (também paginada). Com ``reiniciar``
+    o cliente deve descartar os dados locais e sincronizar do zero. Ao receber
+    a exclusão de uma categoria o cliente limpa a categoria das suas tarefas.
+
+POST (JSON) {"alteracoes": [{"tipo": "tarefa"|"categoria", "id": 12 | null,
+                             "id_local": "tmp-1", "versao_base": 40,
+                             "campos": {...}, "excluir": false}, ...]}
+    Cada item é aplicado num savepoint próprio. Um item cujo registro mudou
+    no servidor depois de ``versao_base`` não é aplicado e volta como
+    "conflito", junto com a versão atual. Em criações, ``campos.categoria``
+    pode usar o ``id_local`` de uma categoria criada antes no mesmo lote.
+
+``prioridade`` é um inteiro (1 baixa, 2 média, 3 alta); no POST também é
+aceito o nome.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.forms.models import model_to_dict
+
+CAMPOS_TAREFA = [
+    'id', 'descricao', 'prioridade', 'data_vencimento', 'data_criacao', 'concluida',
+    'data_conclusao', 'categoria', 'notas', 'tempo_estimado', 'versao_sync',
+]
+CAMPOS_CATEGORIA = ['id', 'nome', 'cor', 'versao_sync']
+
+
+def proxima_sequencia(usuario_id):
+    """Reserva o próximo valor da sequência do usuário (trava a linha até o commit)"""
+    from .models import SequenciaSync
+
+    sequencias = SequenciaSync.objects.filter(usuario_id=usuario_id)
+    if not sequencias.update(valor=F('valor') + 1):
+        SequenciaSync.objects.get_or_create(usuario_id=usuario_id)
+        sequencias.update(valor=F('valor') + 1)
+    return sequencias.values_list('valor', flat=True).get()
+
+
+def marcar_versao(instancia, kwargs_save):
+    """Chamado pelo save() dos modelos, dentro da transação da escrita"""
+    instancia.versao_sync = proxima_sequencia(instancia.usuario_id)
+    if kwargs_save.get('update_fields') is not None:
+        kwargs_save['update_fields'] = {*kwargs_save['update_fields'], 'versao_sync'}
+
+
+def registrar_exclusoes(usuario_id, tipo, ids):
+    from .models import Exclusao
+
+    if not ids:
+        return
+    versao = proxima_sequencia(usuario_id)
+    Exclusao.objects.bulk_create([
+        Exclusao(usuario_id=usuario_id, tipo=tipo, objeto_id=objeto_id, versao_sync=versao)
+        for objeto_id in ids
+    ])
+
+
+def alteracoes_desde(usuario_id, cursor=None, limite=500):
+    from .models import Categoria, Exclusao, SequenciaSync, Tarefa
+
+    minimo = SequenciaSync.objects.filter(usuario_id=usuario_id).values_list('minimo', flat=True).first() or 0
+    reiniciar = cursor is not None and cursor < minimo
+    if cursor is None or reiniciar:
+        cursor = -1
+
+    fontes = {
+        'tarefas': Tarefa.objects.filter(usuario_id=usuario_id).values(*CAMPOS_TAREFA),
+        'categorias': Categoria.objects.filter(usuario_id=usuario_id).values(*CAMPOS_CATEGORIA),
+        'exclusoes': Exclusao.objects.filter(usuario_id=usuario_id).values('tipo', 'objeto_id', 'versao_sync'),
+    }
+    if cursor < 0:
+        # Base inteira: exclusões antigas não interessam
+        fontes['exclusoes'] = fontes['exclusoes'].none()
+
+    fontes = {nome: qs.order_by('versao_sync') for nome, qs in fontes.items()}
+    lidos = {nome: list(qs.filter(versao_sync__gt=cursor)[:limite + 1]) for nome, qs in fontes.items()}
+
+    # Primeira versão que ficou de fora em alguma fonte cortada pelo limite
+    cortes = [linhas[limite]['versao_sync'] for linhas in lidos.values() if len(linhas) > limite]
+    if not cortes:
+        tem_mais = False
+        novo_cursor = max([cursor, 0] + [linhas[-1]['versao_sync'] for linhas in lidos.values() if linhas])
+    else:
+        tem_mais = True
+        teto = min(cortes)
+        lidos = {nome: [linha for linha in linhas if linha['versao_sync'] < teto] for nome, linhas in lidos.items()}
+        novo_cursor = teto - 1
+        if not any(lidos.values()):
+            # Uma operação em lote grava várias linhas com a mesma versão, que
+            # não pode ser dividida entre páginas
+            lidos = {nome: list(qs.filter(versao_sync=teto)) for nome, qs in fontes.items()}
+            novo_cursor = teto
+
+    exclusoes = {'tarefas': [], 'categorias': []}
+    for linha in lidos['exclusoes']:
+        exclusoes[f"{linha['tipo']}s"].append(linha['objeto_id'])
+
+    return {
+        'cursor': novo_cursor,
+        'tem_mais': tem_mais,
+        'reiniciar': reiniciar,
+        'tarefas': lidos['tarefas'],
+        'categorias': lidos['categorias'],
+        'exclusoes': exclusoes,
+    }
+
+
+def _formulario(tipo, usuario, dados, instancia=None):
+    from .forms import CategoriaForm, TarefaForm
+
+    if tipo == 'tarefa':
+        return TarefaForm(dados, instance=instancia, user=usuario)
+    return CategoriaForm(dados, instance=instancia)
+
+
+def _aplicar(usuario, item, ids_locais):
+    from .models import Categoria, Exclusao, Tarefa
+
+    tipo = item.get('tipo')
+    modelo = {'tarefa': Tarefa, 'categoria': Categoria}.get(tipo)
+    if modelo is None:
+        return {'status': 'erro', 'erros': {'tipo': ['Tipo inválido.']}}
+
+    campos = dict(item.get('campos') or {})
+    if tipo == 'tarefa' and campos.get('categoria') in ids_locais:
+        campos['categoria'] = ids_locais[campos['categoria']]
+    if tipo == 'tarefa' and isinstance(campos.get('prioridade'), str):
+        # Clientes antigos mandam o nome ('alta', 'media', 'baixa')
+        campos['prioridade'] = Tarefa.Prioridade.de_texto(campos['prioridade']) or campos['prioridade']
+
+    instancia = None
+    if item.get('id') is not None:
+        instancia = modelo.objects.filter(usuario=usuario, id=item['id']).first()
+        if instancia is None:
+            if Exclusao.objects.filter(usuario=usuario, tipo=tipo, objeto_id=item['id']).exists():
+                return {'status': 'conflito', 'motivo': 'excluida'}
+            return {'status': 'erro', 'erros': {'id': ['Registro não encontrado.']}}
+        if instancia.versao_sync > int(item.get('versao_base') or 0):
+            campos_atual = CAMPOS_TAREFA if tipo == 'tarefa' else CAMPOS_CATEGORIA
+            atual = modelo.objects.filter(pk=instancia.pk).values(*campos_atual).get()
+            return {'status': 'conflito', 'motivo': 'alterada', 'atual': atual}
+        if item.get('excluir'):
+            instancia.delete()
+            return {'status': 'ok', 'excluida': True}
+
+    dados = {}
+    if instancia is not None:
+        form = _formulario(tipo, usuario, None, instancia)
+        dados = model_to_dict(instancia, fields=list(form.fields))
+    dados.update(campos)
+
+    form = _formulario(tipo, usuario, dados, instancia)
+    if not form.is_valid():
+        return {'status': 'erro', 'erros': form.errors.get_json_data()}
+    objeto = form.save(commit=False)
+    objeto.usuario = usuario
+    objeto.save()
+    if item.get('id_local') is not None:
+        ids_locais[item['id_local']] = objeto.id
+    return {'status': 'ok', 'id': objeto.id, 'versao_sync': objeto.versao_sync}
+
+
+def aplicar_alteracoes(usuario, alteracoes):
+    """Aplica um lote de edições offline; devolve um resultado por item"""
+    ids_locais = {}
+    resultados = []
+    with transaction.atomic():
+        for item in alteracoes:
+            if not isinstance(item, dict):
+                resultados.append({'status': 'erro', 'erros': {'__all__': ['Item inválido.']}})
+                continue
+            try:
+                with transaction.atomic():
+                    resultado = _aplicar(usuario, item, ids_locais)
+            except (TypeError, ValueError) as e:
+                resultado = {'status': 'erro', 'erros': {'__all__': [str(e)]}}
+            for chave in ('tipo', 'id', 'id_local'):
+                resultado.setdefault(chave, item.get(chave))
+            resultados.append(resultado)
+    return resultados
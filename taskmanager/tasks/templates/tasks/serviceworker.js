@@ -0,0 +1,55 @@
+// tasks/templates/tasks/serviceworker.js, servido em /sw.js pela view
+// service_worker. A lista vem do precache.json gerado pelo collectstatic
+// (ver tasks/estaticos.py): cada URL tem o hash do conteúdo no nome, então
+// uma URL que já está no cache nunca precisa ser baixada de novo.
+// A versão muda sempre que algum arquivo muda, e com ela o script, o que faz
+// o navegador instalar o worker de novo
+var versao = "{{ versao }}";
+var arquivos = {{ arquivos|safe }};
+var staticCacheName = "tarefando-estaticos";
+
+// Na instalação, baixa só o que ainda não está no cache
+self.addEventListener("install", (event) => {
+  this.skipWaiting();
+  event.waitUntil(
+    caches.open(staticCacheName).then((cache) =>
+      cache.keys().then((requests) => {
+        var guardados = new Set(requests.map((request) => new URL(request.url).pathname));
+        return cache.addAll(arquivos.filter((url) => !guardados.has(url)));
+      })
+    )
+  );
+});
+
+// Na ativação, remove os arquivos que saíram da lista e os caches antigos
+// (o "django-pwa-v<timestamp>" das versões anteriores do worker)
+self.addEventListener("activate", (event) => {
+  var atuais = new Set(arquivos);
+  event.waitUntil(
+    Promise.all([
+      caches.keys().then((cacheNames) =>
+        Promise.all(
+          cacheNames
+            .filter((cacheName) => cacheName.startsWith("django-pwa-"))
+            .map((cacheName) => caches.delete(cacheName))
+        )
+      ),
+      caches.open(staticCacheName).then((cache) =>
+        cache.keys().then((requests) =>
+          Promise.all(
+            requests
+              .filter((request) => !atuais.has(new URL(request.url).pathname))
+              .map((request) => cache.delete(request))
+          )
+        )
+      ),
+    ])
+  );
+});
+
+// Arquivos estáticos saem do cache; o resto vai à rede
+self.addEventListener("fetch", (event) => {
+  event.respondWith(
+    caches.match(event.request).then((response) => response || fetch(event.request))
+  );
+});
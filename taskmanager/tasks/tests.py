@@ -1,3 +1,2152 @@
-from django.test import TestCase
+import json
+import math
+import os
+import pstats
+import re
+import tempfile
+from io import StringIO
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.db.utils import load_backend
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+
+from .analise import calcular, carregar
+from .arquivo import arquivar, arquivaveis, restaurar
+from .busca import buscar_tarefas
+from .lote import alterar_em_lote, excluir_em_lote, marcar_conclusao, transferir_em_lote
+from .forms import LinhaImportacaoForm, TarefaForm
+from .models import (
+    Tarefa, Categoria, EstatisticasCategoria, EstatisticasUsuario, Exclusao, Notificacao, Recorrencia,
+    ResumoDiario, SequenciaSync, TarefaArquivada, Varredura,
+)
+from . import categorias, desempenho, perfil, recorrencia, urls as tasks_urls, views as tasks_views, views_async
+from .cache import etag_lista_tarefas, invalidar_usuario, versao_usuario
+from .estaticos import ler_precache
+from .estatisticas import divergencias, recalcular_usuarios
+from .inicializacao import ler_importtime
+from .notificacoes import enviar_notificacoes, varrer_atrasadas, vencidas
+from .orcamento import OrcamentoExcedido, orcamento_sql
+from .paginacao import KeysetPaginator, contagem_estimada
+from .recorrencia import criar_serie, encerrar_serie, normalizar_regra, tarefas_do_periodo
+from .replicas import COOKIE as COOKIE_PRIMARIO
+from .sintetico import gerar
+from .views import filtrar_tarefas
+
+
+# URLconf com as views assíncronas (ver ViewsAssincronasTests)
+urlpatterns = [
+    path('', include((tasks_urls.rotas(views_async), 'tasks'))),
+    path('metrics', tasks_views.metricas, name='metricas'),
+]
+
+# Como TAREFAS_PERFIL = True nas settings (ver tasks/perfil.py)
+PERFIL_LIGADO = {
+    'TAREFAS_PERFIL': True,
+    'TAREFAS_PERFIL_AMOSTRA': 0,
+    'MIDDLEWARE': ['tasks.perfil.PerfilMiddleware', *settings.MIDDLEWARE],
+    'TEMPLATES': [{**settings.TEMPLATES[0], 'BACKEND': 'tasks.perfil.DjangoTemplates'}],
+}
+
+
+def banco_medido(**ajustes):
+    """Conexão avulsa com o banco de teste, pelo backend de tasks.bancos"""
+    backend = load_backend({'sqlite': 'tasks.bancos.sqlite3', 'postgresql': 'tasks.bancos.postgresql'}[connection.vendor])
+    return backend.DatabaseWrapper({**connection.settings_dict, **ajustes}, alias='medido')
+
+
+def criar_tarefas(usuario, quantidade, **kwargs):
+    prioridades = [Tarefa.Prioridade.ALTA, Tarefa.Prioridade.MEDIA, Tarefa.Prioridade.BAIXA]
+    hoje = date.today()
+    tarefas = Tarefa.objects.bulk_create([
+        Tarefa(
+            usuario=usuario,
+            descricao=f'Tarefa {i}',
+            prioridade=prioridades[i % 3],
+            data_vencimento=hoje + timedelta(days=i % 4),
+            concluida=i % 5 == 0,
+            **kwargs,
+        )
+        for i in range(quantidade)
+    ])
+    # bulk_create não dispara signals nem atualiza os contadores
+    recalcular_usuarios([usuario.pk])
+    invalidar_usuario(usuario.pk)
+    return tarefas
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, ORCAMENTO_SQL_ESTRITO=True)
+class BaseTarefasTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('ana', password='senha-forte-123')
+        cls.outro = User.objects.create_user('bruno', password='senha-forte-123')
+
+    def setUp(self):
+        cache.clear()
+        categorias.limpar()
+        self.client.force_login(self.usuario)
+
+    def estatisticas_sql(self, metodo, nome, *args, data=None):
+        """Faz a requisição e retorna o que @orcamento_sql mediu na view"""
+        resposta = getattr(self.client, metodo)(reverse(f'tasks:{nome}', args=args), data)
+        self.assertLess(resposta.status_code, 400)
+        return resposta.wsgi_request.estatisticas_sql
+
+
+class KeysetPaginatorTests(BaseTarefasTestCase):
+    def test_percorre_todas_as_paginas_na_ordem_do_modelo(self):
+        criar_tarefas(self.usuario, 23)
+        queryset = Tarefa.objects.filter(usuario=self.usuario)
+        esperado = list(queryset.order_by(*Tarefa._meta.ordering, 'id'))
+
+        paginator = KeysetPaginator(queryset, por_pagina=5)
+        obtido, cursor = [], None
+        while True:
+            pagina = paginator.pagina(cursor)
+            obtido.extend(pagina)
+            if not pagina.tem_proxima:
+                break
+            cursor = pagina.proximo_cursor
+
+        self.assertEqual(obtido, esperado)
+
+    def test_cursor_invalido_volta_para_primeira_pagina(self):
+        criar_tarefas(self.usuario, 3)
+        pagina = KeysetPaginator(Tarefa.objects.all(), por_pagina=2).pagina('lixo')
+        self.assertTrue(pagina.eh_primeira)
+        self.assertEqual(len(pagina), 2)
+
+
+class ListaTarefasTests(BaseTarefasTestCase):
+    @override_settings(TAREFAS_POR_PAGINA=4)
+    def test_paginacao_respeita_filtro(self):
+        criar_tarefas(self.usuario, 12)
+        criar_tarefas(self.outro, 5)
+        url = reverse('tasks:lista_tarefas')
+
+        vistas, params = [], {'filtro': 'pendentes'}
+        while True:
+            resposta = self.client.get(url, params)
+            pagina = resposta.context['pagina']
+            vistas.extend(t.id for t in pagina)
+            if not pagina.tem_proxima:
+                break
+            params['cursor'] = pagina.proximo_cursor
+
+        pendentes = Tarefa.objects.filter(usuario=self.usuario, concluida=False)
+        self.assertEqual(sorted(vistas), sorted(pendentes.values_list('id', flat=True)))
+        self.assertEqual(resposta.context['total_tarefas'], pendentes.count())
+
+    @override_settings(TAREFAS_POR_PAGINA=4)
+    def test_proximas_em_ordem_de_urgencia(self):
+        criar_tarefas(self.usuario, 14)
+        url = reverse('tasks:lista_tarefas')
+
+        vistas, params = [], {'filtro': 'proximas'}
+        while True:
+            pagina = self.client.get(url, params).context['pagina']
+            vistas.extend(pagina)
+            if not pagina.tem_proxima:
+                break
+            params['cursor'] = pagina.proximo_cursor
+
+        self.assertTrue(all(not t.concluida for t in vistas))
+        chave = [(t.data_vencimento, -t.prioridade, t.id) for t in vistas]
+        self.assertEqual(chave, sorted(chave))
+        self.assertEqual(len(vistas), Tarefa.objects.filter(usuario=self.usuario, concluida=False).count())
+
+    def test_modo_stream_envia_todas_as_linhas(self):
+        criar_tarefas(self.usuario, 7)
+        resposta = self.client.get(reverse('tasks:lista_tarefas'), {'stream': '1', 'filtro': 'alta'})
+        self.assertTrue(resposta.streaming)
+        # Iterar a resposta, como o servidor WSGI
+        self.assertFalse(resposta.is_async)
+        html = b''.join(resposta).decode()
+
+        for tarefa in Tarefa.objects.filter(usuario=self.usuario):
+            url = reverse('tasks:editar_tarefa', args=[tarefa.id])
+            self.assertEqual(url in html, tarefa.prioridade == Tarefa.Prioridade.ALTA)
+        self.assertNotIn('tarefas:stream', html)
+
+
+class QueryPlanTests(BaseTarefasTestCase):
+    """
+    Roda EXPLAIN nas consultas das views e do admin e falha se aparecer
+    varredura completa da tabela ou ordenação fora do índice. No PostgreSQL
+    seq scan e sort são desabilitados para o planner, então eles só aparecem
+    no plano quando não existe índice que sirva.
+    """
+
+    VARREDURA = {
+        'sqlite': re.compile(r'\bSCAN tasks_tarefa\b(?! USING (COVERING )?INDEX)'),
+        'postgresql': re.compile(r'Seq Scan on tasks_tarefa'),
+    }
+    ORDENACAO = {
+        'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+        'postgresql': re.compile(r'\bSort\b'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.categoria = Categoria.objects.create(nome='Trabalho', usuario=cls.usuario)
+        criar_tarefas(cls.usuario, 30, categoria=cls.categoria)
+        criar_tarefas(cls.outro, 30)
+        cls.admin = User.objects.create_superuser('admin', password='senha-forte-123')
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor not in self.VARREDURA:
+            self.skipTest(f'EXPLAIN não verificado para {connection.vendor}')
+
+    def plano(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+        return queryset.explain()
+
+    def assertUsaIndice(self, queryset, ordenado=True):
+        plano = self.plano(queryset)
+        self.assertIsNone(self.VARREDURA[connection.vendor].search(plano), plano)
+        if ordenado:
+            self.assertIsNone(self.ORDENACAO[connection.vendor].search(plano), plano)
+
+    def changelist(self, **params):
+        request = RequestFactory().get('/admin/tasks/tarefa/', params)
+        request.user = self.admin
+        model_admin = site._registry[Tarefa]
+        return model_admin.get_changelist_instance(request)
+
+    def test_lista_tarefas_por_filtro(self):
+        tarefas = Tarefa.objects.filter(usuario=self.usuario)
+        for filtro in ['todas', 'pendentes', 'proximas', 'concluidas', 'alta', 'media', 'baixa']:
+            with self.subTest(filtro=filtro):
+                paginator = KeysetPaginator(filtrar_tarefas(tarefas, filtro), por_pagina=10)
+                primeira = paginator.queryset.order_by(*paginator.ordering)
+                self.assertUsaIndice(primeira[:11])
+                ultima = Tarefa.objects.filter(usuario=self.usuario).last()
+                valores = paginator.decodificar(paginator.codificar(ultima))
+                self.assertUsaIndice(primeira.filter(paginator.filtro_apos(valores))[:11])
+
+    def test_excluir_categoria(self):
+        queryset = Tarefa.objects.filter(categoria=self.categoria, usuario=self.usuario)
+        self.assertUsaIndice(queryset.order_by().values('id')[:1], ordenado=False)
+
+    def test_pendentes_por_vencimento(self):
+        queryset = Tarefa.objects.filter(
+            usuario=self.usuario, concluida=False, data_vencimento__lt=date.today(),
+        ).order_by('data_vencimento')
+        self.assertUsaIndice(queryset)
+
+    def test_proximas_usa_indice_parcial(self):
+        queryset = filtrar_tarefas(Tarefa.objects.filter(usuario=self.usuario), 'proximas')[:10]
+        self.assertUsaIndice(queryset)
+        if connection.vendor == 'sqlite':
+            self.assertIn('tarefa_proximas_idx', self.plano(queryset))
+
+    def test_varredura_de_atrasadas(self):
+        hoje = date.today()
+        queryset = vencidas(hoje - timedelta(days=3), hoje)
+        self.assertUsaIndice(queryset.values_list('id', 'usuario_id', 'data_vencimento')[:100])
+        if connection.vendor == 'sqlite':
+            self.assertIn('tarefa_pendente_vencimento_idx', self.plano(queryset))
+
+    def test_tarefas_do_periodo(self):
+        hoje = date.today()
+        queryset = Tarefa.objects.filter(
+            Q(data_vencimento__gte=hoje, data_vencimento__lt=hoje + timedelta(days=31))
+            | Q(data_ocorrencia__gte=hoje, data_ocorrencia__lt=hoje + timedelta(days=31)),
+            usuario=self.usuario,
+        )
+        self.assertUsaIndice(queryset, ordenado=False)
+
+    def test_arquivaveis(self):
+        # A consulta de cada lote de tasks.arquivo.arquivar
+        queryset = arquivaveis(timezone.now() - timedelta(days=90)).order_by().values_list('id', flat=True)[:1000]
+        self.assertUsaIndice(queryset, ordenado=False)
+        if connection.vendor == 'sqlite':
+            self.assertIn('tarefa_arquivavel_idx', self.plano(queryset))
+
+    def test_admin_changelist(self):
+        cl = self.changelist()
+        self.assertUsaIndice(cl.queryset[:cl.list_per_page])
+
+    def test_admin_filtro_por_vencimento(self):
+        hoje = date.today()
+        cl = self.changelist(data_vencimento__gte=hoje.isoformat(),
+                             data_vencimento__lt=(hoje + timedelta(days=7)).isoformat())
+        self.assertUsaIndice(cl.queryset[:cl.list_per_page], ordenado=False)
+
+    def test_busca(self):
+        # Ordenar por relevância exige sort, mas só sobre as linhas encontradas
+        tarefas = buscar_tarefas(Tarefa.objects.filter(usuario=self.usuario), 'tarefa', usuario_id=self.usuario.pk)
+        self.assertUsaIndice(tarefas[:11], ordenado=False)
+        cl = self.changelist(q='tarefa')
+        self.assertUsaIndice(cl.queryset[:cl.list_per_page], ordenado=False)
+
+
+class OrcamentoSQLTests(BaseTarefasTestCase):
+    def test_toda_view_autenticada_declara_orcamento(self):
+        for padrao in tasks_urls.urlpatterns:
+            view = padrao.callback
+            if padrao.name in ('registrar', 'login', 'logout'):
+                continue
+            with self.subTest(view=padrao.name):
+                self.assertTrue(hasattr(view, 'orcamento_sql'))
+
+    def test_orcamento_estourado_levanta_excecao(self):
+        @orcamento_sql(0)
+        def view(request):
+            return list(Tarefa.objects.all())
+
+        with self.assertRaises(OrcamentoExcedido):
+            view(RequestFactory().get('/'))
+
+    def test_consultas_nao_crescem_com_numero_de_tarefas(self):
+        categoria = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        tarefa = criar_tarefas(self.usuario, 1, categoria=categoria)[0]
+
+        def medir():
+            return {
+                'lista': self.estatisticas_sql('get', 'lista_tarefas').consultas,
+                'categorias': self.estatisticas_sql('get', 'lista_categorias').consultas,
+                'editar': self.estatisticas_sql('get', 'editar_tarefa', tarefa.id).consultas,
+            }
+
+        poucas = medir()
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_tarefas(self.usuario, 40, categoria=categoria)
+            for i in range(5):
+                Categoria.objects.create(nome=f'Extra {i}', usuario=self.usuario)
+        self.assertEqual(medir(), poucas)
+
+    def test_orcamento_do_sync_enviar(self):
+        # Pior caso por alteração: excluir a tarefa modelo (com categoria) de uma série
+        modelos = criar_tarefas(self.usuario, 3, categoria=Categoria.objects.create(nome='Casa', usuario=self.usuario))
+        for modelo in modelos:
+            serie = criar_serie(modelo, 'FREQ=DAILY')
+            Tarefa.objects.create(usuario=self.usuario, descricao='Ocorrência', data_vencimento=date(2030, 1, 2),
+                                  serie=serie, data_ocorrencia=date(2030, 1, 2))
+
+        def enviar(tarefas):
+            alteracoes = [
+                {'tipo': 'tarefa', 'id': tarefa.pk, 'versao_base': Tarefa.objects.get(pk=tarefa.pk).versao_sync,
+                 'excluir': True}
+                for tarefa in tarefas
+            ]
+            resposta = self.client.post(reverse('tasks:sync_enviar'), json.dumps({'alteracoes': alteracoes}),
+                                        content_type='application/json')
+            self.assertEqual({r['status'] for r in resposta.json()['resultados']}, {'ok'})
+            return resposta.wsgi_request.estatisticas_sql.consultas
+
+        uma = enviar(modelos[:1])
+        por_alteracao = enviar(modelos[1:]) - uma
+        self.assertEqual((uma - por_alteracao, por_alteracao), (2, 13))
+        self.assertEqual(
+            tasks_views.sync_enviar.orcamento_sql.max_consultas,
+            2 + por_alteracao * tasks_views.SYNC_MAXIMO_ALTERACOES,
+        )
+
+    def test_orcamento_da_importacao(self):
+        # Pior caso: cada linha com uma categoria nova
+        def importar(linhas):
+            Tarefa.objects.all().delete()
+            conteudo = 'descricao,data_vencimento,categoria\n' + ''.join(
+                f'T{i},2030-01-01,{linhas}-{i}\n' for i in range(linhas)
+            )
+            resposta = self.client.post(reverse('tasks:importar_tarefas'), {
+                'arquivo': SimpleUploadedFile('tarefas.csv', conteudo.encode()),
+            })
+            self.assertEqual(Tarefa.objects.count(), linhas)
+            return resposta.wsgi_request.estatisticas_sql.consultas
+
+        um_bloco = importar(tasks_views.IMPORTACAO_LOTE)
+        por_bloco = importar(2 * tasks_views.IMPORTACAO_LOTE) - um_bloco
+        blocos = math.ceil(tasks_views.IMPORTACAO_MAXIMO_LINHAS / tasks_views.IMPORTACAO_LOTE)
+        pior_caso = um_bloco + por_bloco * (blocos - 1)
+        orcamento = tasks_views.importar_tarefas.orcamento_sql.max_consultas
+        self.assertLessEqual(pior_caso, orcamento)
+        if connection.vendor == 'sqlite':
+            # O orçamento é o pior caso medido no SQLite, que divide os INSERTs
+            self.assertEqual(pior_caso, orcamento)
+
+    def test_acoes_dentro_do_orcamento(self):
+        categoria = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        tarefa = criar_tarefas(self.usuario, 3, categoria=categoria)[0]
+        dados = {
+            'descricao': 'Nova', 'prioridade': Tarefa.Prioridade.ALTA, 'data_vencimento': '2030-01-01',
+            'categoria': categoria.id, 'notas': '', 'tempo_estimado': 10,
+        }
+        self.estatisticas_sql('post', 'lista_tarefas', data=dados)
+        self.estatisticas_sql('post', 'editar_tarefa', tarefa.id, data=dados)
+        self.estatisticas_sql('get', 'marcar_concluida', tarefa.id)
+        self.estatisticas_sql('get', 'excluir_tarefa', tarefa.id)
+        self.estatisticas_sql('post', 'lista_categorias', data={'nome': 'Nova', 'cor': '#000000'})
+        vazia = Categoria.objects.create(nome='Vazia', usuario=self.usuario)
+        self.estatisticas_sql('get', 'excluir_categoria', vazia.id)
+
+
+class CacheListaTarefasTests(BaseTarefasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('tasks:lista_tarefas')
+        self.categoria = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        self.tarefa = criar_tarefas(self.usuario, 3, categoria=self.categoria)[0]
+
+    def test_segunda_leitura_nao_consulta_tarefas(self):
+        primeira = self.estatisticas_sql('get', 'lista_tarefas')
+        segunda = self.estatisticas_sql('get', 'lista_tarefas')
+        self.assertLess(segunda.consultas, primeira.consultas)
+        self.assertFalse(any('tasks_tarefa' in sql for sql in segunda.sql))
+
+    def test_alteracoes_invalidam_versao(self):
+        acoes = [
+            lambda: self.client.get(reverse('tasks:marcar_concluida', args=[self.tarefa.id])),
+            lambda: Categoria.objects.create(nome='Nova', usuario=self.usuario),
+            lambda: self.categoria.delete(),
+            lambda: Tarefa.objects.get(pk=self.tarefa.pk).delete(),
+        ]
+        for acao in acoes:
+            antes = versao_usuario(self.usuario.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                acao()
+            self.assertGreater(versao_usuario(self.usuario.pk), antes)
+
+    def test_alteracao_de_outro_usuario_nao_invalida(self):
+        antes = versao_usuario(self.usuario.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_tarefas(self.outro, 1)
+        self.assertEqual(versao_usuario(self.usuario.pk), antes)
+
+    def test_versao_muda_so_no_commit(self):
+        antes = versao_usuario(self.usuario.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Tarefa.objects.filter(pk=self.tarefa.pk).first().save()
+                # Uma leitura concorrente aqui ainda vê a linha antiga
+                self.assertEqual(versao_usuario(self.usuario.pk), antes)
+        self.assertGreater(versao_usuario(self.usuario.pk), antes)
+
+    def test_get_condicional(self):
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        etag = resposta['ETag']
+        self.assertTrue(resposta.has_header('Last-Modified'))
+
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+
+        # Outro filtro é outra representação
+        resposta = self.client.get(self.url, {'filtro': 'alta'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tarefa.objects.get(pk=self.tarefa.pk).save()
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+
+    def test_mensagem_pendente_desliga_etag(self):
+        request = RequestFactory().get(self.url)
+        request.user = self.usuario
+        request._messages = CookieStorage(request)
+        self.assertIsNotNone(etag_lista_tarefas(request))
+        messages.info(request, 'Olá')
+        self.assertIsNone(etag_lista_tarefas(request))
+
+    def test_lista_reflete_alteracao(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {
+                'descricao': 'Comprar pão', 'prioridade': Tarefa.Prioridade.ALTA, 'data_vencimento': '2030-01-01',
+                'categoria': self.categoria.id, 'notas': '', 'tempo_estimado': 5,
+            })
+        self.assertContains(self.client.get(self.url), 'Comprar pão')
+
+    def linhas_renderizadas(self, resposta):
+        return sum(template.name == 'tasks/_tarefa_linha.html' for template in resposta.templates)
+
+    def test_so_linhas_novas_ou_alteradas_sao_renderizadas(self):
+        self.assertEqual(self.linhas_renderizadas(self.client.get(self.url)), 3)
+        tarefa = Tarefa.objects.get(pk=self.tarefa.pk)
+        tarefa.descricao = 'Descrição alterada'
+        with self.captureOnCommitCallbacks(execute=True):
+            tarefa.save()
+            Tarefa.objects.create(usuario=self.usuario, descricao='Nova', data_vencimento=date(2030, 1, 1))
+
+        resposta = self.client.get(self.url)
+        self.assertEqual(self.linhas_renderizadas(resposta), 2)
+        self.assertContains(resposta, 'Descrição alterada')
+
+        # A linha mostra nome e cor da categoria
+        self.categoria.nome = 'Lar'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.save()
+        resposta = self.client.get(self.url)
+        self.assertEqual(self.linhas_renderizadas(resposta), 3)
+        self.assertNotContains(resposta, 'Casa')
+
+    def test_linhas_mudam_na_virada_do_dia(self):
+        Tarefa.objects.create(usuario=self.usuario, descricao='Vence hoje', data_vencimento=timezone.localdate())
+        self.assertNotContains(self.client.get(self.url), 'fa-clock me-1')
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=1)):
+            resposta = self.client.get(self.url)
+        self.assertEqual(self.linhas_renderizadas(resposta), 4)
+        self.assertContains(resposta, 'fa-clock me-1')
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': tempfile.mkdtemp(prefix='tarefando-cache-'),
+}})
+class CacheArquivoListaTarefasTests(CacheListaTarefasTests):
+    """Os mesmos testes com o backend de arquivo"""
+
+
+class EstatisticasTests(BaseTarefasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.casa = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        self.trabalho = Categoria.objects.create(nome='Trabalho', usuario=self.usuario)
+
+    def assertContadoresCorretos(self):
+        self.assertEqual(divergencias([self.usuario.pk, self.outro.pk]), [])
+        for categoria in (self.casa, self.trabalho):
+            tarefas = Tarefa.objects.filter(categoria=categoria)
+            estatisticas = EstatisticasCategoria.objects.get(categoria=categoria)
+            self.assertEqual(estatisticas.total, tarefas.count())
+            self.assertEqual(estatisticas.pendentes, tarefas.filter(concluida=False).count())
+
+    def test_contadores_acompanham_as_views(self):
+        dados = {
+            'descricao': 'Lavar louça', 'prioridade': Tarefa.Prioridade.ALTA, 'data_vencimento': '2030-01-01',
+            'categoria': self.casa.id, 'notas': '', 'tempo_estimado': 15,
+        }
+        self.client.post(reverse('tasks:lista_tarefas'), dados)
+        self.client.post(reverse('tasks:lista_tarefas'), dict(dados, prioridade=Tarefa.Prioridade.BAIXA, tempo_estimado=5))
+        self.assertContadoresCorretos()
+
+        tarefa = Tarefa.objects.get(prioridade=Tarefa.Prioridade.ALTA)
+        self.client.post(reverse('tasks:editar_tarefa', args=[tarefa.id]),
+                         dict(dados, categoria=self.trabalho.id, prioridade=Tarefa.Prioridade.MEDIA, tempo_estimado=40))
+        self.assertContadoresCorretos()
+
+        self.client.get(reverse('tasks:marcar_concluida', args=[tarefa.id]))
+        self.assertContadoresCorretos()
+        estatisticas = EstatisticasUsuario.objects.get(usuario=self.usuario)
+        self.assertEqual((estatisticas.total, estatisticas.concluidas, estatisticas.prioridade_media),
+                         (2, 1, 1))
+        self.assertEqual(estatisticas.tempo_estimado_pendente, 5)
+
+        self.client.get(reverse('tasks:excluir_tarefa', args=[tarefa.id]))
+        Tarefa.objects.filter(usuario=self.usuario).delete()
+        self.assertContadoresCorretos()
+
+    def test_instancia_com_campos_adiados(self):
+        criar_tarefas(self.usuario, 3)
+        tarefa = Tarefa.objects.only('id', 'descricao').filter(usuario=self.usuario).first()
+        tarefa.concluida = not tarefa.concluida
+        tarefa.save()
+        self.assertContadoresCorretos()
+
+    def test_comando_repara_contadores(self):
+        criar_tarefas(self.usuario, 10)
+        EstatisticasUsuario.objects.filter(usuario=self.usuario).update(total=999)
+        EstatisticasUsuario.objects.filter(usuario=self.outro).delete()
+
+        saida = StringIO()
+        call_command('recalcular_estatisticas', '--verificar', stdout=saida)
+        self.assertIn('usuário %d: total = 999, esperado 10' % self.usuario.pk, saida.getvalue())
+
+        call_command('recalcular_estatisticas', '--lote', '1', stdout=StringIO())
+        self.assertContadoresCorretos()
+
+
+class AcoesEmLoteTests(BaseTarefasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.categoria = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        self.minhas = criar_tarefas(self.usuario, 6)
+        self.alheias = criar_tarefas(self.outro, 3)
+
+    def comandos_em_tarefa(self, estatisticas):
+        """Comandos SQL que leem ou escrevem em tasks_tarefa, em ordem"""
+        alvo = re.compile(r'^(SELECT .*? FROM|UPDATE|DELETE FROM) "tasks_tarefa"')
+        return [sql.split()[0] for sql in estatisticas.sql if alvo.match(sql)]
+
+    def test_toggle_e_um_update_condicional_sem_leitura_previa(self):
+        tarefa = Tarefa.objects.filter(usuario=self.usuario, concluida=False).first()
+        estatisticas = self.estatisticas_sql('get', 'marcar_concluida', tarefa.id, data={'concluida': '1'})
+        self.assertEqual(self.comandos_em_tarefa(estatisticas)[0], 'UPDATE')
+        self.assertTrue(Tarefa.objects.get(pk=tarefa.pk).concluida)
+
+        # Clique repetido com o mesmo alvo não desfaz
+        self.estatisticas_sql('get', 'marcar_concluida', tarefa.id, data={'concluida': '1'})
+        self.assertTrue(Tarefa.objects.get(pk=tarefa.pk).concluida)
+
+        # Sem alvo, alterna
+        self.estatisticas_sql('get', 'marcar_concluida', tarefa.id)
+        self.assertFalse(Tarefa.objects.get(pk=tarefa.pk).concluida)
+        self.assertEqual(divergencias([self.usuario.pk]), [])
+
+    def test_toggle_de_tarefa_alheia_nao_altera(self):
+        alheia = self.alheias[1]
+        resposta = self.client.get(reverse('tasks:marcar_concluida', args=[alheia.id]), follow=True)
+        self.assertEqual(Tarefa.objects.get(pk=alheia.pk).concluida, alheia.concluida)
+        self.assertEqual([str(m) for m in resposta.context['messages']], ['❌ Tarefa não encontrada.'])
+
+    def test_acoes_sao_um_unico_comando_e_respeitam_o_dono(self):
+        ids = [t.id for t in self.minhas] + [t.id for t in self.alheias]
+        casos = [
+            ({'acao': 'concluir'}, 'UPDATE', lambda qs: qs.filter(concluida=False)),
+            ({'acao': 'reabrir'}, 'UPDATE', lambda qs: qs.filter(concluida=True)),
+            ({'acao': 'prioridade', 'prioridade': Tarefa.Prioridade.BAIXA}, 'UPDATE',
+             lambda qs: qs.exclude(prioridade=Tarefa.Prioridade.BAIXA)),
+            ({'acao': 'categoria', 'categoria': self.categoria.id}, 'UPDATE', lambda qs: qs.exclude(categoria=self.categoria)),
+            ({'acao': 'excluir'}, 'DELETE', lambda qs: qs.none()),
+        ]
+        for dados, comando, restantes in casos:
+            with self.subTest(acao=dados['acao']):
+                estatisticas = self.estatisticas_sql('post', 'acoes_em_lote', data=dict(dados, ids=ids))
+                self.assertEqual(self.comandos_em_tarefa(estatisticas).count(comando), 1)
+                self.assertFalse(restantes(Tarefa.objects.filter(usuario=self.usuario)).exists())
+                self.assertEqual(Tarefa.objects.filter(usuario=self.outro).count(), 3)
+                self.assertEqual(divergencias([self.usuario.pk, self.outro.pk]), [])
+
+        self.assertEqual(EstatisticasCategoria.objects.get(categoria=self.categoria).total, 0)
+
+    def test_excluir_nao_carrega_as_tarefas(self):
+        serie = criar_serie(self.minhas[0], 'FREQ=DAILY')
+        ocorrencia = Tarefa.objects.create(
+            usuario=self.usuario, descricao='Ocorrência', data_vencimento=date(2030, 1, 2), serie=serie,
+            data_ocorrencia=date(2030, 1, 2),
+        )
+        alvo = Tarefa.objects.filter(usuario=self.usuario).exclude(pk=ocorrencia.pk)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(excluir_em_lote(alvo), 6)
+        comandos = [c['sql'].split()[0] for c in consultas if 'SAVEPOINT' not in c['sql']]
+        # Estados agrupados, linhas, séries (UPDATE + DELETE), tarefas,
+        # contadores, sequência do sync, tombstones e exceções das séries
+        self.assertEqual(comandos, [
+            'SELECT', 'SELECT', 'UPDATE', 'DELETE', 'DELETE', 'UPDATE', 'UPDATE', 'SELECT', 'INSERT', 'SELECT',
+        ])
+        self.assertFalse(Recorrencia.objects.exists())
+        ocorrencia.refresh_from_db()
+        self.assertIsNone(ocorrencia.serie_id)
+        self.assertEqual(divergencias([self.usuario.pk]), [])
+
+    def test_categoria_de_outro_usuario_e_recusada(self):
+        alheia = Categoria.objects.create(nome='Alheia', usuario=self.outro)
+        self.client.post(reverse('tasks:acoes_em_lote'), {
+            'acao': 'categoria', 'categoria': alheia.id, 'ids': [self.minhas[0].id],
+        })
+        self.assertFalse(Tarefa.objects.filter(categoria=alheia).exists())
+
+    def test_contadores_de_varias_categorias_num_update_so(self):
+        categorias = [Categoria.objects.create(nome=f'C{i}', usuario=self.usuario) for i in range(5)]
+        for tarefa, categoria in zip(self.minhas, categorias + [None]):
+            Tarefa.objects.filter(pk=tarefa.pk).update(categoria=categoria, concluida=False)
+        recalcular_usuarios([self.usuario.pk])
+
+        estatisticas = self.estatisticas_sql('post', 'acoes_em_lote', data={
+            'acao': 'concluir', 'ids': [t.id for t in self.minhas],
+        })
+        atualizacoes = [sql for sql in estatisticas.sql if sql.startswith('UPDATE "tasks_estatisticascategoria"')]
+        self.assertEqual(len(atualizacoes), 1)
+        self.assertEqual(divergencias([self.usuario.pk]), [])
+
+
+class SyncTests(BaseTarefasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.categoria = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        self.tarefas = [
+            Tarefa.objects.create(usuario=self.usuario, descricao=f'T{i}', data_vencimento=date.today())
+            for i in range(4)
+        ]
+        Tarefa.objects.create(usuario=self.outro, descricao='Alheia', data_vencimento=date.today())
+
+    def puxar(self, **params):
+        resposta = self.client.get(reverse('tasks:sync'), params)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def enviar(self, alteracoes):
+        resposta = self.client.post(reverse('tasks:sync_enviar'), json.dumps({'alteracoes': alteracoes}),
+                                    content_type='application/json')
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()['resultados']
+
+    def test_carga_inicial_e_delta(self):
+        inicial = self.puxar()
+        self.assertEqual({t['id'] for t in inicial['tarefas']}, {t.id for t in self.tarefas})
+        self.assertEqual([c['id'] for c in inicial['categorias']], [self.categoria.id])
+        cursor = inicial['cursor']
+
+        self.assertEqual(self.puxar(cursor=cursor)['tarefas'], [])
+
+        editada, excluida_id = self.tarefas[0], self.tarefas[1].id
+        editada.notas = 'nova nota'
+        editada.save()
+        self.tarefas[1].delete()
+        self.client.get(reverse('tasks:marcar_concluida', args=[self.tarefas[2].id]))
+
+        delta = self.puxar(cursor=cursor)
+        self.assertEqual({t['id'] for t in delta['tarefas']}, {editada.id, self.tarefas[2].id})
+        self.assertEqual(delta['exclusoes']['tarefas'], [excluida_id])
+        self.assertFalse(delta['tem_mais'])
+        self.assertEqual(self.puxar(cursor=delta['cursor'])['tarefas'], [])
+
+    def test_paginacao_nao_divide_lote(self):
+        cursor = self.puxar()['cursor']
+        alterar_em_lote(Tarefa.objects.filter(usuario=self.usuario), concluida=True)
+        excluida_id = self.tarefas[0].id
+        self.tarefas[0].delete()
+
+        vistas, exclusoes = set(), []
+        while True:
+            pagina = self.puxar(cursor=cursor, limite=2)
+            vistas |= {t['id'] for t in pagina['tarefas']}
+            exclusoes += pagina['exclusoes']['tarefas']
+            cursor = pagina['cursor']
+            if not pagina['tem_mais']:
+                break
+        self.assertEqual(vistas, {t.id for t in self.tarefas[1:]})
+        self.assertEqual(exclusoes, [excluida_id])
+
+    def test_envio_offline_com_conflito(self):
+        base = self.puxar()['cursor']
+        self.tarefas[0].descricao = 'Editada no servidor'
+        self.tarefas[0].save()
+
+        resultados = self.enviar([
+            {'tipo': 'categoria', 'id_local': 'c1', 'campos': {'nome': 'Offline', 'cor': '#123456'}},
+            {'tipo': 'tarefa', 'id_local': 't1', 'campos': {
+                'descricao': 'Criada offline', 'prioridade': 'alta', 'data_vencimento': '2030-01-01',
+                'categoria': 'c1', 'tempo_estimado': 10,
+            }},
+            {'tipo': 'tarefa', 'id': self.tarefas[0].id, 'versao_base': base, 'campos': {'notas': 'x'}},
+            {'tipo': 'tarefa', 'id': self.tarefas[1].id, 'versao_base': base, 'campos': {'concluida': True}},
+            {'tipo': 'tarefa', 'id': self.tarefas[2].id, 'versao_base': base, 'excluir': True},
+        ])
+        self.assertEqual([r['status'] for r in resultados], ['ok', 'ok', 'conflito', 'ok', 'ok'])
+        self.assertEqual(resultados[2]['atual']['descricao'], 'Editada no servidor')
+
+        criada = Tarefa.objects.get(pk=resultados[1]['id'])
+        self.assertEqual(criada.categoria_id, resultados[0]['id'])
+        self.assertTrue(Tarefa.objects.get(pk=self.tarefas[1].pk).concluida)
+        self.assertFalse(Tarefa.objects.filter(pk=self.tarefas[2].pk).exists())
+        self.assertEqual(divergencias([self.usuario.pk]), [])
+
+        # Editar uma tarefa que foi excluída no servidor
+        resultado = self.enviar([{'tipo': 'tarefa', 'id': self.tarefas[2].id, 'versao_base': base,
+                                  'campos': {'notas': 'y'}}])[0]
+        self.assertEqual((resultado['status'], resultado['motivo']), ('conflito', 'excluida'))
+
+    def test_nao_acessa_dados_de_outro_usuario(self):
+        alheia = Tarefa.objects.get(usuario=self.outro)
+        self.assertNotIn(alheia.id, {t['id'] for t in self.puxar()['tarefas']})
+        resultado = self.enviar([{'tipo': 'tarefa', 'id': alheia.id, 'versao_base': 10**9,
+                                  'campos': {'descricao': 'invadida'}}])[0]
+        self.assertEqual(resultado['status'], 'erro')
+        self.assertEqual(Tarefa.objects.get(pk=alheia.pk).descricao, 'Alheia')
+
+    def test_limpeza_de_exclusoes_pede_reinicio(self):
+        cursor = self.puxar()['cursor']
+        self.tarefas[0].delete()
+        Exclusao.objects.update(data_exclusao=timezone.now() - timedelta(days=60))
+        call_command('limpar_exclusoes', '--dias', '30', stdout=StringIO())
+
+        self.assertFalse(Exclusao.objects.exists())
+        self.assertTrue(self.puxar(cursor=cursor)['reiniciar'])
+
+
+class BuscaTests(BaseTarefasTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.categoria = Categoria.objects.create(nome='Financeiro', usuario=cls.usuario)
+        hoje = date.today()
+        cls.relatorio = Tarefa.objects.create(
+            usuario=cls.usuario, descricao='Relatório trimestral', data_vencimento=hoje,
+        )
+        cls.reuniao = Tarefa.objects.create(
+            usuario=cls.usuario, descricao='Reunião com equipe', data_vencimento=hoje,
+            notas='Levar o relatório impresso', categoria=cls.categoria,
+        )
+        Tarefa.objects.create(usuario=cls.outro, descricao='Relatório do bruno', data_vencimento=hoje)
+
+    def buscar(self, texto, usuario=None):
+        usuario = usuario or self.usuario
+        tarefas = Tarefa.objects.filter(usuario=usuario)
+        return list(buscar_tarefas(tarefas, texto, usuario_id=usuario.pk))
+
+    def test_busca_ranqueada_por_descricao_notas_e_categoria(self):
+        # Sem acento e por prefixo; a descrição pesa mais que as notas
+        self.assertEqual(self.buscar('relat'), [self.relatorio, self.reuniao])
+        self.assertEqual(self.buscar('financeiro'), [self.reuniao])
+        self.assertEqual(self.buscar('reuniao equipe'), [self.reuniao])
+        self.assertEqual(self.buscar('"bruno'), [])
+        self.assertEqual(self.buscar('*) OR ('), [])
+
+    def test_indice_acompanha_as_escritas(self):
+        self.reuniao.descricao = 'Planejamento'
+        self.reuniao.notas = ''
+        self.reuniao.save()
+        self.assertEqual(self.buscar('reuniao'), [])
+        self.assertEqual(self.buscar('planejamento'), [self.reuniao])
+
+        self.categoria.nome = 'Contas'
+        self.categoria.save()
+        self.assertEqual(self.buscar('financeiro'), [])
+        self.assertEqual(self.buscar('contas'), [self.reuniao])
+
+        alterar_em_lote(Tarefa.objects.filter(id=self.relatorio.id), categoria_id=self.categoria.id)
+        self.assertCountEqual(self.buscar('contas'), [self.relatorio, self.reuniao])
+
+        excluir_em_lote(Tarefa.objects.filter(id=self.relatorio.id))
+        self.categoria.delete()
+        self.assertEqual(self.buscar('contas'), [])
+        self.assertEqual(self.buscar('relatorio'), [])
+
+    @override_settings(TAREFAS_POR_PAGINA=2)
+    def test_view_pagina_resultados(self):
+        criar_tarefas(self.usuario, 3, notas='relatório anexo')
+        url = reverse('tasks:lista_tarefas')
+
+        vistas, params = [], {'q': 'relatorio'}
+        while True:
+            resposta = self.client.get(url, params)
+            pagina = resposta.context['pagina']
+            vistas.extend(t.id for t in pagina)
+            if not pagina.tem_proxima:
+                break
+            params['cursor'] = pagina.proximo_cursor
+
+        self.assertEqual(vistas[0], self.relatorio.id)
+        esperado = [t.id for t in self.buscar('relatorio')]
+        self.assertEqual(vistas, esperado)
+        self.assertEqual(len(esperado), 5)
+        self.assertEqual(resposta.context['total_tarefas'], 5)
+
+    def test_admin_usa_o_indice(self):
+        admin = User.objects.create_superuser('admin', password='senha-forte-123')
+        request = RequestFactory().get('/admin/tasks/tarefa/', {'q': 'relatorio'})
+        request.user = admin
+        with CaptureQueriesContext(connection) as consultas:
+            cl = site._registry[Tarefa].get_changelist_instance(request)
+            self.assertEqual(cl.result_count, 3)
+        if connection.vendor == 'sqlite':
+            self.assertTrue(any('MATCH' in c['sql'] for c in consultas))
+            self.assertFalse(any('LIKE' in c['sql'] for c in consultas))
+
+
+# Sem o manifesto do collectstatic, que as páginas do admin exigiriam
+@override_settings(STORAGES={**settings.STORAGES, 'staticfiles': {
+    'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+}})
+class AdminTests(BaseTarefasTestCase):
+    URL = '/admin/tasks/tarefa/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser('admin', password='senha-forte-123')
+        cls.categoria = Categoria.objects.create(nome='Trabalho', usuario=cls.usuario)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def acao(self, acao, tarefas=None, **dados):
+        """Ação sobre ``tarefas``, ou sobre todas as do filtro (como "selecionar todas")"""
+        dados = {'action': acao, 'index': 0, **dados}
+        if tarefas is None:
+            # O admin também manda as marcadas na página
+            tarefas = Tarefa.objects.all()[:1]
+            dados['select_across'] = 1
+        dados['_selected_action'] = [t.pk for t in tarefas]
+        return self.client.post(self.URL, dados)
+
+    def test_pagina_por_cursor_com_consultas_constantes(self):
+        criar_tarefas(self.usuario, 7, categoria=self.categoria)
+        criar_tarefas(self.outro, 4)
+        esperado = list(Tarefa.objects.order_by('-prioridade', 'data_vencimento', 'id').values_list('id', flat=True))
+
+        vistas, contagens, url = [], [], self.URL
+        with mock.patch.object(site._registry[Tarefa], 'list_per_page', 3):
+            while url:
+                with CaptureQueriesContext(connection) as consultas:
+                    resposta = self.client.get(url)
+                cl = resposta.context['cl']
+                vistas.extend(t.pk for t in cl.result_list)
+                contagens.append(len(consultas))
+                self.assertEqual(cl.result_count, 11)
+                url = self.URL + cl.url_proxima() if cl.pagina.tem_proxima else None
+        self.assertEqual(vistas, esperado)
+        self.assertEqual(len(set(contagens)), 1, contagens)
+        # Sem uma consulta por linha para o usuário e a categoria
+        self.assertLess(contagens[0], 12)
+        self.assertContains(resposta, 'Primeira página')
+
+    def test_ordenar_por_coluna_volta_a_paginacao_por_numero(self):
+        criar_tarefas(self.usuario, 3)
+        resposta = self.client.get(self.URL, {'o': '1'})
+        self.assertFalse(resposta.context['cl'].por_cursor)
+        self.assertEqual(resposta.context['cl'].result_count, 3)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        criar_tarefas(self.usuario, 3)
+        resposta = self.client.get(self.URL, {'cursor': 'lixo', 'concluida__exact': '0'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.context['cl'].pagina.eh_primeira)
+
+    def test_acoes_em_lote_sao_um_comando(self):
+        tarefas = criar_tarefas(self.usuario, 6, categoria=self.categoria)
+        criar_tarefas(self.outro, 3)
+        with CaptureQueriesContext(connection) as consultas:
+            self.acao('concluir')
+        updates = [c['sql'] for c in consultas if c['sql'].startswith('UPDATE "tasks_tarefa"')]
+        self.assertEqual(len(updates), 2)  # um por dono
+        self.assertFalse(Tarefa.objects.filter(concluida=False).exists())
+        self.acao('reabrir', tarefas[:2])
+        self.assertEqual(Tarefa.objects.filter(concluida=False).count(), 2)
+        self.assertEqual(divergencias([self.usuario.pk, self.outro.pk]), [])
+
+    def test_transferir(self):
+        tarefas = criar_tarefas(self.usuario, 4, categoria=self.categoria)
+        serie = criar_serie(tarefas[0], 'FREQ=DAILY')
+
+        self.acao('transferir', tarefas[:3], usuario='bruno')
+        self.assertEqual(Tarefa.objects.filter(usuario=self.outro, categoria=None).count(), 3)
+        self.assertEqual(Recorrencia.objects.get(pk=serie.pk).usuario_id, self.outro.pk)
+        self.assertEqual(divergencias([self.usuario.pk, self.outro.pk]), [])
+        self.assertEqual(EstatisticasCategoria.objects.get(categoria=self.categoria).total, 1)
+        self.assertEqual(Exclusao.objects.filter(usuario=self.usuario).count(), 3)
+        # Usuário inexistente: nada muda
+        self.acao('transferir', tarefas, usuario='ninguem')
+        self.assertEqual(Tarefa.objects.filter(usuario=self.usuario).count(), 1)
+        self.assertEqual(transferir_em_lote(Tarefa.objects.filter(usuario=self.outro), self.outro.pk), 0)
+
+    def test_excluir_pede_confirmacao(self):
+        criar_tarefas(self.usuario, 5)
+        resposta = self.acao('excluir')
+        self.assertContains(resposta, '5 tarefa(s) serão excluídas')
+        self.assertEqual(Tarefa.objects.count(), 5)
+
+        self.acao('excluir', post='sim')
+        self.assertFalse(Tarefa.objects.exists())
+        self.assertEqual(EstatisticasUsuario.objects.get(usuario=self.usuario).total, 0)
+
+    def test_autocomplete_e_categorias(self):
+        resposta = self.client.get('/admin/autocomplete/', {
+            'app_label': 'tasks', 'model_name': 'tarefa', 'field_name': 'categoria', 'term': 'trab',
+        })
+        self.assertEqual([item['text'] for item in resposta.json()['results']], ['Trabalho'])
+        resposta = self.client.get('/admin/tasks/categoria/')
+        self.assertContains(resposta, 'Trabalho')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Estimativa do planner só no PostgreSQL')
+    def test_contagem_estimada(self):
+        criar_tarefas(self.usuario, 50)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE tasks_tarefa')
+        self.assertEqual(contagem_estimada(Tarefa.objects.all()), (50, False))
+        total, estimado = contagem_estimada(Tarefa.objects.all(), exata_ate=0)
+        self.assertTrue(estimado)
+        self.assertGreater(total, 0)
+
+
+class CategoriasCacheTests(BaseTarefasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.casa = Categoria.objects.create(nome='Casa', cor='#123456', usuario=self.usuario)
+        criar_tarefas(self.usuario, 3, categoria=self.casa)
+
+    def consultas_de_categoria(self, funcao):
+        with CaptureQueriesContext(connection) as consultas:
+            funcao()
+        return [c['sql'] for c in consultas if 'tasks_categoria"' in c['sql'] and 'estatisticas' not in c['sql']]
+
+    def opcoes(self):
+        return [nome for _, nome in TarefaForm(user=self.usuario).fields['categoria'].choices]
+
+    def test_formularios_e_lista_leem_do_cache(self):
+        self.client.get(reverse('tasks:lista_tarefas'))
+        cache.clear()
+        resposta = None
+
+        def lista():
+            nonlocal resposta
+            resposta = self.client.get(reverse('tasks:lista_tarefas'))
+
+        # Página fora do cache: linhas, formulário e ações em lote sem consultar categorias
+        self.assertEqual(self.consultas_de_categoria(lista), [])
+        self.assertContains(resposta, 'background-color: #123456', count=3)
+        self.assertContains(resposta, f'<option value="{self.casa.pk}">Casa</option>', count=2)
+        self.assertEqual(self.consultas_de_categoria(
+            lambda: self.client.get(reverse('tasks:editar_tarefa', args=[Tarefa.objects.first().pk]))
+        ), [])
+        self.assertEqual(self.consultas_de_categoria(lambda: self.client.get(reverse('tasks:lista_categorias'))), [])
+
+    def test_invalidado_ao_criar_alterar_e_excluir(self):
+        self.assertEqual(self.opcoes(), ['Selecione uma categoria', 'Casa'])
+        self.client.post(reverse('tasks:lista_categorias'), {'nome': 'Mercado', 'cor': '#28a745'})
+        self.assertEqual(self.opcoes(), ['Selecione uma categoria', 'Casa', 'Mercado'])
+
+        self.casa.nome = 'Lar'
+        self.casa.save()
+        self.assertEqual(self.opcoes(), ['Selecione uma categoria', 'Lar', 'Mercado'])
+        self.assertContains(self.client.get(reverse('tasks:lista_tarefas')), 'Lar', count=5)
+
+        mercado = Categoria.objects.get(nome='Mercado')
+        self.client.get(reverse('tasks:excluir_categoria', args=[mercado.pk]))
+        self.assertFalse(Categoria.objects.filter(pk=mercado.pk).exists())
+        self.assertEqual(self.opcoes(), ['Selecione uma categoria', 'Lar'])
+        self.assertEqual(self.client.get(reverse('tasks:excluir_categoria', args=[mercado.pk])).status_code, 404)
+
+    def test_categoria_de_outro_usuario(self):
+        alheia = Categoria.objects.create(nome='Alheia', usuario=self.outro)
+        self.assertNotIn('Alheia', self.opcoes())
+        self.assertEqual(self.client.get(reverse('tasks:excluir_categoria', args=[alheia.pk])).status_code, 404)
+        self.assertTrue(Categoria.objects.filter(pk=alheia.pk).exists())
+        # O formulário continua validando pelo banco
+        form = TarefaForm({
+            'descricao': 'X', 'prioridade': 2, 'data_vencimento': '2030-01-01', 'categoria': alheia.pk,
+            'tempo_estimado': 0,
+        }, user=self.usuario)
+        self.assertIn('categoria', form.errors)
+
+    def test_excluir_confere_no_banco(self):
+        pk = Categoria.objects.create(nome='Vazia', usuario=self.usuario).pk
+        mapa = categorias.categorias_do_usuario(self.usuario.pk)
+        Categoria.objects.filter(pk=pk).delete()
+        # Outro processo ainda tem o mapa antigo no LRU
+        categorias._lru().set(self.usuario.pk, mapa)
+        self.assertEqual(self.client.get(reverse('tasks:excluir_categoria', args=[pk])).status_code, 404)
+
+    def test_lista_de_categorias_usa_os_contadores(self):
+        resposta = self.client.get(reverse('tasks:lista_categorias'))
+        self.assertEqual([(c.nome, c.tarefas_count) for c in resposta.context['categorias']], [('Casa', 3)])
+
+    def test_categoria_criada_sem_signal_e_relida(self):
+        categorias.categorias_do_usuario(self.usuario.pk)
+        nova = Categoria.objects.bulk_create([Categoria(nome='Nova', cor='#abcdef', usuario=self.usuario)])[0]
+        Tarefa.objects.create(usuario=self.usuario, descricao='Com a nova', data_vencimento='2030-01-01', categoria=nova)
+        self.assertContains(self.client.get(reverse('tasks:lista_tarefas')), 'background-color: #abcdef')
+
+    def test_categoria_fora_do_mapa_nao_e_consultada(self):
+        # Excluída entre a leitura das tarefas e a do mapa: a linha sai sem
+        # categoria, sem carregar a FK (o que quebraria a view assíncrona)
+        with mock.patch.object(categorias, 'categorias_do_usuario', return_value={}), \
+                mock.patch.object(categorias, 'acategorias_do_usuario', mock.AsyncMock(return_value={})):
+            resposta = None
+
+            def lista():
+                nonlocal resposta
+                resposta = self.client.get(reverse('tasks:lista_tarefas'))
+
+            carregou_fk = [sql for sql in self.consultas_de_categoria(lista) if '"tasks_categoria"."id" =' in sql]
+            self.assertEqual(carregou_fk, [])
+            self.assertEqual(resposta.status_code, 200)
+            self.assertNotContains(resposta, '#123456')
+            resposta = self.client.get(reverse('tasks:lista_tarefas'), {'stream': '1'})
+            self.assertNotIn('#123456', b''.join(resposta).decode())
+
+    def test_importacao_invalida_o_cache(self):
+        self.assertEqual(self.opcoes(), ['Selecione uma categoria', 'Casa'])
+        arquivo = SimpleUploadedFile('t.csv', b'descricao,prioridade,data_vencimento,categoria\nX,alta,2030-01-01,Mercado\n')
+        self.client.post(reverse('tasks:importar_tarefas'), {'arquivo': arquivo})
+        self.assertEqual(self.opcoes(), ['Selecione uma categoria', 'Casa', 'Mercado'])
+
+    @override_settings(TAREFAS_CATEGORIAS_CACHE_ALIAS='default')
+    def test_cache_compartilhado(self):
+        categorias.categorias_do_usuario(self.usuario.pk)
+        # Outro processo: LRU vazio, cache compartilhado preenchido
+        categorias.limpar()
+        self.assertEqual(self.consultas_de_categoria(lambda: categorias.categorias_do_usuario(self.usuario.pk)), [])
+        self.casa.cor = '#654321'
+        self.casa.save()
+        categorias.limpar()
+        self.assertEqual(categorias.categorias_do_usuario(self.usuario.pk)[self.casa.pk].cor, '#654321')
+
+    def test_lru(self):
+        lru = categorias.LRU(maximo=2, ttl=10)
+        with mock.patch('tasks.categorias.time.monotonic', return_value=100):
+            lru.set(1, 'a')
+            lru.set(2, 'b')
+            self.assertEqual(lru.get(1), 'a')
+            lru.set(3, 'c')
+            # O menos usado recentemente sai
+            self.assertIsNone(lru.get(2))
+            self.assertEqual((lru.get(1), lru.get(3)), ('a', 'c'))
+        with mock.patch('tasks.categorias.time.monotonic', return_value=110):
+            self.assertIsNone(lru.get(1))
+
+
+class TransferenciaTests(BaseTarefasTestCase):
+    def importar(self, nome, conteudo):
+        arquivo = SimpleUploadedFile(nome, conteudo.encode())
+        return self.client.post(reverse('tasks:importar_tarefas'), {'arquivo': arquivo}, follow=True)
+
+    def test_exporta_e_importa_csv(self):
+        categoria = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        criar_tarefas(self.usuario, 5, categoria=categoria, notas='linha 1\nlinha 2, com vírgula')
+        Tarefa.objects.filter(concluida=True).update(data_conclusao=timezone.now() - timedelta(days=3))
+        criar_tarefas(self.outro, 2)
+
+        resposta = self.client.get(reverse('tasks:exportar_tarefas'), {'formato': 'csv'})
+        self.assertTrue(resposta.streaming)
+        self.assertIn('attachment', resposta['Content-Disposition'])
+        conteudo = b''.join(resposta.streaming_content).decode()
+
+        self.client.force_login(self.outro)
+        self.importar('tarefas.csv', conteudo)
+
+        campos = [
+            'descricao', 'prioridade', 'data_vencimento', 'concluida', 'data_conclusao', 'categoria__nome', 'notas',
+            'tempo_estimado',
+        ]
+        origem = Tarefa.objects.filter(usuario=self.usuario).order_by('id').values_list(*campos)
+        destino = Tarefa.objects.filter(usuario=self.outro, categoria__isnull=False).order_by('id').values_list(*campos)
+        self.assertEqual(list(destino), list(origem))
+        self.assertEqual(Categoria.objects.filter(usuario=self.outro, nome='Casa').count(), 1)
+        self.assertEqual(divergencias([self.outro.pk]), [])
+        self.assertFalse(Tarefa.objects.filter(usuario=self.outro, categoria__isnull=False, versao_sync=0).exists())
+
+    def test_importa_jsonl_em_blocos_pelo_comando(self):
+        Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        linhas = [
+            json.dumps({'descricao': f'Item {i}', 'data_vencimento': '2030-01-0%d' % (i % 9 + 1),
+                        'categoria': ['Casa', 'Rua', ''][i % 3], 'concluida': i % 2 == 0})
+            for i in range(30)
+        ]
+        linhas[4] = '{"descricao": "sem data"}'
+        linhas[7] = 'isto não é json'
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as arquivo:
+            arquivo.write('\n'.join(linhas))
+
+        saida, erros = StringIO(), StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('importar_tarefas', arquivo.name, usuario=self.usuario.pk, lote=10,
+                         stdout=saida, stderr=erros)
+
+        self.assertIn('28 tarefa(s) importada(s), 2 linha(s) inválida(s)', saida.getvalue())
+        self.assertIn('linhas/s', saida.getvalue())
+        self.assertIn('linha 5: data_vencimento', erros.getvalue())
+        self.assertIn('linha 8', erros.getvalue())
+        # Consultas por bloco, não por linha
+        self.assertLess(len(consultas), 30)
+        self.assertEqual(Categoria.objects.filter(usuario=self.usuario).count(), 2)
+        self.assertEqual(divergencias([self.usuario.pk]), [])
+
+    def test_concluidas_recebem_data_de_conclusao(self):
+        conteudo = (
+            'descricao,data_vencimento,concluida,data_conclusao\n'
+            'A,2030-01-01,1,2029-12-31 10:00:00+00:00\n'
+            'B,2030-01-01,1,\n'
+            'C,2030-01-01,0,2029-12-31 10:00:00+00:00\n'
+        )
+        antes = timezone.now()
+        self.importar('tarefas.csv', conteudo)
+        datas = dict(Tarefa.objects.filter(usuario=self.usuario).values_list('descricao', 'data_conclusao'))
+        self.assertEqual(datas['A'], datetime(2029, 12, 31, 10, tzinfo=dt_timezone.utc))
+        self.assertGreaterEqual(datas['B'], antes)
+        self.assertIsNone(datas['C'])
+
+    def test_jsonl_com_numero_no_lugar_de_data(self):
+        conteudo = '\n'.join([
+            '{"descricao": "A", "data_vencimento": 20240101}',
+            '{"descricao": "B", "data_vencimento": "2030-01-01", "concluida": true, "data_conclusao": 1700000000}',
+            '{"descricao": "C", "data_vencimento": ["2030-01-01"]}',
+            '{"descricao": "D", "data_vencimento": "2030-01-01"}',
+        ])
+        resposta = self.importar('tarefas.jsonl', conteudo)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(list(Tarefa.objects.filter(usuario=self.usuario).values_list('descricao', flat=True)), ['D'])
+
+        limpos, erros = LinhaImportacaoForm.validar({'descricao': 'x', 'data_vencimento': 20240101})
+        self.assertEqual(list(erros), ['data_vencimento'])
+
+    def test_prioridade_pelo_nome_ou_numero(self):
+        conteudo = 'descricao,prioridade,data_vencimento\nA,alta,2030-01-01\nB,1,2030-01-01\nC,,2030-01-01\nD,urgente,2030-01-01\n'
+        self.importar('tarefas.csv', conteudo)
+        self.assertEqual(
+            dict(Tarefa.objects.filter(usuario=self.usuario).values_list('descricao', 'prioridade')),
+            {'A': Tarefa.Prioridade.ALTA, 'B': Tarefa.Prioridade.BAIXA, 'C': Tarefa.Prioridade.MEDIA},
+        )
+        exportado = b''.join(self.client.get(reverse('tasks:exportar_tarefas')).streaming_content).decode()
+        self.assertIn('A,alta,', exportado)
+
+    def test_arquivo_grande_demais_nao_importa_nada(self):
+        conteudo = 'descricao,data_vencimento\n' + ''.join(f'T{i},2030-01-01\n' for i in range(5))
+        with mock.patch.object(tasks_views, 'IMPORTACAO_MAXIMO_LINHAS', 3):
+            resposta = self.importar('tarefas.csv', conteudo)
+        self.assertIn('importar_tarefas', [str(m) for m in resposta.context['messages']][0])
+        self.assertFalse(Tarefa.objects.exists())
+
+
+class AnaliseTests(BaseTarefasTestCase):
+    DIA = date(2030, 3, 10)
+
+    def momento(self, dias, hora=12):
+        """Instante relativo a DIA, no fuso atual"""
+        return timezone.make_aware(datetime.combine(self.DIA + timedelta(days=dias), time(hora)))
+
+    def criar(self, usuario, criada, vence, concluida=None, **kwargs):
+        tarefa = Tarefa.objects.create(
+            usuario=usuario, descricao='T', data_vencimento=self.DIA + timedelta(days=vence), **kwargs,
+        )
+        Tarefa.objects.filter(pk=tarefa.pk).update(
+            data_criacao=self.momento(criada),
+            concluida=concluida is not None,
+            data_conclusao=self.momento(concluida) if concluida is not None else None,
+        )
+        return tarefa
+
+    def test_metricas_por_usuario_e_categoria(self):
+        casa = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        self.criar(self.usuario, -5, -1, concluida=-2, tempo_estimado=60, categoria=casa)  # no prazo
+        self.criar(self.usuario, -5, -3, concluida=0, tempo_estimado=120, categoria=casa)   # no dia, atrasada
+        self.criar(self.usuario, -2, -1)                                                     # pendente atrasada
+        self.criar(self.usuario, 0, 2, categoria=casa)                                       # criada no dia
+        self.criar(self.usuario, 1, 5)                                                       # ainda não existia
+        self.criar(self.outro, -1, 0, concluida=0)
+        importada = self.criar(self.usuario, -4, 1)
+        Tarefa.objects.filter(pk=importada.pk).update(concluida=True, data_conclusao=None)
+
+        por_usuario, por_categoria = calcular(carregar(Tarefa.objects.all()), self.DIA)
+
+        ana = por_usuario.loc[self.usuario.pk]
+        self.assertEqual(
+            {campo: int(ana[campo]) for campo in ResumoDiario.METRICAS},
+            {
+                'total': 5, 'concluidas': 3, 'pendentes': 2, 'atrasadas': 1,
+                'criadas_no_dia': 1, 'concluidas_no_dia': 1,
+                'concluidas_medidas': 2, 'concluidas_no_prazo': 1,
+                'tempo_estimado_medido': 180, 'tempo_decorrido_medido': (3 + 5) * 24 * 60,
+            },
+        )
+        self.assertEqual(int(por_usuario.loc[self.outro.pk, 'concluidas_no_prazo']), 1)
+        self.assertEqual(int(por_categoria.loc[(casa.pk, self.usuario.pk), 'total']), 3)
+        self.assertEqual(len(por_categoria), 1)
+
+    def test_estado_e_o_do_fim_do_dia(self):
+        self.criar(self.usuario, -5, -1, concluida=1)   # concluída depois do dia, atrasada
+        self.criar(self.usuario, -5, 3, concluida=2)    # concluída depois do dia, no prazo
+        ontem, = calcular(carregar(Tarefa.objects.all()), self.DIA - timedelta(days=1))[0].to_dict('records')
+        no_dia, = calcular(carregar(Tarefa.objects.all()), self.DIA)[0].to_dict('records')
+        depois, = calcular(carregar(Tarefa.objects.all()), self.DIA + timedelta(days=2))[0].to_dict('records')
+
+        self.assertEqual((ontem['pendentes'], ontem['atrasadas'], ontem['concluidas']), (2, 0, 0))
+        self.assertEqual((no_dia['pendentes'], no_dia['atrasadas'], no_dia['concluidas']), (2, 1, 0))
+        self.assertEqual((no_dia['concluidas_medidas'], no_dia['concluidas_no_dia']), (0, 0))
+        self.assertEqual((depois['pendentes'], depois['concluidas'], depois['concluidas_no_dia']), (0, 2, 1))
+
+    def test_data_conclusao_acompanha_as_escritas(self):
+        tarefa = Tarefa.objects.create(usuario=self.usuario, descricao='T', data_vencimento=self.DIA)
+        self.assertIsNone(tarefa.data_conclusao)
+        tarefa.concluida = True
+        tarefa.save(update_fields=['concluida'])
+        tarefa.refresh_from_db()
+        self.assertIsNotNone(tarefa.data_conclusao)
+
+        marcar_conclusao(self.usuario, tarefa.pk)
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.concluida, tarefa.data_conclusao), (False, None))
+        marcar_conclusao(self.usuario, tarefa.pk)
+        tarefa.refresh_from_db()
+        self.assertIsNotNone(tarefa.data_conclusao)
+
+        alterar_em_lote(Tarefa.objects.filter(pk=tarefa.pk), concluida=False)
+        tarefa.refresh_from_db()
+        self.assertIsNone(tarefa.data_conclusao)
+
+    def test_comando_grava_resumos_e_relatorio_le_deles(self):
+        casa = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        Tarefa.objects.create(usuario=self.usuario, descricao='T', data_vencimento=self.DIA,
+                              concluida=True, categoria=casa)
+        hoje = timezone.localdate()
+        for _ in range(2):  # idempotente
+            call_command('gerar_resumos_diarios', stdout=StringIO())  # ontem
+            call_command('gerar_resumos_diarios', data=hoje.isoformat(), stdout=StringIO())
+
+        self.assertEqual(ResumoDiario.objects.filter(usuario=self.outro).count(), 2)
+        # Ontem a tarefa (e a categoria) ainda não existia
+        self.assertEqual(ResumoDiario.objects.filter(usuario=self.usuario, categoria=casa).count(), 1)
+
+        dados = self.client.get(reverse('tasks:relatorio'), {'dias': 7}).json()
+        ontem = hoje - timedelta(days=1)
+        self.assertEqual([linha['data'] for linha in dados['serie']], [ontem.isoformat(), hoje.isoformat()])
+        self.assertEqual(dados['serie'][-1]['taxa_conclusao'], 1.0)
+        self.assertEqual(dados['categorias'][0]['nome'], 'Casa')
+
+
+class AtrasadasTests(BaseTarefasTestCase):
+    HOJE = date(2030, 5, 10)
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.usuario.pk).update(email='ana@example.com')
+        User.objects.filter(pk=self.outro.pk).update(email='bruno@example.com')
+
+    def criar(self, usuario, dias, **kwargs):
+        return Tarefa.objects.create(
+            usuario=usuario, descricao=f'Vence em {dias}', data_vencimento=self.HOJE + timedelta(days=dias), **kwargs,
+        )
+
+    def test_varre_so_os_dias_que_viraram(self):
+        antiga = self.criar(self.usuario, -5)
+        ontem = [self.criar(self.usuario, -1), self.criar(self.usuario, -1), self.criar(self.outro, -1)]
+        self.criar(self.usuario, -1, concluida=True)
+        hoje = self.criar(self.usuario, 0)
+
+        # Primeira execução: só o que venceu ontem
+        self.assertEqual(varrer_atrasadas(hoje=self.HOJE), (3, 2))
+        self.assertCountEqual(Tarefa.objects.exclude(atraso_avisado=None), ontem)
+        self.assertIsNone(Tarefa.objects.get(pk=antiga.pk).atraso_avisado)
+        self.assertCountEqual(
+            Notificacao.objects.values_list('usuario_id', 'tarefas'),
+            [(self.usuario.pk, [ontem[0].pk, ontem[1].pk]), (self.outro.pk, [ontem[2].pk])],
+        )
+
+        # De novo no mesmo dia: nada a ler além do estado da varredura
+        with self.assertNumQueries(2):
+            self.assertEqual(varrer_atrasadas(hoje=self.HOJE), (0, 0))
+
+        # No dia seguinte, só a que venceu "hoje"
+        self.assertEqual(varrer_atrasadas(hoje=self.HOJE + timedelta(days=1)), (1, 1))
+        self.assertEqual(Tarefa.objects.get(pk=hoje.pk).atraso_avisado, hoje.data_vencimento)
+        self.assertEqual(Varredura.objects.get().dia, self.HOJE + timedelta(days=1))
+
+    def test_consultas_nao_crescem_com_as_tarefas(self):
+        contagens = []
+        for quantidade in (2, 20):
+            Notificacao.objects.all().delete()
+            Varredura.objects.all().delete()
+            Tarefa.objects.all().delete()
+            Tarefa.objects.bulk_create([
+                Tarefa(usuario=self.usuario, descricao='Atrasada', data_vencimento=self.HOJE - timedelta(days=1))
+                for _ in range(quantidade)
+            ])
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(varrer_atrasadas(hoje=self.HOJE, lote=1000), (quantidade, 1))
+            contagens.append(len(consultas))
+        self.assertEqual(contagens[0], contagens[1])
+
+    def test_repete_a_varredura_sem_avisar_duas_vezes(self):
+        tarefas = [self.criar(self.usuario, -2), self.criar(self.usuario, -1)]
+        self.assertEqual(varrer_atrasadas(hoje=self.HOJE, desde=self.HOJE - timedelta(days=2), lote=1), (2, 2))
+        self.assertEqual(varrer_atrasadas(hoje=self.HOJE, desde=self.HOJE - timedelta(days=2)), (0, 0))
+        # Vencimento adiado e vencido de novo: novo aviso
+        Tarefa.objects.filter(pk=tarefas[0].pk).update(data_vencimento=self.HOJE)
+        self.assertEqual(varrer_atrasadas(hoje=self.HOJE + timedelta(days=1)), (1, 1))
+
+    def test_envia_um_resumo_por_usuario_em_lotes(self):
+        ana = [self.criar(self.usuario, -2), self.criar(self.usuario, -1), self.criar(self.usuario, -1)]
+        self.criar(self.outro, -1)
+        sem_email = User.objects.create_user('carla')
+        self.criar(sem_email, -1)
+        varrer_atrasadas(hoje=self.HOJE, desde=self.HOJE - timedelta(days=2), lote=2)
+        self.assertEqual(Notificacao.objects.filter(usuario=self.usuario).count(), 2)
+        # Concluída depois da varredura: sai do resumo
+        ana[0].concluida = True
+        ana[0].save()
+
+        self.assertEqual(enviar_notificacoes(lote=2), (2, 3))
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox), ['ana@example.com', 'bruno@example.com'])
+        resumo = next(email for email in mail.outbox if email.to == ['ana@example.com'])
+        self.assertIn('2 tarefas passaram do vencimento', resumo.body)
+        self.assertNotIn(ana[0].descricao + ' (', resumo.body.replace(ana[1].descricao + ' (', ''))
+        self.assertFalse(Notificacao.objects.filter(enviada_em=None).exists())
+        self.assertEqual(enviar_notificacoes(), (0, 0))
+
+    def test_comando(self):
+        Tarefa.objects.create(
+            usuario=self.usuario, descricao='Atrasada', data_vencimento=timezone.localdate() - timedelta(days=1),
+        )
+        saida = StringIO()
+        call_command('avisar_atrasadas', stdout=saida)
+        self.assertIn('1 tarefa(s) atrasada(s)', saida.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class RecorrenciaTests(BaseTarefasTestCase):
+    INICIO = date(2030, 3, 1)
+    MARCO = {'mes': '2030-03'}
+
+    def criar_serie(self, regra='FREQ=DAILY', inicio=None, usuario=None):
+        modelo = Tarefa.objects.create(
+            usuario=usuario or self.usuario, descricao='Regar as plantas', data_vencimento=inicio or self.INICIO,
+        )
+        return criar_serie(modelo, regra)
+
+    def agenda(self, **params):
+        resposta = self.client.get(reverse('tasks:agenda'), {**self.MARCO, **params})
+        self.assertEqual(resposta.status_code, 200)
+        return resposta
+
+    def test_ocorrencias_geradas_so_para_o_periodo(self):
+        serie = self.criar_serie('FREQ=WEEKLY;BYDAY=MO,WE')
+        Tarefa.objects.create(usuario=self.usuario, descricao='Avulsa', data_vencimento=date(2030, 3, 15))
+
+        tarefas = tarefas_do_periodo(self.usuario.pk, date(2030, 3, 1), date(2030, 3, 15))
+        self.assertEqual(
+            [(t.data_vencimento.day, t.pk is None) for t in tarefas],
+            [(1, False), (4, True), (6, True), (11, True), (13, True)],
+        )
+        self.assertTrue(all(t.serie_id == serie.pk for t in tarefas))
+        # Outro usuário não vê a série
+        self.assertEqual(tarefas_do_periodo(self.outro.pk, date(2030, 3, 1), date(2030, 4, 1)), [])
+
+    def test_listar_nao_grava_ocorrencias(self):
+        self.criar_serie()
+        resposta = self.agenda()
+        self.assertContains(resposta, 'Regar as plantas', count=31)
+        self.assertContains(resposta, reverse('tasks:concluir_ocorrencia', args=[Recorrencia.objects.get().pk, '2030-03-02']))
+        self.assertEqual(Tarefa.objects.count(), 1)
+
+    @override_settings(TAREFAS_POR_PAGINA=4)
+    def test_agenda_gera_so_a_pagina_pedida(self):
+        for _ in range(3):
+            self.criar_serie()
+        Tarefa.objects.create(usuario=self.usuario, descricao='Avulsa', data_vencimento=date(2030, 3, 2), prioridade=3)
+        todas = tarefas_do_periodo(self.usuario.pk, date(2030, 3, 1), date(2030, 4, 1))
+
+        vistas = []
+        with mock.patch.object(recorrencia, 'ocorrencia', wraps=recorrencia.ocorrencia) as ocorrencia:
+            for numero in (1, 2):
+                ocorrencia.reset_mock()
+                resposta = self.agenda(pagina=numero)
+                vistas += resposta.context['tarefas']
+                self.assertLessEqual(ocorrencia.call_count, 5)
+        self.assertEqual(resposta.context['pagina_anterior'], 1)
+        self.assertEqual(resposta.context['proxima_pagina'], 3)
+        chave = lambda t: (t.data_vencimento, t.pk, t.serie_id)
+        self.assertEqual([chave(t) for t in vistas], [chave(t) for t in todas[:8]])
+        # Os 3 modelos no dia 1; no dia 2 a avulsa, de prioridade alta, vem antes das ocorrências
+        self.assertEqual(vistas[3].descricao, 'Avulsa')
+
+        self.assertRedirects(self.client.get(reverse('tasks:agenda'), {**self.MARCO, 'pagina': 99}),
+                             reverse('tasks:agenda') + '?mes=2030-03', fetch_redirect_response=False)
+
+    def test_consultas_nao_crescem_com_as_series(self):
+        contagens = []
+        for quantidade in (1, 10):
+            for i in range(quantidade):
+                self.criar_serie(['FREQ=DAILY', 'FREQ=WEEKLY', 'FREQ=MONTHLY'][i % 3])
+            cache.clear()
+            with CaptureQueriesContext(connection) as consultas:
+                self.agenda()
+            contagens.append(len(consultas))
+        self.assertEqual(contagens[0], contagens[1])
+
+    def test_concluir_grava_a_ocorrencia_uma_vez(self):
+        serie = self.criar_serie()
+        url = reverse('tasks:concluir_ocorrencia', args=[serie.pk, '2030-03-05'])
+
+        resposta = self.client.get(url)
+        self.assertRedirects(resposta, reverse('tasks:agenda') + '?mes=2030-03', fetch_redirect_response=False)
+        gravada = Tarefa.objects.get(serie=serie, data_ocorrencia=date(2030, 3, 5))
+        self.assertTrue(gravada.concluida)
+        self.assertEqual(EstatisticasUsuario.objects.get(usuario=self.usuario).concluidas, 1)
+
+        # De novo (outra aba): não duplica
+        self.client.get(url)
+        self.assertEqual(Tarefa.objects.filter(serie=serie).count(), 2)
+        tarefas = tarefas_do_periodo(self.usuario.pk, date(2030, 3, 5), date(2030, 3, 6))
+        self.assertEqual([t.pk for t in tarefas], [gravada.pk])
+
+    def test_editar_grava_a_ocorrencia_mesmo_mudando_o_vencimento(self):
+        serie = self.criar_serie()
+        url = reverse('tasks:editar_ocorrencia', args=[serie.pk, '2030-03-10'])
+        self.assertContains(self.client.get(url), 'Regar as plantas')
+        self.assertEqual(Tarefa.objects.count(), 1)
+
+        self.client.post(url, {
+            'descricao': 'Regar só as samambaias', 'prioridade': Tarefa.Prioridade.ALTA, 'data_vencimento': '2030-04-02',
+            'tempo_estimado': 0,
+        })
+        gravada = Tarefa.objects.get(serie=serie, data_ocorrencia=date(2030, 3, 10))
+        self.assertEqual(gravada.data_vencimento, date(2030, 4, 2))
+        # A ocorrência do dia 10 não volta a ser gerada em março
+        tarefas = tarefas_do_periodo(self.usuario.pk, date(2030, 3, 10), date(2030, 3, 11))
+        self.assertEqual(tarefas, [])
+        # E a edição seguinte vai para a tarefa gravada
+        self.assertRedirects(self.client.get(url), reverse('tasks:editar_tarefa', args=[gravada.pk]),
+                             fetch_redirect_response=False)
+
+    def test_ocorrencia_excluida_nao_volta(self):
+        serie = self.criar_serie()
+        self.client.get(reverse('tasks:concluir_ocorrencia', args=[serie.pk, '2030-03-05']))
+        self.client.get(reverse('tasks:concluir_ocorrencia', args=[serie.pk, '2030-03-06']))
+        gravadas = Tarefa.objects.filter(serie=serie, data_ocorrencia__isnull=False).exclude(pk=serie.tarefa_id)
+
+        self.client.get(reverse('tasks:excluir_tarefa', args=[gravadas.get(data_ocorrencia=date(2030, 3, 5)).pk]))
+        excluir_em_lote(Tarefa.objects.filter(data_ocorrencia=date(2030, 3, 6)))
+
+        serie.refresh_from_db()
+        self.assertEqual(serie.excecoes, ['2030-03-05', '2030-03-06'])
+        dias = [t.data_vencimento.day for t in tarefas_do_periodo(self.usuario.pk, date(2030, 3, 4), date(2030, 3, 8))]
+        self.assertEqual(dias, [4, 7])
+        self.assertEqual(self.client.get(reverse('tasks:concluir_ocorrencia', args=[serie.pk, '2030-03-05'])).status_code, 404)
+
+    def test_datas_fora_da_regra_ou_de_outro_usuario(self):
+        serie = self.criar_serie('FREQ=WEEKLY;BYDAY=MO')
+        for data in ['2030-03-05', '2030-02-25', 'ontem']:
+            with self.subTest(data=data):
+                resposta = self.client.get(reverse('tasks:editar_ocorrencia', args=[serie.pk, data]))
+                self.assertEqual(resposta.status_code, 404)
+        alheia = self.criar_serie(usuario=self.outro)
+        resposta = self.client.get(reverse('tasks:concluir_ocorrencia', args=[alheia.pk, '2030-03-02']))
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_regra_personalizada_e_validada(self):
+        self.assertEqual(normalizar_regra('rrule:freq=monthly;bymonthday=15'), 'FREQ=MONTHLY;BYMONTHDAY=15')
+        for regra in ['FREQ=HOURLY', 'BYDAY=MO', 'FREQ=WEEKLY;BYDAY=XX', 'qualquer coisa']:
+            with self.subTest(regra=regra), self.assertRaises(ValueError):
+                normalizar_regra(regra)
+
+        dados = {'descricao': 'Pagar aluguel', 'prioridade': Tarefa.Prioridade.MEDIA,
+                 'data_vencimento': '2030-03-10', 'tempo_estimado': 0, 'repetir': 'personalizada',
+                 'regra': 'FREQ=DAILY;BYHOUR=xx'}
+        self.client.post(reverse('tasks:lista_tarefas'), dados)
+        self.assertFalse(Recorrencia.objects.exists())
+
+        self.client.post(reverse('tasks:lista_tarefas'), {**dados, 'regra': 'FREQ=MONTHLY;COUNT=3'})
+        serie = Recorrencia.objects.get()
+        self.assertEqual((serie.regra, serie.termino), ('FREQ=MONTHLY;COUNT=3', date(2030, 5, 10)))
+        self.assertEqual(serie.tarefa.data_ocorrencia, date(2030, 3, 10))
+        self.assertEqual(tarefas_do_periodo(self.usuario.pk, date(2030, 6, 1), date(2030, 7, 1)), [])
+
+    def test_regra_sem_datas_e_recusada(self):
+        # O dateutil nunca termina de procurar datas com INTERVAL=0 e percorre
+        # o calendário inteiro numa regra impossível
+        casos = {
+            'FREQ=DAILY;INTERVAL=0': 'INTERVAL',
+            'FREQ=WEEKLY;INTERVAL=-1': 'INTERVAL',
+            'FREQ=DAILY;BYMONTH=2;BYMONTHDAY=30': 'nenhuma data',
+            'FREQ=MONTHLY;BYMONTH=4;BYMONTHDAY=31': 'nenhuma data',
+        }
+        for regra, mensagem in casos.items():
+            with self.subTest(regra=regra), self.assertRaisesMessage(ValueError, mensagem):
+                normalizar_regra(regra)
+        # Bissextos e regras que terminam no passado continuam valendo
+        for regra in ['FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=29', 'FREQ=DAILY;UNTIL=20200101']:
+            with self.subTest(regra=regra):
+                self.assertEqual(normalizar_regra(regra), regra)
+
+        self.client.post(reverse('tasks:lista_tarefas'), {
+            'descricao': 'Nunca', 'prioridade': Tarefa.Prioridade.MEDIA, 'data_vencimento': '2030-03-10',
+            'tempo_estimado': 0, 'repetir': 'personalizada', 'regra': 'FREQ=DAILY;INTERVAL=0',
+        })
+        self.assertFalse(Recorrencia.objects.exists())
+
+    def test_editar_o_modelo_muda_a_regra_ou_encerra(self):
+        serie = self.criar_serie()
+        url = reverse('tasks:editar_tarefa', args=[serie.tarefa_id])
+        dados = {'descricao': 'Regar as plantas', 'prioridade': Tarefa.Prioridade.MEDIA, 'data_vencimento': '2030-03-01',
+                 'tempo_estimado': 0}
+
+        self.client.post(url, {**dados, 'repetir': 'semanal'})
+        serie.refresh_from_db()
+        self.assertEqual(serie.regra, 'FREQ=WEEKLY')
+
+        self.client.get(reverse('tasks:concluir_ocorrencia', args=[serie.pk, '2030-03-08']))
+        self.client.post(url, {**dados, 'repetir': ''})
+        self.assertFalse(Recorrencia.objects.exists())
+        # As ocorrências gravadas ficam, como tarefas avulsas
+        self.assertEqual(Tarefa.objects.filter(serie=None).count(), 2)
+        self.assertEqual(len(tarefas_do_periodo(self.usuario.pk, date(2030, 3, 1), date(2030, 4, 1))), 2)
+
+    def test_encerrar_serie_mantem_as_gravadas(self):
+        serie = self.criar_serie()
+        self.client.get(reverse('tasks:concluir_ocorrencia', args=[serie.pk, '2030-03-02']))
+        encerrar_serie(serie)
+        self.assertEqual(Tarefa.objects.filter(usuario=self.usuario).count(), 2)
+        self.assertFalse(Tarefa.objects.exclude(serie=None).exists())
+
+        # Excluir o modelo também encerra a série
+        serie = self.criar_serie()
+        self.client.get(reverse('tasks:concluir_ocorrencia', args=[serie.pk, '2030-03-02']))
+        self.client.get(reverse('tasks:excluir_tarefa', args=[serie.tarefa_id]))
+        self.assertFalse(Recorrencia.objects.exists())
+        self.assertEqual(Tarefa.objects.filter(usuario=self.usuario).count(), 3)
+
+    def test_benchmark_nao_grava_ocorrencias(self):
+        resultado = desempenho.medir_recorrencias(series=30, repeticoes=2)
+        self.assertEqual(resultado['tarefas_antes'], 30)
+        self.assertEqual(resultado['tarefas_depois'], 30)
+        self.assertGreater(resultado['ocorrencias'], 30)
+        self.assertLessEqual(resultado['consultas'], 10)
+
+
+class ArquivoTests(BaseTarefasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.categoria = Categoria.objects.create(nome='Casa', usuario=self.usuario)
+        self.tarefas = criar_tarefas(self.usuario, 10, categoria=self.categoria)
+        criar_tarefas(self.outro, 5)
+        # Metade concluída há 200 dias, o resto pendente
+        alterar_em_lote(Tarefa.objects.all(), concluida=False)
+        self.antigas = [t.pk for t in self.tarefas[:5]]
+        alterar_em_lote(Tarefa.objects.filter(pk__in=self.antigas), concluida=True)
+        Tarefa.objects.filter(pk__in=self.antigas).update(data_conclusao=timezone.now() - timedelta(days=200))
+
+    def test_arquiva_em_lotes(self):
+        recente = self.tarefas[5]
+        alterar_em_lote(Tarefa.objects.filter(pk=recente.pk), concluida=True)
+
+        self.assertEqual(arquivar(dias=90, lote=2, lotes=1), 2)
+        self.assertEqual(TarefaArquivada.objects.count(), 2)
+        # A execução seguinte continua do que sobrou; a repetida não faz nada
+        self.assertEqual(arquivar(dias=90, lote=2), 3)
+        self.assertEqual(arquivar(dias=90), 0)
+
+        self.assertEqual(set(TarefaArquivada.objects.values_list('pk', flat=True)), set(self.antigas))
+        self.assertFalse(Tarefa.objects.filter(pk__in=self.antigas).exists())
+        self.assertTrue(Tarefa.objects.filter(pk=recente.pk).exists())
+        arquivada = TarefaArquivada.objects.get(pk=self.tarefas[0].pk)
+        self.assertEqual((arquivada.descricao, arquivada.categoria_id, arquivada.usuario_id),
+                         (self.tarefas[0].descricao, self.categoria.pk, self.usuario.pk))
+        self.assertEqual(divergencias([self.usuario.pk, self.outro.pk]), [])
+
+    def test_concluidas_sem_data_de_conclusao_contam_pelo_vencimento(self):
+        importada = Tarefa.objects.create(
+            usuario=self.usuario, descricao='Importada', data_vencimento=date.today() - timedelta(days=200), concluida=True,
+        )
+        Tarefa.objects.filter(pk=importada.pk).update(data_conclusao=None)
+        arquivar(dias=90)
+        self.assertTrue(TarefaArquivada.objects.filter(pk=importada.pk).exists())
+
+    def test_series_nao_sao_arquivadas(self):
+        modelo = Tarefa.objects.create(usuario=self.usuario, descricao='Regar', data_vencimento=date.today() - timedelta(days=200))
+        criar_serie(modelo, 'FREQ=DAILY')
+        alterar_em_lote(Tarefa.objects.filter(pk=modelo.pk), concluida=True)
+        Tarefa.objects.filter(pk=modelo.pk).update(data_conclusao=timezone.now() - timedelta(days=200))
+        arquivar(dias=90)
+        self.assertTrue(Tarefa.objects.filter(pk=modelo.pk).exists())
+
+    def test_sync_ve_arquivar_e_restaurar(self):
+        cursor = self.client.get(reverse('tasks:sync')).json()['cursor']
+        arquivar(dias=90)
+        delta = self.client.get(reverse('tasks:sync'), {'cursor': cursor}).json()
+        self.assertEqual(sorted(delta['exclusoes']['tarefas']), sorted(self.antigas))
+
+        self.assertEqual(restaurar(self.usuario.pk, self.antigas[:1]), 1)
+        self.assertFalse(Exclusao.objects.filter(objeto_id=self.antigas[0]).exists())
+        delta = self.client.get(reverse('tasks:sync'), {'cursor': delta['cursor']}).json()
+        self.assertEqual([t['id'] for t in delta['tarefas']], self.antigas[:1])
+
+    def test_restaurar_mantem_id_e_datas(self):
+        original = Tarefa.objects.get(pk=self.antigas[0])
+        arquivar(dias=90)
+        # De outro usuário não restaura
+        self.assertEqual(restaurar(self.outro.pk, self.antigas), 0)
+
+        self.assertEqual(restaurar(self.usuario.pk, self.antigas), 5)
+        restaurada = Tarefa.objects.get(pk=original.pk)
+        self.assertEqual(
+            (restaurada.descricao, restaurada.concluida, restaurada.data_criacao, restaurada.data_conclusao),
+            (original.descricao, True, original.data_criacao, original.data_conclusao),
+        )
+        self.assertFalse(TarefaArquivada.objects.exists())
+        self.assertEqual(divergencias([self.usuario.pk]), [])
+        # Sem a exclusão antiga, a restaurada é arquivada de novo
+        self.assertEqual(arquivar(dias=90), 5)
+
+    @override_settings(TAREFAS_POR_PAGINA=2)
+    def test_pagina_do_arquivo(self):
+        arquivar(dias=90)
+        vistas, cursor = [], None
+        while True:
+            resposta = self.client.get(reverse('tasks:arquivo'), {'cursor': cursor} if cursor else {})
+            self.assertEqual(resposta.status_code, 200)
+            pagina = resposta.context['pagina']
+            vistas += [t.pk for t in pagina]
+            if not pagina.tem_proxima:
+                break
+            cursor = pagina.proximo_cursor
+        self.assertEqual(sorted(vistas), sorted(self.antigas))
+
+        self.client.force_login(self.outro)
+        self.assertContains(self.client.get(reverse('tasks:arquivo')), 'Nenhuma tarefa arquivada')
+
+    def test_restaurar_pela_view(self):
+        arquivar(dias=90)
+        url = reverse('tasks:restaurar_tarefa', args=[self.antigas[0]])
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+        self.client.force_login(self.outro)
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+        self.client.force_login(self.usuario)
+        self.assertRedirects(self.client.post(url), reverse('tasks:arquivo'))
+        self.assertTrue(Tarefa.objects.filter(pk=self.antigas[0], usuario=self.usuario).exists())
+
+    def test_comando(self):
+        saida = StringIO()
+        call_command('arquivar_tarefas', '--dias', '90', '--lote', '2', '--lotes', '1', stdout=saida)
+        self.assertIn('2 tarefa(s)', saida.getvalue())
+        call_command('arquivar_tarefas', '--dias', '90', stdout=saida)
+        self.assertIn('3 tarefa(s)', saida.getvalue())
+        self.assertEqual(TarefaArquivada.objects.count(), 5)
+
+
+class SinteticoTests(TestCase):
+    def test_gera_usuarios_categorias_e_tarefas_consistentes(self):
+        ids = gerar(usuarios=2, categorias=3, tarefas=50, semente=1)
+
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(Categoria.objects.filter(usuario_id__in=ids).count(), 6)
+        self.assertEqual(Tarefa.objects.filter(usuario_id__in=ids).count(), 100)
+        self.assertEqual(divergencias(ids), [])
+        self.assertEqual(SequenciaSync.objects.filter(usuario_id__in=ids).count(), 2)
+
+    def test_mesma_semente_gera_os_mesmos_dados(self):
+        campos = ['descricao', 'prioridade', 'data_vencimento', 'concluida', 'tempo_estimado', 'notas']
+        amostras = []
+        for prefixo in ('a', 'b'):
+            usuario_id = gerar(usuarios=1, categorias=2, tarefas=30, semente=7, prefixo=prefixo)[0]
+            amostras.append(list(Tarefa.objects.filter(usuario_id=usuario_id).order_by('id').values_list(*campos)))
+        self.assertEqual(amostras[0], amostras[1])
+
+    def test_comando(self):
+        saida = StringIO()
+        call_command('gerar_dados_sinteticos', usuarios=2, categorias=1, tarefas=10, stdout=saida)
+        self.assertIn('20 tarefa(s)', saida.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='sintetico').count(), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, ORCAMENTO_SQL_ESTRITO=True)
+class DesempenhoTests(TestCase):
+    def test_toda_url_tem_cenario(self):
+        self.assertEqual({padrao.name for padrao in tasks_urls.urlpatterns}, set(desempenho.CENARIOS))
+
+    def test_mede_todas_as_urls(self):
+        resultado = desempenho.executar([10], repeticoes=2, series=0)
+
+        medidas = resultado['resultados']['10']
+        self.assertEqual(list(medidas), [padrao.name for padrao in tasks_urls.urlpatterns])
+        for nome, medida in medidas.items():
+            with self.subTest(url=nome):
+                self.assertLessEqual(medida['p50_ms'], medida['p99_ms'])
+                self.assertGreater(medida['memoria_kb'], 0)
+        self.assertGreater(medidas['lista_tarefas']['consultas'], 0)
+        # As tarefas criadas pelos cenários são apagadas
+        self.assertFalse(Tarefa.objects.filter(descricao__startswith=desempenho.MARCA).exists())
+
+    def test_comparacao_com_a_base(self):
+        base = {'resultados': {'10': {'lista_tarefas': {'p95_ms': 20.0, 'consultas': 5, 'memoria_kb': 1000.0}}}}
+        ruido = {'resultados': {'10': {'lista_tarefas': {'p95_ms': 24.0, 'consultas': 5, 'memoria_kb': 1200.0}}}}
+        pior = {'resultados': {'10': {'lista_tarefas': {'p95_ms': 40.0, 'consultas': 6, 'memoria_kb': 1000.0}}}}
+
+        self.assertEqual(desempenho.comparar(ruido, base), [])
+        regressoes = desempenho.comparar(pior, base)
+        self.assertEqual(len(regressoes), 2)
+        self.assertIn('6 consultas SQL', regressoes[0])
+
+
+@override_settings(STATIC_ROOT=tempfile.mkdtemp(prefix='tarefando-static-'))
+class EstaticosTests(BaseTarefasTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_collectstatic_gera_hash_compressao_e_precache(self):
+        precache = ler_precache()
+        self.assertEqual(precache['arquivos'], [staticfiles_storage.url('images/Tarefando.png')])
+        self.assertRegex(precache['arquivos'][0], r'^/static/images/Tarefando\.[0-9a-f]{12}\.png$')
+
+        css = staticfiles_storage.path(staticfiles_storage.stored_name('admin/css/base.css'))
+        self.assertRegex(css, r'base\.[0-9a-f]{12}\.css$')
+        for extensao in ('.gz', '.br'):
+            self.assertTrue(os.path.exists(css + extensao), extensao)
+
+    def test_arquivos_com_hash_sao_imutaveis_e_comprimidos(self):
+        resposta = self.client.get(staticfiles_storage.url('images/Tarefando.png'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('immutable', resposta['Cache-Control'])
+        resposta.close()
+
+        resposta = self.client.get(staticfiles_storage.url('admin/css/base.css'), headers={'Accept-Encoding': 'br'})
+        self.assertEqual(resposta['Content-Encoding'], 'br')
+        resposta.close()
+
+    def test_service_worker_embute_o_precache(self):
+        precache = ler_precache()
+        resposta = self.client.get(reverse('service_worker'))
+
+        self.assertEqual(resposta['Content-Type'], 'application/javascript')
+        self.assertIn('no-cache', resposta['Cache-Control'])
+        self.assertContains(resposta, f'var arquivos = {json.dumps(precache["arquivos"])};')
+        self.assertContains(resposta, f'var versao = "{precache["versao"]}";')
+
+    def test_service_worker_antes_do_collectstatic(self):
+        with self.settings(STATIC_ROOT=tempfile.mkdtemp(prefix='tarefando-static-')):
+            self.assertContains(self.client.get(reverse('service_worker')), 'var arquivos = [];')
+
+
+@override_settings(**PERFIL_LIGADO)
+class PerfilTests(BaseTarefasTestCase):
+    def setUp(self):
+        super().setUp()
+        perfil.metricas.limpar()
+
+    def fases(self, resposta):
+        """Server-Timing como {fase: ms}"""
+        return {
+            item.split(';')[0]: float(re.search(r'dur=([\d.]+)', item).group(1))
+            for item in resposta['Server-Timing'].split(', ')
+        }
+
+    # Com a sessão no cache a leitura some no arredondamento do Server-Timing
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_server_timing_por_fase(self):
+        criar_tarefas(self.usuario, 5)
+        resposta = self.client.get(reverse('tasks:lista_tarefas'))
+
+        fases = self.fases(resposta)
+        self.assertEqual(list(fases), perfil.FASES)
+        for nome in ('sql', 'template', 'sessao', 'total'):
+            self.assertGreater(fases[nome], 0, nome)
+        self.assertGreaterEqual(fases['total'], fases['template'])
+        self.assertRegex(resposta['Server-Timing'], r'sql;dur=[\d.]+;desc="[1-9]\d* consultas"')
+
+    def test_mensagens(self):
+        tarefa = criar_tarefas(self.usuario, 1)[0]
+        resposta = self.client.get(reverse('tasks:marcar_concluida', args=[tarefa.id]))
+        self.assertGreater(self.fases(resposta)['mensagens'], 0)
+        resposta = self.client.get(resposta.url)
+        self.assertGreater(self.fases(resposta)['mensagens'], 0)
+
+    def test_metricas_prometheus(self):
+        for _ in range(2):
+            self.client.get(reverse('tasks:lista_tarefas'))
+        resposta = self.client.get(reverse('metricas'))
+
+        self.assertEqual(resposta['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        texto = resposta.content.decode()
+        self.assertIn('# TYPE tarefando_fase_segundos histogram', texto)
+        self.assertIn('tarefando_fase_segundos_count{url="tasks:lista_tarefas",fase="total"} 2', texto)
+        self.assertIn('tarefando_fase_segundos_bucket{url="tasks:lista_tarefas",fase="sql",le="+Inf"} 2', texto)
+        self.assertIn('tarefando_requisicoes_total{url="tasks:lista_tarefas",status="200"} 2', texto)
+        baldes = [int(linha.rsplit(' ', 1)[1]) for linha in texto.splitlines()
+                  if linha.startswith('tarefando_fase_segundos_bucket{url="tasks:lista_tarefas",fase="total"')]
+        self.assertEqual(baldes, sorted(baldes))
+
+    def test_acesso_as_metricas(self):
+        with self.settings(TAREFAS_METRICAS_TOKEN='segredo'):
+            self.assertEqual(self.client.get(reverse('metricas')).status_code, 401)
+            resposta = self.client.get(reverse('metricas'), headers={'Authorization': 'Bearer segredo'})
+            self.assertEqual(resposta.status_code, 200)
+        with self.settings(TAREFAS_PERFIL=False):
+            self.assertEqual(self.client.get(reverse('metricas')).status_code, 404)
+
+    def test_perfil_das_requisicoes_lentas(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            with self.settings(TAREFAS_PERFIL_AMOSTRA=1, TAREFAS_PERFIL_DIR=diretorio, TAREFAS_PERFIL_LENTO_MS=60000):
+                self.client.get(reverse('tasks:lista_tarefas'))
+                self.assertEqual(os.listdir(diretorio), [])
+
+            with self.settings(TAREFAS_PERFIL_AMOSTRA=1, TAREFAS_PERFIL_DIR=diretorio, TAREFAS_PERFIL_LENTO_MS=0), \
+                    self.assertLogs('tasks.perfil', 'WARNING'):
+                self.client.get(reverse('tasks:lista_tarefas'))
+            arquivos = os.listdir(diretorio)
+            self.assertEqual(len(arquivos), 1)
+            self.assertIn('tasks_lista_tarefas', arquivos[0])
+            funcoes = {nome for _, _, nome in pstats.Stats(os.path.join(diretorio, arquivos[0])).stats}
+            self.assertIn('render', funcoes)
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class PerfilAssincronoTests(PerfilTests):
+    async def test_middleware_no_modo_assincrono(self):
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get(reverse('tasks:lista_tarefas'))
+
+        fases = self.fases(resposta)
+        for nome in ('sql', 'template', 'sessao', 'total'):
+            self.assertGreater(fases[nome], 0, nome)
+
+
+@override_settings(**PERFIL_LIGADO)
+class ConexoesTests(BaseTarefasTestCase):
+    def setUp(self):
+        super().setUp()
+        perfil.metricas.limpar()
+
+    def test_aquisicao_entra_na_requisicao_e_nas_metricas(self):
+        medicao, medida = perfil.Medicao(), banco_medido()
+        token = perfil._medicao.set(medicao)
+        try:
+            medida.ensure_connection()
+        finally:
+            perfil._medicao.reset(token)
+            medida.close()
+
+        self.assertEqual(medicao.conexoes, 1)
+        self.assertGreater(medicao.fases['conexao'], 0)
+        texto = perfil.metricas.texto()
+        self.assertIn('tarefando_conexoes_total{origem="nova"} 1', texto)
+        self.assertIn('tarefando_conexao_aquisicao_segundos_count{origem="nova"} 1', texto)
+
+    def test_requisicao_com_a_conexao_ja_aberta(self):
+        for _ in range(2):
+            self.client.get(reverse('tasks:lista_tarefas'))
+
+        # A conexão do teste fica aberta: nenhuma das duas precisou conectar
+        texto = perfil.metricas.texto()
+        self.assertIn('tarefando_conexoes_total{origem="persistente"} 2', texto)
+        self.assertNotIn('origem="nova"', texto)
+
+    @skipUnless(connection.vendor == 'postgresql', 'O pool do psycopg é só para PostgreSQL')
+    def test_pool_reaproveita_conexoes(self):
+        opcoes = {**connection.settings_dict['OPTIONS'], 'pool': {'min_size': 1, 'max_size': 2}}
+        medida = banco_medido(OPTIONS=opcoes, CONN_MAX_AGE=0)
+        try:
+            for _ in range(3):
+                medida.ensure_connection()
+                medida.close()
+        finally:
+            medida.close_pool()
+
+        texto = perfil.metricas.texto()
+        self.assertIn('tarefando_conexoes_total{origem="nova"} 1', texto)
+        self.assertIn('tarefando_conexoes_total{origem="pool"} 2', texto)
+
+    @skipUnless(connection.settings_dict['OPTIONS'].get('pool'), 'Com TAREFAS_BANCO_CONEXOES=pool')
+    def test_estatisticas_do_pool(self):
+        self.client.get(reverse('tasks:lista_tarefas'))
+        self.assertRegex(perfil.metricas.texto(), r'tarefando_pool\{banco="default",estatistica="pool_max"\} \d+')
+
+
+class SessoesTests(BaseTarefasTestCase):
+    def consultas_de_sessao(self, nome, *args):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse(nome, args=args))
+        self.assertLess(resposta.status_code, 400)
+        return sum('django_session' in consulta['sql'] for consulta in consultas.captured_queries)
+
+    def test_consultas_de_sessao_por_modo(self):
+        tarefa = criar_tarefas(self.usuario, 1)[0]
+        # (lista_tarefas, marcar_concluida); nenhuma das duas grava a sessão
+        esperado = {
+            'django.contrib.sessions.backends.db': (1, 1),
+            'django.contrib.sessions.backends.cached_db': (0, 0),
+            'django.contrib.sessions.backends.signed_cookies': (0, 0),
+        }
+        for motor, consultas in esperado.items():
+            with self.subTest(motor), self.settings(SESSION_ENGINE=motor):
+                # O SessionMiddleware lê SESSION_ENGINE quando é criado
+                self.client = self.client_class()
+                self.client.force_login(self.usuario)
+                self.assertEqual(
+                    (self.consultas_de_sessao('tasks:lista_tarefas'),
+                     self.consultas_de_sessao('tasks:marcar_concluida', tarefa.id)),
+                    consultas,
+                )
+
+    def test_mensagem_fica_no_cookie(self):
+        tarefa = criar_tarefas(self.usuario, 1)[0]
+        resposta = self.client.get(reverse('tasks:marcar_concluida', args=[tarefa.id]))
+        self.assertIn(CookieStorage.cookie_name, resposta.cookies)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, resposta.cookies)
+        self.assertEqual(len(list(messages.get_messages(self.client.get(resposta.url).wsgi_request))), 1)
+
+
+# Banco "replica" dos ReplicasTests, só nos testes: o runner cria e migra o
+# arquivo, como faz com o default, quando algum teste o usa
+connections.settings.setdefault('replica', connections.configure_settings({
+    **settings.DATABASES,
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'replica.sqlite3',
+        'TEST': {'NAME': os.path.join(tempfile.mkdtemp(prefix='tarefando-'), 'replica.sqlite3')},
+    },
+})['replica'])
+
+
+def replicar():
+    """A "replicação" dos testes: copia para a réplica o estado do primário"""
+    for modelo in (User, Categoria, Tarefa, EstatisticasUsuario, EstatisticasCategoria):
+        campos = [campo.name for campo in modelo._meta.concrete_fields if not campo.primary_key]
+        modelo.objects.using('replica').bulk_create(
+            list(modelo.objects.using('default')),
+            update_conflicts=True, unique_fields=[modelo._meta.pk.name], update_fields=campos,
+        )
+
+
+@override_settings(
+    DATABASE_ROUTERS=['tasks.replicas.RoteadorReplicas'],
+    TAREFAS_REPLICAS=['replica'],
+    MIDDLEWARE=['tasks.replicas.ReplicaMiddleware', *settings.MIDDLEWARE],
+)
+class ReplicasTests(BaseTarefasTestCase):
+    """O banco de teste é o primário e a réplica é um segundo arquivo SQLite"""
+
+    databases = {'default', 'replica'}
+
+    def test_lista_le_da_replica_atrasada(self):
+        criar_tarefas(self.usuario, 2)
+        replicar()
+        # Gravada por outro aparelho, ainda não chegou à réplica
+        Tarefa.objects.create(usuario=self.usuario, descricao='Ainda não replicada', data_vencimento='2030-01-01')
+
+        resposta = self.client.get(reverse('tasks:lista_tarefas'))
+        self.assertNotContains(resposta, 'Ainda não replicada')
+        self.assertEqual(resposta.context['total_tarefas'], 2)
+        # Sem validadores nem cache: a página atrasada não sobrevive à réplica
+        self.assertNotIn('ETag', resposta)
+        self.assertNotIn(COOKIE_PRIMARIO, resposta.cookies)
+
+        replicar()
+        self.assertContains(self.client.get(reverse('tasks:lista_tarefas')), 'Ainda não replicada')
+
+    def test_quem_gravou_le_do_primario(self):
+        replicar()
+        resposta = self.client.post(reverse('tasks:lista_categorias'), {'nome': 'Mercado', 'cor': '#28a745'})
+        self.assertTrue(Categoria.objects.filter(nome='Mercado').exists())
+        self.assertEqual(resposta.cookies[COOKIE_PRIMARIO]['max-age'], settings.TAREFAS_REPLICA_FIXAR)
+
+        resposta = self.client.get(reverse('tasks:lista_categorias'))
+        self.assertContains(resposta, 'Mercado')
+
+        # Passada a janela, volta para a réplica quando as categorias não
+        # estão em cache (ver tasks/categorias.py)...
+        del self.client.cookies[COOKIE_PRIMARIO]
+        categorias.limpar()
+        self.assertNotContains(self.client.get(reverse('tasks:lista_categorias')), 'Mercado')
+        # ...e o que veio da réplica atrasada não fica no cache
+        replicar()
+        self.assertContains(self.client.get(reverse('tasks:lista_categorias')), 'Mercado')
+
+    def test_outras_views_leem_do_primario(self):
+        tarefa = criar_tarefas(self.usuario, 1)[0]
+        resposta = self.client.get(reverse('tasks:editar_tarefa', args=[tarefa.id]))
+        self.assertEqual(resposta.status_code, 200)
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class ReplicasAssincronaTests(ReplicasTests):
+    pass
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class ViewsAssincronasTests(BaseTarefasTestCase):
+    def test_rotas_usam_as_views_assincronas(self):
+        for nome in ['lista_tarefas', 'lista_categorias']:
+            self.assertIs(resolve(reverse(f'tasks:{nome}')).func, getattr(views_async, nome))
+
+    def test_anonimo_vai_para_o_login(self):
+        self.client.logout()
+        resposta = self.client.get(reverse('tasks:lista_tarefas'))
+        self.assertEqual(resposta.status_code, 302)
+        self.assertIn('next=', resposta['Location'])
+
+    def test_toggle_de_tarefa_inexistente(self):
+        resposta = self.client.get(reverse('tasks:marcar_concluida', args=[999999]), follow=True)
+        self.assertEqual([str(m) for m in resposta.context['messages']], ['❌ Tarefa não encontrada.'])
+
+    def test_modo_stream(self):
+        criar_tarefas(self.usuario, 7)
+        resposta = self.client.get(reverse('tasks:lista_tarefas'), {'stream': '1', 'filtro': 'pendentes'})
+        html = b''.join(resposta).decode()
+        for tarefa in Tarefa.objects.filter(usuario=self.usuario):
+            self.assertEqual(reverse('tasks:editar_tarefa', args=[tarefa.id]) in html, not tarefa.concluida)
+
+    async def test_modo_stream_sob_asgi(self):
+        await sync_to_async(criar_tarefas)(self.usuario, 7)
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get(reverse('tasks:lista_tarefas'), {'stream': '1', 'filtro': 'pendentes'})
+        self.assertTrue(resposta.is_async)
+        html = b''.join([parte async for parte in resposta]).decode()
+        async for tarefa in Tarefa.objects.filter(usuario=self.usuario):
+            self.assertEqual(reverse('tasks:editar_tarefa', args=[tarefa.id]) in html, not tarefa.concluida)
+
+
+# Os mesmos testes das telas, servidos pelas views assíncronas
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class ListaTarefasAssincronaTests(ListaTarefasTests):
+    pass
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class OrcamentoSQLAssincronoTests(OrcamentoSQLTests):
+    pass
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class CacheListaTarefasAssincronaTests(CacheListaTarefasTests):
+    pass
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class EstatisticasAssincronaTests(EstatisticasTests):
+    pass
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class CategoriasCacheAssincronaTests(CategoriasCacheTests):
+    pass
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TesteCargaTests(LiveServerTestCase):
+    def test_mede_servidor_com_sessao_autenticada(self):
+        usuario = User.objects.create_user('carga', password='senha-forte-123')
+        criar_tarefas(usuario, 5)
+        saida = StringIO()
+        # Uma conexão só: as threads do live server dividem a conexão SQLite
+        # em memória, e o @orcamento_sql contaria as consultas umas das outras
+        call_command('teste_carga', f'wsgi={self.live_server_url}', usuario=usuario.pk, concorrencia=1,
+                     requisicoes=20, aquecimento=0, como_json=True, stdout=saida, stderr=StringIO())
+
+        resultado = json.loads(saida.getvalue())[0]
+        self.assertEqual((resultado['requisicoes'], resultado['erros']), (20, 0))
+        self.assertEqual(resultado['status'], {'200': 20})
+        self.assertGreater(resultado['p99_ms'], 0)
+
+
+class InicializacaoTests(TestCase):
+    def test_le_saida_do_importtime(self):
+        modulos = ler_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     _io\n'
+            'import time:      2500 |      10300 | django.db\n'
+        )
+        self.assertEqual(modulos, {'_io': (0.12, 0.12), 'django.db': (2.5, 10.3)})
+
+    def test_modo_enxuto_nao_carrega_admin_nem_dotenv(self):
+        saida = StringIO()
+        call_command('medir_inicializacao', repeticoes=1, como_json=True, stdout=saida)
+
+        padrao, enxuto = json.loads(saida.getvalue())
+        self.assertEqual((padrao['modo'], enxuto['modo']), ('padrao', 'enxuto'))
+        self.assertEqual((padrao['status'], enxuto['status']), ('200 OK', '200 OK'))
+        self.assertGreater(enxuto['importar_ms_p50'], 0)
+        self.assertIn('django.contrib.admin', padrao['pesados'])
+        # dj_database_url só aparece com DATABASE_URL, quando é usado
+        self.assertEqual([nome for nome in enxuto['pesados'] if nome != 'dj_database_url'], [])
+        self.assertIn('tasks', enxuto['por_pacote_ms'])
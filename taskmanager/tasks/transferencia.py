@@ -0,0 +1,204 @@
+"""
+Importação e exportação de tarefas em CSV e JSON Lines.
+
+A exportação percorre as tarefas com ``iterator()`` e gera o arquivo aos
+poucos. A importação lê o arquivo linha a linha, valida blocos de ``lote``
+linhas e grava cada bloco com ``bulk_create`` numa transação própria. Nos dois
+sentidos a memória usada depende do tamanho do bloco, não do arquivo.
+
+Como ``bulk_create`` não passa pelo save() nem pelos signals, cada bloco
+importado recebe uma única versão de sync e os contadores são atualizados de
+uma vez, como nas operações de ``tasks.lote``. Categorias são resolvidas pelo
+nome; as que não existem são criadas. Tarefas concluídas recebem a
+``data_conclusao`` do arquivo ou, se ele não a tiver, a hora da importação.
+"""
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+
+from .cache import invalidar_usuario
+from .categorias import categorias_do_usuario, invalidar_categorias
+from .estatisticas import estado_tarefa, registrar_alteracoes
+from .models import Categoria, EstatisticasCategoria, Tarefa
+from .sync import proxima_sequencia
+
+CAMPOS = [
+    'descricao', 'prioridade', 'data_vencimento', 'concluida', 'data_conclusao', 'categoria', 'notas', 'tempo_estimado',
+]
+FORMATOS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+MAXIMO_ERROS = 100
+
+
+class ImportacaoMuitoGrande(Exception):
+    """O arquivo passou do número máximo de linhas permitido"""
+
+
+def formato_do_arquivo(nome):
+    """'csv' ou 'jsonl' pela extensão do nome; None se não reconhecida"""
+    for extensao, formato in FORMATOS.items():
+        if nome.lower().endswith(extensao):
+            return formato
+    return None
+
+
+class _Eco:
+    """Arquivo falso para o csv.writer: devolve a linha em vez de gravá-la"""
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_exportacao(tarefas, formato='csv', chunk_size=2000):
+    """Gera o arquivo em pedaços de ``chunk_size`` tarefas; a prioridade sai pelo nome"""
+    nomes = {'categoria': 'categoria__nome', 'prioridade': 'prioridade_slug'}
+    colunas = [nomes.get(campo, campo) for campo in CAMPOS]
+    prioridade_slug = Case(
+        *(When(prioridade=prioridade, then=Value(prioridade.slug)) for prioridade in Tarefa.Prioridade),
+        output_field=CharField(),
+    )
+    linhas = (
+        tarefas.order_by('id').annotate(prioridade_slug=prioridade_slug)
+        .values_list(*colunas).iterator(chunk_size=chunk_size)
+    )
+
+    if formato == 'csv':
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow(CAMPOS)
+        serializar = escritor.writerow
+    else:
+        def serializar(valores):
+            return json.dumps(dict(zip(CAMPOS, valores)), ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+
+    bloco = []
+    for valores in linhas:
+        bloco.append(serializar(valores))
+        if len(bloco) >= chunk_size:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+def ler_linhas(arquivo, formato):
+    """
+    Lê um arquivo de texto e gera (número da linha, dados). ``dados`` é None
+    quando a linha não pôde ser lida.
+    """
+    if formato == 'csv':
+        leitor = csv.DictReader(arquivo)
+        for dados in leitor:
+            yield leitor.line_num, dados
+        return
+
+    for numero, texto in enumerate(arquivo, 1):
+        if not texto.strip():
+            continue
+        try:
+            dados = json.loads(texto)
+        except ValueError:
+            dados = None
+        yield numero, dados if isinstance(dados, dict) else None
+
+
+@dataclass
+class ResultadoImportacao:
+    importadas: int = 0
+    invalidas: int = 0
+    categorias_criadas: int = 0
+    # (número da linha, mensagem), no máximo MAXIMO_ERROS
+    erros: list = field(default_factory=list)
+    segundos: float = 0.0
+
+    @property
+    def linhas_por_segundo(self):
+        return (self.importadas + self.invalidas) / self.segundos if self.segundos else 0.0
+
+
+def _erro(resultado, numero, erros):
+    resultado.invalidas += 1
+    if len(resultado.erros) < MAXIMO_ERROS:
+        resultado.erros.append((numero, '; '.join(f'{campo}: {mensagens[0]}' for campo, mensagens in erros.items())))
+
+
+def _gravar_bloco(usuario, bloco, categorias, resultado):
+    from .forms import LinhaImportacaoForm
+
+    validas = []
+    for numero, dados in bloco:
+        if dados is None:
+            _erro(resultado, numero, {'linha': ['Linha ilegível.']})
+            continue
+        limpos, erros = LinhaImportacaoForm.validar(dados)
+        if erros:
+            _erro(resultado, numero, erros)
+            continue
+        validas.append(limpos)
+    if not validas:
+        return
+
+    agora = timezone.now()
+    with transaction.atomic():
+        versao = proxima_sequencia(usuario.pk)
+        novas = {dados['categoria'] for dados in validas if dados['categoria']} - categorias.keys()
+        if novas:
+            criadas = Categoria.objects.bulk_create([
+                Categoria(usuario=usuario, nome=nome, versao_sync=versao) for nome in sorted(novas)
+            ])
+            EstatisticasCategoria.objects.bulk_create([
+                EstatisticasCategoria(categoria=categoria, usuario_id=usuario.pk) for categoria in criadas
+            ])
+            categorias.update((categoria.nome, categoria.id) for categoria in criadas)
+            # bulk_create não dispara os signals
+            invalidar_categorias(usuario.pk)
+            resultado.categorias_criadas += len(criadas)
+
+        tarefas = Tarefa.objects.bulk_create([
+            Tarefa(
+                usuario=usuario,
+                categoria_id=categorias.get(dados['categoria']),
+                data_conclusao=(dados['data_conclusao'] or agora) if dados['concluida'] else None,
+                versao_sync=versao,
+                **{campo: dados[campo] for campo in CAMPOS if campo not in ('categoria', 'data_conclusao')},
+            )
+            for dados in validas
+        ])
+        registrar_alteracoes([(None, estado_tarefa(tarefa)) for tarefa in tarefas], usuario_id=usuario.pk)
+    resultado.importadas += len(tarefas)
+
+
+def importar_linhas(usuario, linhas, lote=1000, maximo=None):
+    """
+    Importa para ``usuario`` as linhas geradas por ``ler_linhas``. Linhas
+    inválidas são puladas e contadas. Com ``maximo``, levanta
+    ImportacaoMuitoGrande ao passar desse número de linhas; os blocos já
+    gravados só são desfeitos se quem chama envolver tudo numa transação.
+    """
+    inicio = time.monotonic()
+    resultado = ResultadoImportacao()
+    # Nome -> id das categorias do usuário, acrescido das criadas nesta importação
+    categorias = {resumo.nome: pk for pk, resumo in categorias_do_usuario(usuario.pk).items()}
+
+    bloco = []
+    try:
+        for total, linha in enumerate(linhas, 1):
+            if maximo is not None and total > maximo:
+                raise ImportacaoMuitoGrande(f'O arquivo tem mais de {maximo} linhas.')
+            bloco.append(linha)
+            if len(bloco) >= lote:
+                _gravar_bloco(usuario, bloco, categorias, resultado)
+                bloco = []
+        if bloco:
+            _gravar_bloco(usuario, bloco, categorias, resultado)
+    finally:
+        if resultado.importadas:
+            invalidar_usuario(usuario.pk)
+
+    resultado.segundos = time.monotonic() - inicio
+    return resultado
@@ -1,21 +1,51 @@
+from importlib import import_module
+
+from django.conf import settings
 from django.urls import path, include
 from . import views
 
 app_name = 'tasks'
 
-urlpatterns = [
-    path('', views.lista_tarefas, name='lista_tarefas'),
-    path('concluir/<int:tarefa_id>/', views.marcar_concluida, name='marcar_concluida'),
-    path('excluir/<int:tarefa_id>/', views.excluir_tarefa, name='excluir_tarefa'),
-    path('editar/<int:tarefa_id>/', views.editar_tarefa, name='editar_tarefa'),
-    
-    # URLs para categorias
-    path('categorias/', views.lista_categorias, name='lista_categorias'),
-    path('categorias/excluir/<int:categoria_id>/', views.excluir_categoria, name='excluir_categoria'),
-    
-    # URLs de autenticação
-    path('registrar/', views.registrar, name='registrar'),
-    path('login/', views.user_login, name='login'),
-    path('logout/', views.user_logout, name='logout'),  
-    # path('', include('pwa.urls')),
-]
\ No newline at end of file
+
+def rotas(telas):
+    """
+    Rotas do app. ``telas`` é o módulo com as views da lista, conclusão,
+    edição e categorias: ``views`` ou ``views_async``.
+    """
+    return [
+        path('', telas.lista_tarefas, name='lista_tarefas'),
+        path('concluir/<int:tarefa_id>/', telas.marcar_concluida, name='marcar_concluida'),
+        path('excluir/<int:tarefa_id>/', views.excluir_tarefa, name='excluir_tarefa'),
+        path('editar/<int:tarefa_id>/', telas.editar_tarefa, name='editar_tarefa'),
+        path('acoes/', views.acoes_em_lote, name='acoes_em_lote'),
+        path('exportar/', views.exportar_tarefas, name='exportar_tarefas'),
+        path('importar/', views.importar_tarefas, name='importar_tarefas'),
+        path('relatorio/', views.relatorio, name='relatorio'),
+
+        # Agenda do mês e ocorrências ainda não gravadas de tarefas recorrentes
+        path('agenda/', views.agenda, name='agenda'),
+        path('ocorrencias/<int:serie_id>/<str:data>/concluir/', views.concluir_ocorrencia, name='concluir_ocorrencia'),
+        path('ocorrencias/<int:serie_id>/<str:data>/editar/', views.editar_ocorrencia, name='editar_ocorrencia'),
+
+        # Tarefas concluídas há muito tempo (ver tasks/arquivo.py)
+        path('arquivo/', views.arquivo, name='arquivo'),
+        path('arquivo/<int:tarefa_id>/restaurar/', views.restaurar_tarefa, name='restaurar_tarefa'),
+
+        # Sincronização incremental para o PWA
+        path('sync/', views.sync, name='sync'),
+        path('sync/enviar/', views.sync_enviar, name='sync_enviar'),
+
+        # URLs para categorias
+        path('categorias/', telas.lista_categorias, name='lista_categorias'),
+        path('categorias/excluir/<int:categoria_id>/', telas.excluir_categoria, name='excluir_categoria'),
+
+        # URLs de autenticação
+        path('registrar/', views.registrar, name='registrar'),
+        path('login/', views.user_login, name='login'),
+        path('logout/', views.user_logout, name='logout'),
+        # path('', include('pwa.urls')),
+    ]
+
+
+# views_async só é importado quando usado: sob WSGI seria custo a mais no cold start
+urlpatterns = rotas(import_module('tasks.views_async') if settings.TAREFAS_VIEWS_ASYNC else views)
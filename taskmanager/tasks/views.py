@@ -1,24 +1,107 @@
+import csv
+import io
+import json
+import math
 import sys
+from datetime import date, datetime, timedelta
+from itertools import islice
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout as auth_logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.utils.encoding import force_str
-from .models import Tarefa, Categoria
-from .forms import TarefaForm, CategoriaForm, CustomUserCreationForm
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
+from . import perfil
+from .arquivo import restaurar
+from .busca import buscar_tarefas, pagina_busca
+from .categorias import anexar_categorias, categorias_com_total
+from .cache import (
+    chave_lista, etag_lista_tarefas, guardar_lista, last_modified_lista_tarefas, obter_lista, renderizar_linhas,
+)
+from .estaticos import ler_precache
+from .estatisticas import estatisticas_usuario
+from .models import Tarefa, TarefaArquivada, Categoria, Recorrencia, ResumoDiario
+from .forms import TarefaForm, CategoriaForm, CustomUserCreationForm, AcaoEmLoteForm, ImportacaoForm
+from .lote import alterar_em_lote, excluir_em_lote, marcar_conclusao
+from .orcamento import orcamento_sql
+from .paginacao import KeysetPaginator
+from .recorrencia import gravar, ocorre_em, ocorrencia, pagina_do_periodo
+from .replicas import leu_da_replica, ler_da_replica
+from .sync import aplicar_alteracoes, alteracoes_desde
+from .transferencia import (
+    CONTENT_TYPES, ImportacaoMuitoGrande, formato_do_arquivo, gerar_exportacao, importar_linhas, ler_linhas,
+)
 
-@login_required
-def lista_tarefas(request):
-    filtro = request.GET.get('filtro', 'todas')
-    
-    tarefas = Tarefa.objects.filter(usuario=request.user)
-    
+MARCADOR_STREAM = '<!-- tarefas:stream -->'
+SYNC_MAXIMO_ALTERACOES = 100
+# Arquivos maiores são importados pelo comando importar_tarefas
+IMPORTACAO_MAXIMO_LINHAS = 5000
+IMPORTACAO_LOTE = 1000
+RELATORIO_MAXIMO_DIAS = 365
+
+
+def filtrar_tarefas(tarefas, filtro):
+    """Aplica o filtro da barra lateral ao queryset de tarefas"""
     if filtro == 'pendentes':
         tarefas = tarefas.filter(concluida=False)
+    elif filtro == 'proximas':
+        # Lida em ordem direto do índice parcial tarefa_proximas_idx
+        tarefas = tarefas.filter(concluida=False).order_by(*Tarefa.ORDEM_URGENCIA)
     elif filtro == 'concluidas':
         tarefas = tarefas.filter(concluida=True)
     elif filtro in ['alta', 'media', 'baixa']:
-        tarefas = tarefas.filter(prioridade=filtro)
+        tarefas = tarefas.filter(prioridade=Tarefa.Prioridade.de_texto(filtro))
+    return tarefas
+
+def _stream_lista_tarefas(request, tarefas, contexto):
+    """
+    Renderiza o cabeçalho da página normalmente e envia as linhas de tarefa
+    uma a uma, lendo o banco em blocos. A memória fica constante mesmo para
+    usuários com dezenas de milhares de tarefas.
+    """
+    contexto['streaming'] = True
+    pagina = render_to_string('tasks/lista_tarefas.html', contexto, request=request)
+    inicio, _, fim = pagina.partition(MARCADOR_STREAM)
+    chunk_size = getattr(settings, 'TAREFAS_STREAM_CHUNK', 500)
+    dia = timezone.localdate().isoformat()
+
+    def gerar():
+        yield inicio
+        linhas = tarefas.iterator(chunk_size=chunk_size)
+        while bloco := list(islice(linhas, chunk_size)):
+            yield renderizar_linhas(bloco, dia)
+        yield fim
+
+    return StreamingHttpResponse(gerar(), content_type='text/html; charset=utf-8')
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@ler_da_replica
+@condition(etag_func=etag_lista_tarefas, last_modified_func=last_modified_lista_tarefas)
+@orcamento_sql(10)  # pior caso: tarefa nova que repete (cria a série)
+def lista_tarefas(request):
+    filtro = request.GET.get('filtro', 'todas')
+    busca = request.GET.get('q', '').strip()
+    
+    # As categorias das linhas vêm do cache (ver tasks/categorias.py)
+    tarefas = filtrar_tarefas(Tarefa.objects.filter(usuario=request.user), filtro)
+    if busca:
+        tarefas = buscar_tarefas(tarefas, busca, usuario_id=request.user.pk)
+    
+    def contar():
+        # Com busca o total sai do índice; sem ela, dos contadores
+        if busca:
+            return tarefas.count()
+        return estatisticas_usuario(request.user.pk).contagem(filtro)
     
     # Inicializa o formulário vazio para nova tarefa
     form = TarefaForm(user=request.user)
@@ -29,18 +112,58 @@ def lista_tarefas(request):
             nova_tarefa = form.save(commit=False)
             nova_tarefa.usuario = request.user
             nova_tarefa.save()
+            form.salvar_recorrencia(nova_tarefa)
             messages.success(request, '✅ Tarefa adicionada com sucesso!')
             return redirect('tasks:lista_tarefas')
     
-    return render(request, 'tasks/lista_tarefas.html', {
-        'tarefas': tarefas,
+    contexto = {
         'form': form,
-        'filtro_atual': filtro
+        'form_lote': AcaoEmLoteForm(user=request.user),
+        'form_importacao': ImportacaoForm(),
+        'filtro_atual': filtro,
+        'busca': busca,
+    }
+    
+    # ?stream=1 envia todas as tarefas sem paginar, linha a linha
+    if request.GET.get('stream') == '1':
+        contexto['total_tarefas'] = contar()
+        return _stream_lista_tarefas(request, tarefas, contexto)
+    
+    # A página fica em cache até a próxima alteração do usuário, e cada linha
+    # até a próxima alteração da tarefa (ver tasks.cache); a data entra nas
+    # chaves por causa das atrasadas
+    cursor = request.GET.get('cursor')
+    dia = timezone.localdate().isoformat()
+    chave = chave_lista(request.user.pk, filtro, busca, cursor, dia)
+    lista = obter_lista(chave)
+    if lista is None:
+        por_pagina = getattr(settings, 'TAREFAS_POR_PAGINA', 50)
+        if busca:
+            # Resultado ordenado por relevância: o cursor é o número da página
+            pagina = pagina_busca(tarefas, cursor, por_pagina)
+        else:
+            pagina = KeysetPaginator(tarefas, por_pagina).pagina(cursor)
+        lista = {
+            'total': contar(),
+            'pagina': pagina,
+            'linhas_html': renderizar_linhas(pagina, dia),
+        }
+        # O que veio de uma réplica pode estar atrasado (ver tasks.replicas)
+        if not leu_da_replica():
+            guardar_lista(chave, lista)
+    
+    contexto.update({
+        'total_tarefas': lista['total'],
+        'tarefas': lista['pagina'],
+        'pagina': lista['pagina'],
+        'linhas_html': mark_safe(lista['linhas_html']),
     })
+    return render(request, 'tasks/lista_tarefas.html', contexto)
 
 @login_required
+@orcamento_sql(16)  # pior caso: deixar de repetir (encerra a série)
 def editar_tarefa(request, tarefa_id):
-    tarefa = get_object_or_404(Tarefa, id=tarefa_id, usuario=request.user)
+    tarefa = get_object_or_404(Tarefa.objects.select_related('recorrencia'), id=tarefa_id, usuario=request.user)
     
     if request.method == 'POST':
         form = TarefaForm(request.POST, instance=tarefa, user=request.user)
@@ -56,27 +179,139 @@ def editar_tarefa(request, tarefa_id):
         'tarefa': tarefa
     })
 
+def _mes(request):
+    """Primeiro dia do mês de ?mes=AAAA-MM (padrão: o atual) e do mês seguinte"""
+    try:
+        inicio = datetime.strptime(request.GET['mes'], '%Y-%m').date()
+    except (KeyError, ValueError):
+        inicio = timezone.localdate().replace(day=1)
+    return inicio, (inicio + timedelta(days=32)).replace(day=1)
+
 @login_required
-def marcar_concluida(request, tarefa_id):
+@require_GET
+@ler_da_replica
+@orcamento_sql(4)
+def agenda(request):
+    """
+    Tarefas do mês, com as ocorrências das tarefas recorrentes geradas só
+    para ele (ver tasks/recorrencia.py)
+    """
+    inicio, fim = _mes(request)
     try:
-        tarefa = get_object_or_404(Tarefa, id=tarefa_id, usuario=request.user)
-        tarefa.concluida = not tarefa.concluida
-        tarefa.save()
-        
-        # Mensagem mais simples e segura
-        if tarefa.concluida:
-            messages.success(request, '✅ Tarefa marcada como concluída!')
-        else:
-            messages.success(request, '🔄 Tarefa marcada como pendente!')
-        
-    except Exception as e:
-        messages.error(request, f'❌ Erro ao atualizar a tarefa.')
-        # Log do erro para debug
-        print(f"Erro ao marcar tarefa como concluída: {str(e)}")
+        numero = max(int(request.GET.get('pagina', 1)), 1)
+    except ValueError:
+        numero = 1
+    tarefas, tem_mais = pagina_do_periodo(
+        request.user.pk, inicio, fim, numero, getattr(settings, 'TAREFAS_POR_PAGINA', 50),
+    )
+    if not tarefas and numero > 1:
+        return redirect(f"{reverse('tasks:agenda')}?mes={inicio:%Y-%m}")
+    return render(request, 'tasks/agenda.html', {
+        'inicio': inicio,
+        'anterior': (inicio - timedelta(days=1)).replace(day=1),
+        'proximo': fim,
+        'tarefas': tarefas,
+        'pagina_anterior': numero - 1 if numero > 1 else None,
+        'proxima_pagina': numero + 1 if tem_mais else None,
+        'linhas_html': mark_safe(renderizar_linhas(tarefas, timezone.localdate().isoformat())),
+    })
+
+def _ocorrencia_ou_404(request, serie_id, data):
+    """Série do usuário e data de uma ocorrência dela (AAAA-MM-DD)"""
+    recorrencia = get_object_or_404(
+        Recorrencia.objects.select_related('tarefa'), id=serie_id, usuario=request.user,
+    )
+    try:
+        dia = date.fromisoformat(data)
+    except ValueError:
+        raise Http404("Data inválida")
+    if not ocorre_em(recorrencia, dia):
+        raise Http404("Ocorrência não encontrada")
+    return recorrencia, dia
+
+@login_required
+@orcamento_sql(12)
+def concluir_ocorrencia(request, serie_id, data):
+    """Conclui uma ocorrência ainda não gravada de uma série, gravando-a"""
+    recorrencia, dia = _ocorrencia_ou_404(request, serie_id, data)
+    gravada = Tarefa.objects.filter(serie=recorrencia, data_ocorrencia=dia).values_list('id', flat=True).first()
+    if gravada is None:
+        tarefa = ocorrencia(recorrencia, dia)
+        tarefa.concluida = True
+        tarefa, criada = gravar(tarefa)
+        # Gravada por outra requisição entre a consulta e o INSERT
+        if not criada:
+            marcar_conclusao(request.user, tarefa.pk, True)
+    else:
+        marcar_conclusao(request.user, gravada, True)
+    messages.success(request, '✅ Tarefa marcada como concluída!')
+    return redirect(f"{reverse('tasks:agenda')}?mes={dia:%Y-%m}")
+
+@login_required
+@orcamento_sql(14)
+def editar_ocorrencia(request, serie_id, data):
+    """Edição de uma ocorrência de uma série; ela só é gravada ao salvar"""
+    recorrencia, dia = _ocorrencia_ou_404(request, serie_id, data)
+    gravada = Tarefa.objects.filter(serie=recorrencia, data_ocorrencia=dia).values_list('id', flat=True).first()
+    if gravada is not None:
+        return redirect('tasks:editar_tarefa', gravada)
+    tarefa = ocorrencia(recorrencia, dia)
+    
+    if request.method == 'POST':
+        form = TarefaForm(request.POST, instance=tarefa, user=request.user)
+        if form.is_valid():
+            _, criada = gravar(form.save(commit=False))
+            if criada:
+                messages.success(request, '✅ Tarefa atualizada com sucesso!')
+            else:
+                messages.warning(request, '⚠️ Esta ocorrência já tinha sido alterada em outro lugar; as alterações não foram salvas.')
+            return redirect(f"{reverse('tasks:agenda')}?mes={dia:%Y-%m}")
+    else:
+        form = TarefaForm(instance=tarefa, user=request.user)
+    
+    return render(request, 'tasks/editar_tarefa.html', {
+        'form': form,
+        'tarefa': tarefa
+    })
+
+@login_required
+@require_GET
+@ler_da_replica
+@orcamento_sql(2)
+def arquivo(request):
+    """Tarefas arquivadas (ver tasks/arquivo.py), do vencimento mais recente para o mais antigo"""
+    arquivadas = TarefaArquivada.objects.filter(usuario=request.user)
+    pagina = KeysetPaginator(arquivadas, getattr(settings, 'TAREFAS_POR_PAGINA', 50)).pagina(request.GET.get('cursor'))
+    anexar_categorias(pagina)
+    return render(request, 'tasks/arquivo.html', {'pagina': pagina, 'dias': settings.TAREFAS_ARQUIVAR_APOS_DIAS})
+
+@login_required
+@require_POST
+@orcamento_sql(11)  # pior caso: tarefa com categoria
+def restaurar_tarefa(request, tarefa_id):
+    """Devolve uma tarefa arquivada à lista"""
+    if not restaurar(request.user.pk, [tarefa_id]):
+        raise Http404("Tarefa arquivada não encontrada")
+    messages.success(request, '↩️ Tarefa restaurada!')
+    return redirect('tasks:arquivo')
+
+@login_required
+@orcamento_sql(8)
+def marcar_concluida(request, tarefa_id):
+    # ?concluida=1/0 informa o estado desejado; sem ele o estado é alternado
+    alvo = {'1': True, '0': False}.get(request.GET.get('concluida'))
+    concluida = marcar_conclusao(request.user, tarefa_id, alvo)
+    if concluida is None:
+        messages.error(request, '❌ Tarefa não encontrada.')
+    elif concluida:
+        messages.success(request, '✅ Tarefa marcada como concluída!')
+    else:
+        messages.success(request, '🔄 Tarefa marcada como pendente!')
     
     return redirect('tasks:lista_tarefas')
 
 @login_required
+@orcamento_sql(12)  # pior caso: o modelo de uma série (exclui a série) ou uma ocorrência gravada
 def excluir_tarefa(request, tarefa_id):
     tarefa = get_object_or_404(Tarefa, id=tarefa_id, usuario=request.user)
     tarefa.delete()
@@ -85,8 +320,140 @@ def excluir_tarefa(request, tarefa_id):
     return redirect('tasks:lista_tarefas')
 
 @login_required
+@require_POST
+@orcamento_sql(12)
+def acoes_em_lote(request):
+    form = AcaoEmLoteForm(request.POST, user=request.user)
+    if not form.is_valid():
+        for erro in form.errors.values():
+            messages.error(request, f'❌ {erro[0]}')
+        return redirect('tasks:lista_tarefas')
+    
+    acao = form.cleaned_data['acao']
+    tarefas = Tarefa.objects.filter(usuario=request.user, id__in=form.cleaned_data['ids'])
+    
+    if acao == 'excluir':
+        quantidade = excluir_em_lote(tarefas)
+        messages.success(request, f'🗑️ {quantidade} tarefa(s) excluída(s)!')
+    else:
+        valores = {
+            'concluir': {'concluida': True},
+            'reabrir': {'concluida': False},
+            'prioridade': {'prioridade': form.cleaned_data['prioridade']},
+            'categoria': {'categoria_id': getattr(form.cleaned_data['categoria'], 'pk', None)},
+        }[acao]
+        quantidade = alterar_em_lote(tarefas, **valores)
+        messages.success(request, f'✅ {quantidade} tarefa(s) atualizada(s)!')
+    
+    return redirect('tasks:lista_tarefas')
+
+@login_required
+@require_GET
+@orcamento_sql(7)
+def sync(request):
+    """Alterações do usuário desde o cursor do cliente (ver tasks/sync.py)"""
+    try:
+        cursor = int(request.GET['cursor']) if request.GET.get('cursor') else None
+        limite = int(request.GET.get('limite', getattr(settings, 'SYNC_LIMITE', 500)))
+    except ValueError:
+        return JsonResponse({'erro': 'Parâmetros inválidos.'}, status=400)
+    limite = max(1, min(limite, getattr(settings, 'SYNC_LIMITE_MAXIMO', 1000)))
+    return JsonResponse(alteracoes_desde(request.user.pk, cursor, limite))
+
+@login_required
+@require_POST
+@orcamento_sql(2 + 13 * SYNC_MAXIMO_ALTERACOES)  # pior caso: 13 por alteração (excluir a tarefa modelo de uma série)
+def sync_enviar(request):
+    """Recebe um lote de edições feitas offline"""
+    try:
+        alteracoes = json.loads(request.body)['alteracoes']
+        if not isinstance(alteracoes, list):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'erro': 'Corpo JSON inválido.'}, status=400)
+    if len(alteracoes) > SYNC_MAXIMO_ALTERACOES:
+        return JsonResponse({'erro': f'Envie no máximo {SYNC_MAXIMO_ALTERACOES} alterações por vez.'}, status=400)
+    
+    return JsonResponse({'resultados': aplicar_alteracoes(request.user, alteracoes)})
+
+@login_required
+@require_GET
+@orcamento_sql(2)
+def exportar_tarefas(request):
+    """Baixa todas as tarefas do usuário, geradas aos poucos"""
+    formato = 'jsonl' if request.GET.get('formato') == 'jsonl' else 'csv'
+    chunk_size = getattr(settings, 'TAREFAS_STREAM_CHUNK', 500)
+    resposta = StreamingHttpResponse(
+        gerar_exportacao(Tarefa.objects.filter(usuario=request.user), formato, chunk_size),
+        content_type=CONTENT_TYPES[formato],
+    )
+    resposta['Content-Disposition'] = f'attachment; filename="tarefas.{formato}"'
+    return resposta
+
+@login_required
+@require_POST
+# pior caso: todas as linhas com categoria nova, 32 consultas por bloco no
+# SQLite (que divide cada INSERT em lotes de 999 parâmetros)
+@orcamento_sql(3 + 32 * math.ceil(IMPORTACAO_MAXIMO_LINHAS / IMPORTACAO_LOTE))
+def importar_tarefas(request):
+    form = ImportacaoForm(request.POST, request.FILES)
+    if not form.is_valid():
+        for erro in form.errors.values():
+            messages.error(request, f'❌ {erro[0]}')
+        return redirect('tasks:lista_tarefas')
+    
+    arquivo = form.cleaned_data['arquivo']
+    formato = formato_do_arquivo(arquivo.name)
+    texto = io.TextIOWrapper(arquivo.file, encoding='utf-8-sig', newline='')
+    try:
+        # Tudo ou nada: um arquivo grande demais não deixa importação parcial
+        with transaction.atomic():
+            resultado = importar_linhas(
+                request.user, ler_linhas(texto, formato), lote=IMPORTACAO_LOTE, maximo=IMPORTACAO_MAXIMO_LINHAS,
+            )
+    except ImportacaoMuitoGrande as e:
+        messages.error(request, f'❌ {e} Use o comando importar_tarefas.')
+    except (UnicodeDecodeError, csv.Error):
+        messages.error(request, '❌ Não foi possível ler o arquivo.')
+    else:
+        messages.success(request, f'📥 {resultado.importadas} tarefa(s) importada(s)!')
+        if resultado.invalidas:
+            linhas = ', '.join(str(numero) for numero, _ in resultado.erros[:10])
+            messages.warning(request, f'⚠️ {resultado.invalidas} linha(s) inválida(s) ignorada(s) (linhas {linhas}).')
+    
+    return redirect('tasks:lista_tarefas')
+
+@login_required
+@require_GET
+@orcamento_sql(3)
+def relatorio(request):
+    """
+    Séries diárias de produtividade do usuário e o último resumo por
+    categoria, lidos dos resumos pré-calculados (ver tasks/analise.py)
+    """
+    try:
+        dias = int(request.GET.get('dias', 30))
+    except ValueError:
+        return JsonResponse({'erro': 'Parâmetros inválidos.'}, status=400)
+    dias = max(1, min(dias, RELATORIO_MAXIMO_DIAS))
+    
+    resumos = ResumoDiario.objects.filter(
+        usuario=request.user, data__gte=timezone.localdate() - timedelta(days=dias),
+    )
+    serie = list(resumos.filter(categoria__isnull=True).order_by('data'))
+    categorias = []
+    if serie:
+        por_categoria = list(resumos.filter(data=serie[-1].data, categoria__isnull=False))
+        anexar_categorias(por_categoria)
+        for resumo in por_categoria:
+            categorias.append({'categoria': resumo.categoria_id, 'nome': resumo.categoria.nome, **resumo.como_dict()})
+    
+    return JsonResponse({'serie': [resumo.como_dict() for resumo in serie], 'categorias': categorias})
+
+@login_required
+@ler_da_replica
+@orcamento_sql(6)
 def lista_categorias(request):
-    categorias = Categoria.objects.filter(usuario=request.user)
     form = CategoriaForm()
     
     if request.method == 'POST':
@@ -99,16 +466,18 @@ def lista_categorias(request):
             return redirect('tasks:lista_categorias')
     
     return render(request, 'tasks/lista_categorias.html', {
-        'categorias': categorias,
+        'categorias': categorias_com_total(request.user.pk),
         'form': form
     })
 
 @login_required
+@orcamento_sql(10)
 def excluir_categoria(request, categoria_id):
+    # Escrita: confere a posse no banco, não no cache das categorias
     categoria = get_object_or_404(Categoria, id=categoria_id, usuario=request.user)
     
     # Verifica se há tarefas usando esta categoria
-    tarefas_com_categoria = Tarefa.objects.filter(categoria=categoria, usuario=request.user)
+    tarefas_com_categoria = Tarefa.objects.filter(categoria_id=categoria_id, usuario=request.user)
     
     if tarefas_com_categoria.exists():
         messages.error(request, '❌ Não é possível excluir esta categoria pois existem tarefas vinculadas a ela.')
@@ -183,4 +552,24 @@ def user_logout(request):
         return redirect('tasks:login')
     else:
         # Se for GET, mostra uma página de confirmação
-        return render(request, 'registration/confirmar_logout.html')
\ No newline at end of file
+        return render(request, 'registration/confirmar_logout.html')
+
+@require_GET
+def metricas(request):
+    """Métricas do processo no formato do Prometheus (ver tasks/perfil.py)"""
+    if not settings.TAREFAS_PERFIL:
+        raise Http404
+    token = settings.TAREFAS_METRICAS_TOKEN
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(perfil.metricas.texto(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@require_GET
+@cache_control(no_cache=True)
+def service_worker(request):
+    """Service worker do PWA com a lista de arquivos do collectstatic (ver tasks/estaticos.py)"""
+    precache = ler_precache()
+    return render(request, 'tasks/serviceworker.js', {
+        'versao': precache['versao'],
+        'arquivos': json.dumps(precache['arquivos']),
+    }, content_type='application/javascript')
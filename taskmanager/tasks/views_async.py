@@ -0,0 +1,260 @@
+"""
+Versões assíncronas das telas mais acessadas: lista de tarefas, conclusão,
+edição e categorias.
+
+Sob ASGI uma view síncrona ocupa uma thread do começo ao fim da requisição;
+estas usam o ORM assíncrono (``aget``, ``acount``, ``aiterator``...), a
+sessão assíncrona (``request.auser()``) e o cache assíncrono, e só passam
+para a thread do banco (``sync_to_async``) o que o Django ainda não oferece
+de forma assíncrona: transações, validação de formulários com querysets e a
+renderização dos templates, que percorre os selects de categoria. As
+mensagens só são gravadas na resposta, então ``messages`` é usado direto.
+
+O ``tasks.urls`` usa estas views quando ``TAREFAS_VIEWS_ASYNC`` está ligado
+(o padrão em ``taskmanager.asgi``); sob WSGI ficam as de ``tasks.views``.
+O comando ``teste_carga`` compara os dois servidores.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+
+from .busca import apagina_busca, buscar_tarefas
+from .cache import (
+    achave_lista, aguardar_lista, aobter_lista, arenderizar_linhas, etag_lista_tarefas, last_modified_lista_tarefas,
+)
+from .categorias import acategorias_com_total
+from .estatisticas import estatisticas_usuario
+from .forms import AcaoEmLoteForm, CategoriaForm, ImportacaoForm, TarefaForm
+from .lote import marcar_conclusao
+from .models import Categoria, Tarefa
+from .orcamento import orcamento_sql
+from .paginacao import KeysetPaginator
+from .replicas import leu_da_replica, ler_da_replica
+from .views import MARCADOR_STREAM, _stream_lista_tarefas as _stream_sincrono, filtrar_tarefas
+
+arender = sync_to_async(render)
+
+
+def login_obrigatorio(view):
+    """
+    ``login_required`` que também deixa ``request.user`` resolvido, para que
+    os decorators e templates seguintes não consultem o banco de novo
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        usuario = await request.auser()
+        if not usuario.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        request.user = usuario
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def condicao(etag_func, last_modified_func):
+    """
+    ``condition`` para views assíncronas: o ETag e o Last-Modified são
+    calculados na thread do banco, porque leem a sessão e o cache
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            def valores():
+                return etag_func(request, *args, **kwargs), last_modified_func(request, *args, **kwargs)
+
+            etag, modificado = await sync_to_async(valores)()
+            etag = quote_etag(etag) if etag is not None else None
+            modificado = int(modificado.timestamp()) if modificado else None
+            resposta = get_conditional_response(request, etag=etag, last_modified=modificado)
+            if resposta is None:
+                resposta = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if modificado and not resposta.has_header('Last-Modified'):
+                    resposta.headers['Last-Modified'] = http_date(modificado)
+                if etag:
+                    resposta.headers.setdefault('ETag', etag)
+            return resposta
+
+        return wrapper
+
+    return decorator
+
+
+async def _stream_lista_tarefas(request, tarefas, contexto):
+    """
+    Como ``views._stream_lista_tarefas``, mas lendo com ``aiterator``. Só sob
+    ASGI: sob WSGI (e no Client dos testes) a resposta é lida de forma
+    síncrona e o Django consumiria o gerador assíncrono inteiro antes de
+    enviar, então fica o gerador síncrono de ``tasks.views``.
+    """
+    if not isinstance(request, ASGIRequest):
+        return await sync_to_async(_stream_sincrono)(request, tarefas, contexto)
+    contexto['streaming'] = True
+    pagina = await sync_to_async(render_to_string)('tasks/lista_tarefas.html', contexto, request=request)
+    inicio, _, fim = pagina.partition(MARCADOR_STREAM)
+    chunk_size = getattr(settings, 'TAREFAS_STREAM_CHUNK', 500)
+    dia = timezone.localdate().isoformat()
+
+    async def gerar():
+        yield inicio
+        bloco = []
+        async for tarefa in tarefas.aiterator(chunk_size=chunk_size):
+            bloco.append(tarefa)
+            if len(bloco) == chunk_size:
+                yield await arenderizar_linhas(bloco, dia)
+                bloco = []
+        if bloco:
+            yield await arenderizar_linhas(bloco, dia)
+        yield fim
+
+    return StreamingHttpResponse(gerar(), content_type='text/html; charset=utf-8')
+
+@login_obrigatorio
+@cache_control(private=True, no_cache=True)
+@ler_da_replica
+@condicao(etag_func=etag_lista_tarefas, last_modified_func=last_modified_lista_tarefas)
+@orcamento_sql(10)  # pior caso: tarefa nova que repete (cria a série)
+async def lista_tarefas(request):
+    filtro = request.GET.get('filtro', 'todas')
+    busca = request.GET.get('q', '').strip()
+
+    tarefas = filtrar_tarefas(Tarefa.objects.filter(usuario=request.user), filtro)
+    if busca:
+        tarefas = buscar_tarefas(tarefas, busca, usuario_id=request.user.pk)
+
+    async def contar():
+        # Com busca o total sai do índice; sem ela, dos contadores
+        if busca:
+            return await tarefas.acount()
+        return (await sync_to_async(estatisticas_usuario)(request.user.pk)).contagem(filtro)
+
+    form = TarefaForm(user=request.user)
+
+    if request.method == 'POST':
+        form = TarefaForm(request.POST, user=request.user)
+        if await sync_to_async(form.is_valid)():
+            nova_tarefa = form.save(commit=False)
+            nova_tarefa.usuario = request.user
+            await nova_tarefa.asave()
+            await sync_to_async(form.salvar_recorrencia)(nova_tarefa)
+            messages.success(request, '✅ Tarefa adicionada com sucesso!')
+            return redirect('tasks:lista_tarefas')
+
+    contexto = {
+        'form': form,
+        'form_lote': AcaoEmLoteForm(user=request.user),
+        'form_importacao': ImportacaoForm(),
+        'filtro_atual': filtro,
+        'busca': busca,
+    }
+
+    if request.GET.get('stream') == '1':
+        contexto['total_tarefas'] = await contar()
+        return await _stream_lista_tarefas(request, tarefas, contexto)
+
+    cursor = request.GET.get('cursor')
+    dia = timezone.localdate().isoformat()
+    chave = await achave_lista(request.user.pk, filtro, busca, cursor, dia)
+    lista = await aobter_lista(chave)
+    if lista is None:
+        por_pagina = getattr(settings, 'TAREFAS_POR_PAGINA', 50)
+        if busca:
+            pagina = await apagina_busca(tarefas, cursor, por_pagina)
+        else:
+            pagina = await KeysetPaginator(tarefas, por_pagina).apagina(cursor)
+        lista = {
+            'total': await contar(),
+            'pagina': pagina,
+            'linhas_html': await arenderizar_linhas(pagina, dia),
+        }
+        # O que veio de uma réplica pode estar atrasado (ver tasks.replicas)
+        if not leu_da_replica():
+            await aguardar_lista(chave, lista)
+
+    contexto.update({
+        'total_tarefas': lista['total'],
+        'tarefas': lista['pagina'],
+        'pagina': lista['pagina'],
+        'linhas_html': mark_safe(lista['linhas_html']),
+    })
+    return await arender(request, 'tasks/lista_tarefas.html', contexto)
+
+@login_obrigatorio
+@orcamento_sql(16)  # pior caso: deixar de repetir (encerra a série)
+async def editar_tarefa(request, tarefa_id):
+    tarefa = await aget_object_or_404(Tarefa.objects.select_related('recorrencia'), id=tarefa_id, usuario=request.user)
+
+    if request.method == 'POST':
+        form = TarefaForm(request.POST, instance=tarefa, user=request.user)
+        if await sync_to_async(form.is_valid)():
+            await sync_to_async(form.save)()
+            messages.success(request, '✅ Tarefa atualizada com sucesso!')
+            return redirect('tasks:lista_tarefas')
+    else:
+        form = TarefaForm(instance=tarefa, user=request.user)
+
+    return await arender(request, 'tasks/editar_tarefa.html', {
+        'form': form,
+        'tarefa': tarefa
+    })
+
+@login_obrigatorio
+@orcamento_sql(8)
+async def marcar_concluida(request, tarefa_id):
+    alvo = {'1': True, '0': False}.get(request.GET.get('concluida'))
+    # O toggle é um UPDATE dentro de transação: roda na thread do banco
+    concluida = await sync_to_async(marcar_conclusao)(request.user, tarefa_id, alvo)
+    if concluida is None:
+        messages.error(request, '❌ Tarefa não encontrada.')
+    elif concluida:
+        messages.success(request, '✅ Tarefa marcada como concluída!')
+    else:
+        messages.success(request, '🔄 Tarefa marcada como pendente!')
+
+    return redirect('tasks:lista_tarefas')
+
+@login_obrigatorio
+@ler_da_replica
+@orcamento_sql(6)
+async def lista_categorias(request):
+    form = CategoriaForm()
+
+    if request.method == 'POST':
+        form = CategoriaForm(request.POST)
+        if await sync_to_async(form.is_valid)():
+            nova_categoria = form.save(commit=False)
+            nova_categoria.usuario = request.user
+            await nova_categoria.asave()
+            messages.success(request, '✅ Categoria criada com sucesso!')
+            return redirect('tasks:lista_categorias')
+
+    return await arender(request, 'tasks/lista_categorias.html', {
+        'categorias': await acategorias_com_total(request.user.pk),
+        'form': form
+    })
+
+@login_obrigatorio
+@orcamento_sql(10)
+async def excluir_categoria(request, categoria_id):
+    # Escrita: confere a posse no banco, não no cache das categorias
+    categoria = await aget_object_or_404(Categoria, id=categoria_id, usuario=request.user)
+
+    if await Tarefa.objects.filter(categoria_id=categoria_id, usuario=request.user).aexists():
+        messages.error(request, '❌ Não é possível excluir esta categoria pois existem tarefas vinculadas a ela.')
+        return redirect('tasks:lista_categorias')
+
+    await categoria.adelete()
+    messages.success(request, '🗑️ Categoria excluída com sucesso!')
+    return redirect('tasks:lista_categorias')